@@ -1,79 +1,123 @@
-from flask import Flask, render_template, request, redirect, session, url_for, flash, jsonify
+from flask import Flask, abort, render_template, request, redirect, session, url_for, flash, jsonify, g, has_app_context, make_response, Response
 import sqlite3
 import hashlib
-from markdown2 import markdown
+import hmac
+import migrations
+import note_bodies
+import render_cache
+import revisions
+import search_index
+import store
+import text_patch
+import transfer
+from db_pool import ConnectionPool
+from metrics import Metrics
+from ratelimit import RateLimiter, per_minute
+from scoring import LcsScorer
+from session_store import SessionStore, SESSIONS_SCHEMA
 
 # 初始化 Flask 应用
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # 设置密钥以保护会话
 
+NOTES_PAGE_SIZE = 50  # 笔记列表每页条数
+AUTOSAVE_REVISION_INTERVAL = 600  # 自动保存距最近一个修订不足这么多秒时不再记录修订
+limiter = RateLimiter()  # 登录/注册按 IP 限流
+metrics = Metrics.from_env()  # METRICS_ENABLED=1 时记录请求指标并提供 /metrics
+metrics.init_app(app)
+
+# 数据库连接池，连接复用并预先配置 WAL 等参数
+db_pool = ConnectionPool('notebook.db')  # 连接返回字典格式的行
+metrics.instrument(db_pool)  # 启用指标时记录 SQL 语句数和耗时
+
 # 数据库连接函数
 def get_db_connection():
-    """ 获取数据库连接 """
-    conn = sqlite3.connect('notebook.db')  # 连接到 SQLite 数据库
-    conn.row_factory = sqlite3.Row  # 设置游标返回字典格式
+    """ 从连接池获取数据库连接，调用 close() 时归还 """
+    conn = db_pool.acquire()
+    if has_app_context():
+        # 记录连接和租约，异常退出时由请求结束钩子归还
+        g.setdefault('db_connections', []).append((conn, conn.lease))
     return conn
 
+@app.teardown_appcontext
+def release_db_connections(exception):
+    """ 请求结束时归还本次请求未关闭的连接（已归还、可能已被其他请求取走的连接按租约忽略） """
+    for conn, lease in g.pop('db_connections', []):
+        db_pool.release(conn, lease)
+
+# 数据库迁移，按顺序追加，已发布的迁移不要修改
+MIGRATIONS = [
+    # 1: 用户表和笔记表
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT
+    );
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        title TEXT,
+        content TEXT,
+        markdown_enabled INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    ''',
+    # 2: 全文索引，由 NoteStore 维护
+    search_index.FTS_SCHEMA,
+    # 3: 按用户列出笔记的索引
+    '''
+    CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes (user_id, id DESC);
+    ''',
+    # 4: Markdown 渲染缓存
+    render_cache.RENDER_SCHEMA,
+    # 5: 笔记版本号，每次修改递增，用于 ETag
+    '''
+    ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+    ''',
+    # 6: 修订历史
+    revisions.revisions_schema('notes'),
+    # 7: 大正文压缩后移到 note_bodies 表
+    note_bodies.bodies_schema('notes'),
+    # 8: 服务端会话
+    SESSIONS_SCHEMA,
+    # 9: 为引入迁移之前已有的笔记建立全文索引（读取正文要用到迁移 7 的 note_bodies）
+    search_index.rebuild,
+]
+
+users = store.UserStore('users')
+notes_store = store.NoteStore('notes', indexed=True)
+sessions = SessionStore.from_env(db_pool.database)  # 会话保存在服务端，Cookie 中只有会话 id
+sessions.init_app(app)
+metrics.instrument(sessions.pool)
+
 # 数据库初始化函数
 def init_db():
-    """ 初始化数据库和表 """
+    """ 初始化数据库，执行未应用的迁移 """
     conn = get_db_connection()  # 获取数据库连接
-    cursor = conn.cursor()
-    
-    # 创建用户表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT
-        )
-    ''')
-
-    # 创建笔记表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            title TEXT,
-            content TEXT,
-            markdown_enabled INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()  # 提交事务
+    migrations.migrate(conn, MIGRATIONS)
     conn.close()   # 关闭数据库连接
 
-# 长公共子序列 (LCS) 实现
-def longest_common_subsequence(s1, s2):
-    """ 计算字符串 s1 和 s2 的最长公共子序列 """
-    m, n = len(s1), len(s2)       # 获取两个字符串的长度
-    dp = [[0] * (n + 1) for _ in range(m + 1)]  # 初始化 DP 表
-
-    # 构建 LCS DP 表
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if s1[i - 1] == s2[j - 1]:  # 字符相等
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])  # 取最大
-
-    # 回溯构建 LCS 字符串
-    lcs = []
-    while m > 0 and n > 0:
-        if s1[m - 1] == s2[n - 1]:  # 找到公共字符
-            lcs.append(s1[m - 1])
-            m -= 1
-            n -= 1
-        elif dp[m - 1][n] > dp[m][n - 1]:
-            m -= 1  # 移动到上方
-        else:
-            n -= 1  # 移动到左侧
-
-    return ''.join(reversed(lcs))  # 返回反转后的 LCS 字符串
+# 短查询的模糊标题匹配
+def fuzzy_search_titles(conn, user_id, query):
+    """ 使用 LCS 对标题做模糊匹配，按公共子序列长度降序返回 """
+    if not query:
+        return []
+    notes = notes_store.titles(conn, user_id).fetchall()
+    scores = LcsScorer(query).score_many([note.title for note in notes], threshold=1)  # 批量计算 LCS 长度
+    metrics.count('lcs_comparisons', len(notes))
+    scored = [(score, note) for score, note in zip(scores, notes) if score > 0]  # 记录匹配的笔记
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [note for _, note in scored[:search_index.SEARCH_LIMIT]]
+
+# 笔记分页查询
+def list_notes_page(conn, user_id, after_id=None):
+    """ 按 id 倒序取 after_id 之后的一页笔记（只取列表需要的列），返回笔记和下一页游标 """
+    return notes_store.page(conn, user_id, after_id, NOTES_PAGE_SIZE)
 
 # 用户注册功能
 @app.route('/register', methods=['GET', 'POST'])
+@limiter.limit(per_minute(5), burst=3)
 def register():
     """ 处理用户注册 """
     if request.method == 'POST':
@@ -81,10 +125,8 @@ def register():
         password = hashlib.sha256(request.form['password'].encode()).hexdigest()  # 加密密码
         
         conn = get_db_connection()  # 获取数据库连接
-        cursor = conn.cursor()
         try:
-            # 插入新用户
-            cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
+            users.create(conn, username, password)  # 插入新用户
             conn.commit()  # 提交事务
             flash('注册成功，请登录！')  # 显示成功信息
             return redirect(url_for('login'))  # 重定向到登录页面
@@ -97,6 +139,7 @@ def register():
 
 # 用户登录功能
 @app.route('/login', methods=['GET', 'POST'])
+@limiter.limit(per_minute(10), burst=5)
 def login():
     """ 处理用户登录 """
     if request.method == 'POST':
@@ -104,11 +147,11 @@ def login():
         password = hashlib.sha256(request.form['password'].encode()).hexdigest()  # 加密密码
         
         conn = get_db_connection()  # 获取数据库连接
-        user = conn.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password)).fetchone()  # 查找用户
+        user = users.by_username(conn, username)  # 查找用户
         conn.close()  # 关闭数据库连接
 
-        if user:
-            session['user_id'] = user['id']  # 将用户 ID 存入会话
+        if user and hmac.compare_digest(user.password, password):  # 定长比较，不泄露匹配长度
+            session['user_id'] = user.id  # 将用户 ID 存入会话
             return redirect(url_for('notes'))  # 登录成功后重定向到笔记列表
         else:
             flash('用户名或密码错误！')
@@ -132,21 +175,73 @@ def notes():
     conn = get_db_connection()  # 获取数据库连接
     
     if request.method == 'POST':  # 处理搜索请求
-        search_query = request.form.get('search')  # 获取搜索查询
-        notes = conn.execute('SELECT * FROM notes WHERE user_id = ?', (session['user_id'],)).fetchall()  # 获取所有笔记
-        # 搜索匹配的笔记标题
-        matched_notes = []
-        for note in notes:
-            if longest_common_subsequence(note['title'], search_query) != '':  # 使用 LCS 算法进行匹配
-                matched_notes.append(note)  # 记录匹配的笔记
+        search_query = request.form.get('search', '').strip()  # 获取搜索查询
+        matched_notes = search_index.search(conn, session['user_id'], search_query)  # 全文索引检索
+        if matched_notes is None:  # 没有 3 个字符以上的词，无法使用 trigram 索引
+            matched_notes = fuzzy_search_titles(conn, session['user_id'], search_query)
 
         conn.close()  # 关闭数据库连接
         return render_template('notes.html', notes=matched_notes)  # 返回匹配笔记列表
 
-    notes = conn.execute('SELECT * FROM notes WHERE user_id = ?', (session['user_id'],)).fetchall()  # 获取所有笔记
+    notes, next_after_id = list_notes_page(conn, session['user_id'], request.args.get('after_id', type=int))  # 获取一页笔记
+    conn.close()  # 关闭数据库连接
+
+    return render_template('notes.html', notes=notes, next_after_id=next_after_id)  # 返回笔记列表页面
+
+# 笔记列表分页接口（无限滚动）
+@app.route('/notes/page', methods=['GET'])
+def notes_page():
+    """ 以 JSON 返回 after_id 之后的一页笔记 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return redirect(url_for('login'))
+
+    conn = get_db_connection()  # 获取数据库连接
+    notes, next_after_id = list_notes_page(conn, session['user_id'], request.args.get('after_id', type=int))
     conn.close()  # 关闭数据库连接
 
-    return render_template('notes.html', notes=notes)  # 返回笔记列表页面
+    return jsonify({
+        'notes': [{'id': note.id, 'title': note.title} for note in notes],
+        'next_after_id': next_after_id
+    })
+
+# 导出笔记功能
+@app.route('/notes/export', methods=['GET'])
+def export_notes():
+    """ 以 NDJSON 或 Markdown zip 流式导出用户的全部笔记 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return redirect(url_for('login'))
+
+    notes = notes_store.export(db_pool, session['user_id'])
+    if request.args.get('format') == 'zip':
+        return Response(transfer.zip_stream(notes), mimetype='application/zip',
+                        headers={'Content-Disposition': 'attachment; filename=notes.zip'})
+    return Response(transfer.ndjson_stream(notes), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=notes.ndjson'})
+
+# 导入笔记功能
+@app.route('/notes/import', methods=['POST'])
+def import_notes():
+    """ 从上传的 NDJSON 或 Markdown zip 文件批量导入笔记 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return redirect(url_for('login'))
+
+    upload = request.files.get('file')
+    if not upload:
+        flash('请选择要导入的文件。')
+        return redirect(url_for('notes'))
+
+    user_id = session['user_id']
+    rows = ((note['title'], note['content'], 1 if note.get('markdown_enabled') else 0)
+            for note in transfer.parse_upload(upload))
+    conn = get_db_connection()  # 获取数据库连接
+    try:
+        count = notes_store.insert_many(conn, user_id, rows)
+        flash(f'已导入 {count} 条笔记。')
+    except transfer.ImportFormatError as exc:
+        flash(f'{exc}，已导入 {exc.imported} 条笔记。')
+    finally:
+        conn.close()  # 关闭数据库连接
+    return redirect(url_for('notes'))
 
 # 创建笔记功能
 @app.route('/notes/new', methods=['GET', 'POST'])
@@ -161,7 +256,7 @@ def new_note():
         markdown_enabled = 1 if request.form.get('markdown_enabled') else 0  # 获取 Markdown 启用状态
 
         conn = get_db_connection()  # 获取数据库连接
-        conn.execute('INSERT INTO notes (user_id, title, content, markdown_enabled) VALUES (?, ?, ?, ?)', (session['user_id'], title, content, markdown_enabled))
+        notes_store.create(conn, session['user_id'], title, content, markdown_enabled)
         conn.commit()  # 提交事务
         conn.close()  # 关闭数据库连接
         return redirect(url_for('notes'))  # 重定向到笔记列表
@@ -176,13 +271,17 @@ def edit_note(note_id):
         return redirect(url_for('login'))
 
     conn = get_db_connection()  # 获取数据库连接
-    note = conn.execute('SELECT * FROM notes WHERE id = ? AND user_id = ?', (note_id, session['user_id'])).fetchone()  # 查找笔记
-    
+    note = notes_store.get(conn, note_id, session['user_id'])  # 查找笔记
+    if note is None:
+        conn.close()  # 关闭数据库连接
+        abort(404)  # 笔记不存在或不属于当前用户
+
     if request.method == 'POST':
         title = request.form['title']  # 获取笔记标题
         content = request.form['content']  # 获取笔记内容
         markdown_enabled = 1 if request.form.get('markdown_enabled') else 0  # 获取 Markdown 启用状态
-        conn.execute('UPDATE notes SET title = ?, content = ?, markdown_enabled = ? WHERE id = ?', (title, content, markdown_enabled, note_id))
+        notes_store.update(conn, note_id, title, content, markdown_enabled)  # 旧内容记入修订历史后更新
+        render_cache.invalidate(conn, note_id)  # 删除旧的渲染结果
         conn.commit()  # 提交事务
         conn.close()  # 关闭数据库连接
         return redirect(url_for('notes'))  # 重定向到笔记列表
@@ -190,6 +289,52 @@ def edit_note(note_id):
     conn.close()  # 关闭数据库连接
     return render_template('edit_note.html', note=note)  # 返回编辑笔记页面
 
+# 自动保存功能（增量修改）
+@app.route('/notes/<int:note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """ 在基准版本上应用文本区间修改，只更新改动的列；版本已变化时返回 409 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return {'error': '请先登录'}, 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or type(payload.get('base_version')) is not int:
+        return {'error': '缺少 base_version'}, 400
+    title = payload.get('title')
+    if title is not None and not isinstance(title, str):
+        return {'error': 'title 必须是字符串'}, 400
+
+    conn = get_db_connection()  # 获取数据库连接
+    conn.execute('BEGIN IMMEDIATE')  # 先拿写锁，读取到提交之间不会有其他修改
+    note = notes_store.get(conn, note_id, session['user_id'])
+    if note is None:
+        conn.close()  # 关闭数据库连接（未提交的事务会回滚）
+        return {}, 404  # 如果未找到笔记，返回 404
+    if note.version != payload['base_version']:
+        conn.close()  # 关闭数据库连接
+        return {'error': '笔记已在其他地方修改', 'version': note.version}, 409
+
+    base = text_patch.normalize_newlines(note.content)  # 旧数据可能含 CRLF，客户端的偏移按 LF 计算
+    try:
+        content = text_patch.apply_edits(base, payload.get('edits', []))
+    except text_patch.PatchError as exc:
+        conn.close()  # 关闭数据库连接
+        return {'error': str(exc)}, 400
+    if title is None:
+        title = note.title
+
+    if (title, content) == (note.title, base):  # 没有变化，不写数据库
+        conn.close()  # 关闭数据库连接
+        return {'version': note.version}
+
+    if content == base:  # 只改了标题时不重写正文
+        notes_store.update(conn, note_id, title, coalesce=AUTOSAVE_REVISION_INTERVAL)
+    else:
+        notes_store.update(conn, note_id, title, content, coalesce=AUTOSAVE_REVISION_INTERVAL)
+        render_cache.invalidate(conn, note_id)  # 删除旧的渲染结果
+    conn.commit()  # 提交事务
+    conn.close()  # 关闭数据库连接
+    return {'version': note.version + 1}
+
 # 删除笔记功能
 @app.route('/notes/delete/<int:note_id>')
 def delete_note(note_id):
@@ -198,7 +343,7 @@ def delete_note(note_id):
         return redirect(url_for('login'))
 
     conn = get_db_connection()  # 获取数据库连接
-    conn.execute('DELETE FROM notes WHERE id = ? AND user_id = ?', (note_id, session['user_id']))  # 删除笔记
+    notes_store.delete(conn, note_id, session['user_id'])  # 删除笔记
     conn.commit()  # 提交事务
     conn.close()  # 关闭数据库连接
     return redirect(url_for('notes'))  # 重定向到笔记列表
@@ -211,16 +356,74 @@ def get_note(note_id):
         return redirect(url_for('login'))
 
     conn = get_db_connection()  # 获取数据库连接
-    note = conn.execute('SELECT title, content, markdown_enabled FROM notes WHERE id = ? AND user_id = ?', (note_id, session['user_id'])).fetchone()  # 查找笔记
+    version = notes_store.version(conn, note_id, session['user_id'])  # 只查版本号
+    if version is None:
+        conn.close()  # 关闭数据库连接
+        return {}, 404  # 如果未找到笔记，返回 404
+
+    etag = f'{note_id}-{version}'
+    if request.if_none_match.contains(etag):  # 客户端缓存仍然有效，不再读取正文
+        conn.close()  # 关闭数据库连接
+        return note_cache_headers(make_response('', 304), etag)
+
+    note = notes_store.get(conn, note_id, session['user_id'])  # 查找笔记
+    html = None
+    if note.markdown_enabled:
+        html = render_cache.render_note(conn, note_id, note.content)  # 使用缓存的渲染结果
     conn.close()  # 关闭数据库连接
 
-    if note:
-        return {
-            'title': note['title'],
-            'content': note['content'],
-            'markdown_enabled': note['markdown_enabled']
-        }
-    return {}, 404  # 如果未找到笔记，返回 404
+    response = make_response({
+        'title': note.title,
+        'content': note.content,
+        'html': html,
+        'markdown_enabled': note.markdown_enabled
+    })
+    return note_cache_headers(response, etag)
+
+# 笔记修订历史
+@app.route('/notes/revisions/<int:note_id>', methods=['GET'])
+def note_revisions(note_id):
+    """ 以 JSON 返回笔记的修订列表 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return redirect(url_for('login'))
+
+    conn = get_db_connection()  # 获取数据库连接
+    if not notes_store.exists(conn, note_id, session['user_id']):
+        conn.close()  # 关闭数据库连接
+        return {}, 404  # 如果未找到笔记，返回 404
+    rows = revisions.list_revisions(conn, note_id)
+    conn.close()  # 关闭数据库连接
+
+    return jsonify([{
+        'revision': row['revision'],
+        'snapshot': row['kind'] == revisions.SNAPSHOT,
+        'size': row['size'],
+        'created_at': row['created_at']
+    } for row in rows])
+
+# 获取指定修订
+@app.route('/notes/revisions/<int:note_id>/<int:revision>', methods=['GET'])
+def note_revision(note_id, revision):
+    """ 还原并返回笔记的某个历史修订 """
+    if 'user_id' not in session:  # 检查用户是否已登录
+        return redirect(url_for('login'))
+
+    conn = get_db_connection()  # 获取数据库连接
+    found = None
+    if notes_store.exists(conn, note_id, session['user_id']):
+        found = revisions.get_revision(conn, note_id, revision)
+    conn.close()  # 关闭数据库连接
+    if found is None:
+        return {}, 404  # 笔记或修订不存在
+
+    return jsonify({'revision': revision, 'title': found[0], 'content': found[1]})
+
+def note_cache_headers(response, etag):
+    """ 设置笔记详情的强 ETag 和私有缓存头，浏览器每次使用前都要重新验证 """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
 
 # 初始化数据库
 init_db()
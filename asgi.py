@@ -0,0 +1,121 @@
+""" app.py 的 ASGI 入口：uvicorn asgi:application，或 python serve.py --asgi
+
+asgiref 自带的 WsgiToAsgi 用 sync_to_async(thread_sensitive=True) 执行 WSGI 应用，
+同一进程里的请求全部排队在同一个线程上。这里改为把每个请求交给有界线程池
+（ASGI_THREADS 个线程，默认 8）：事件循环负责接受连接、读取请求体（上传导入文件的
+慢客户端不占线程），Flask 视图及其中的 SQLite 查询和 Markdown 渲染在线程池中执行，
+同时执行的请求数不超过线程数，超出的请求在事件循环中排队等待，而不是阻塞在连接池上。
+线程数不要超过连接池大小（serve.py 会自动调整）。
+
+适配器只依赖 ASGI 规范（HTTP 和 lifespan），不使用 asgiref 的内部实现；
+响应体由工作线程逐块交回事件循环发送，流式导出不会整体缓存在内存中。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+THREADS = int(os.environ.get('ASGI_THREADS', '8'))
+BODY_SPOOL_SIZE = 1024 * 1024  # 请求体超过该大小后写入磁盘临时文件
+
+
+def build_environ(scope, body):
+    """ 按 ASGI HTTP scope 构造 WSGI environ（PEP 3333），body 为已读完的请求体文件 """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1] or 0)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value  # 重复的请求头合并
+    return environ
+
+
+class ExecutorWsgiToAsgi:
+    """ 把 WSGI 应用包装为 ASGI 应用，请求在有界线程池中并发执行 """
+
+    def __init__(self, wsgi_application, threads=THREADS):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':  # 没有启动/关闭任务，直接确认
+            while True:
+                message = await receive()
+                await send({'type': message['type'] + '.complete'})
+                if message['type'] == 'lifespan.shutdown':
+                    return
+        if scope['type'] != 'http':
+            raise ValueError(f'不支持的 ASGI 连接类型：{scope["type"]}')
+        with tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE) as body:
+            while True:  # 在事件循环中读完请求体，慢客户端不占用线程
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._run, scope, body, loop, send)
+
+    def _run(self, scope, body, loop, send):
+        """ 在工作线程中执行 WSGI 应用，响应通过事件循环发送 """
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+
+        result = self.wsgi_application(build_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not response.get('sent'):
+                    send_sync(response['start'])
+                    response['sent'] = True
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        if not response.get('sent'):
+            send_sync(response['start'])
+        send_sync({'type': 'http.response.body'})
+
+
+application = ExecutorWsgiToAsgi(app)
@@ -0,0 +1,180 @@
+""" 聊天室多进程扩展压测：N 个聊天进程通过 chat_broker 共享房间，测量消息吞吐
+
+需要 python-socketio 客户端和 websocket-client：pip install "python-socketio[client]"
+用法：python bench/bench_chat_scaling.py --workers 1,2,4 --receivers 40 --messages 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_PORT = 5600
+
+# 在子进程中启动一个聊天室进程
+WORKER_SCRIPT = '''
+import importlib, os, sys
+sys.path.insert(0, {root!r})
+chat = importlib.import_module('简易聊天室')
+chat.socketio.run(chat.app, host='127.0.0.1', port=int(os.environ['CHAT_PORT']), log_output=False)
+'''
+
+
+def wait_for_port(port, timeout=15):
+    """ 等待聊天进程开始监听 """
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'端口 {port} 未就绪')
+
+
+def create_room(port):
+    """ 通过 /room 创建房间并返回房间 id；只有这样加入过的 IP 才能订阅房间（压测的连接都来自本机） """
+    data = urllib.parse.urlencode({'username': 'bench'}).encode()
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/room', data) as response:  # 跟随重定向到房间页
+        return urllib.parse.urlparse(response.geturl()).path.rsplit('/', 1)[1]
+
+
+def receiver_process(ports, room, count, expected, ready, results):
+    """ 在一个进程中运行 count 个接收端，收齐 expected 条消息后上报完成时间 """
+    import socketio
+
+    clients = []
+    done_times = []
+    for i in range(count):
+        client = socketio.Client()
+        state = {'received': 0}
+
+        def on_message(data, state=state):
+            state['received'] += 1
+            if state['received'] == expected:
+                done_times.append(time.time())
+
+        def on_messages(batch, state=state, client=client):  # 按节拍合并后的批量帧
+            for _ in batch['messages']:
+                on_message(None, state)
+            state['frames'] = state.get('frames', 0) + 1
+            client.emit('ack', {'count': state['frames']})
+
+        client.on('messages', on_messages)
+        client.connect(f'http://127.0.0.1:{ports[i % len(ports)]}', transports=['websocket'])
+        client.emit('join', {'room': room, 'user': f'r{i}'})
+        clients.append(client)
+    ready.put(count)
+    deadline = time.time() + 120
+    while len(done_times) < count and time.time() < deadline:
+        time.sleep(0.05)
+    results.put({'finished': len(done_times), 'last': max(done_times) if done_times else None})
+    for client in clients:
+        client.disconnect()
+
+
+def run_round(workers, args, workdir):
+    """ 启动代理和 workers 个聊天进程，压测一轮，返回统计 """
+    import socketio
+
+    sock_path = os.path.join(workdir, f'broker-{workers}.sock')
+    env = dict(os.environ,
+               CHAT_MESSAGE_QUEUE=f'unix://{sock_path}',
+               CHAT_DATABASE=os.path.join(workdir, f'chat-{workers}.db'),
+               CHAT_TEXT_RATE='1000000', CHAT_TEXT_BURST='1000000')  # 发送端都来自本机，关闭发言限流
+    procs = [subprocess.Popen([sys.executable, os.path.join(ROOT, 'chat_broker.py'), '--socket', sock_path],
+                              stdout=subprocess.DEVNULL)]
+    ports = [BASE_PORT + i for i in range(workers)]
+    try:
+        time.sleep(0.5)
+        for port in ports:
+            procs.append(subprocess.Popen([sys.executable, '-W', 'ignore', '-c', WORKER_SCRIPT.format(root=ROOT)],
+                                          env=dict(env, CHAT_PORT=str(port)),
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for port in ports:
+            wait_for_port(port)
+
+        room = create_room(ports[0])
+        expected = args.senders * args.messages
+        ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+        per_proc = max(1, args.receivers // args.client_procs)
+        receivers = [multiprocessing.Process(target=receiver_process,
+                                             args=(ports, room, per_proc, expected, ready, results))
+                     for _ in range(args.client_procs)]
+        for proc in receivers:
+            proc.start()
+        for _ in receivers:
+            ready.get(timeout=60)
+        time.sleep(0.5)  # 等待所有 join 在各进程生效
+
+        senders = []
+        for i in range(args.senders):
+            client = socketio.Client()
+            client.connect(f'http://127.0.0.1:{ports[i % len(ports)]}', transports=['websocket'])
+            senders.append(client)
+        start = time.time()
+        for n in range(args.messages):
+            for i, client in enumerate(senders):
+                client.emit('text', {'room': room, 'user': f's{i}', 'msg': f'm{n}'})
+
+        finished, last = 0, start
+        for _ in receivers:
+            result = results.get(timeout=180)
+            finished += result['finished']
+            if result['last']:
+                last = max(last, result['last'])
+        for proc in receivers:
+            proc.join()
+        for client in senders:
+            client.disconnect()
+
+        elapsed = last - start
+        total_receivers = per_proc * args.client_procs
+        return {
+            'workers': workers,
+            'receivers': total_receivers,
+            'receivers_finished': finished,
+            'messages': expected,
+            'seconds': round(elapsed, 3),
+            'messages_per_sec': round(expected / elapsed, 1),
+            'deliveries_per_sec': round(expected * finished / elapsed, 1),
+        }
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='逗号分隔的聊天进程数')
+    parser.add_argument('--receivers', type=int, default=40, help='房间内接收端总数')
+    parser.add_argument('--client-procs', type=int, default=4, help='运行接收端的进程数')
+    parser.add_argument('--senders', type=int, default=4, help='发送端数量')
+    parser.add_argument('--messages', type=int, default=500, help='每个发送端发送的消息数')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-chat-')
+    rounds = []
+    for workers in (int(n) for n in args.workers.split(',')):
+        result = run_round(workers, args, workdir)
+        rounds.append(result)
+        print(f"workers={result['workers']:2d}  {result['messages_per_sec']:9.1f} msg/s  "
+              f"{result['deliveries_per_sec']:11.1f} deliveries/s  "
+              f"({result['receivers_finished']}/{result['receivers']} receivers complete)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rounds, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+""" LCS 打分基准：对比 DP 表实现、位并行实现和 NumPy 批量实现
+
+用法：python bench/bench_lcs.py --titles 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scoring  # noqa: E402
+
+CHARS = '会议记录项目计划读书笔记周报旅行预算学习abcdefghijklmnopqrstuvwxyz '
+
+
+def dp_lcs(a, b):
+    """ 原实现：(m+1)×(n+1) DP 表 """
+    m, n = len(a), len(b)
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(m):
+        for j in range(n):
+            if a[i] == b[j]:
+                dp[i + 1][j + 1] = dp[i][j] + 1
+            else:
+                dp[i + 1][j + 1] = max(dp[i][j + 1], dp[i + 1][j])
+    return dp[m][n]
+
+
+def timed(fn):
+    """ 执行 fn，返回耗时（秒）和结果 """
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--titles', type=int, default=20000, help='参与打分的标题数量')
+    parser.add_argument('--length', type=int, default=30, help='标题平均长度')
+    parser.add_argument('--query', default='项目计划 review')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    titles = [''.join(rng.choice(CHARS) for _ in range(rng.randint(args.length // 2, args.length * 3 // 2)))
+              for _ in range(args.titles)]
+    scorer = scoring.LcsScorer(args.query)
+
+    dp_time, expected = timed(lambda: [dp_lcs(title, args.query) for title in titles])
+    bit_time, bit_scores = timed(lambda: [scorer.score(title) for title in titles])
+    assert bit_scores == expected
+    print(f'titles={args.titles} query={args.query!r}')
+    print(f'DP table     : {dp_time * 1000:9.1f} ms')
+    print(f'bit-parallel : {bit_time * 1000:9.1f} ms  ({dp_time / bit_time:.1f}x)')
+    if scoring.np is not None:
+        batch_time, batch_scores = timed(lambda: scorer.score_many(titles))
+        assert batch_scores == expected
+        print(f'NumPy batch  : {batch_time * 1000:9.1f} ms  ({dp_time / batch_time:.1f}x)')
+    else:
+        print('NumPy batch  : 未安装 NumPy，跳过')
+
+
+if __name__ == '__main__':
+    main()
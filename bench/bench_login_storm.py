@@ -0,0 +1,154 @@
+""" 登录风暴压测：大量登录请求同时进行时，一键.py 笔记列表的延迟变化
+
+分别在密码哈希内联计算（PASSWORD_WORKERS=0）和进程池模式下启动 一键.py，
+一个客户端持续请求笔记列表，同时若干线程不断提交登录，比较列表请求的 p50/p99。
+用法：python bench/bench_login_storm.py --storm 16 --seconds 10 --workers 0,2
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5700
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+
+# 在子进程中启动 一键.py：使用临时数据库、关闭登录限流并写入测试笔记
+SERVER_SCRIPT = '''
+import importlib, os, sqlite3, sys
+sys.path.insert(0, {root!r})
+m = importlib.import_module('一键')
+m.DATABASE = {database!r}
+m.db_pool = m.ConnectionPool(m.DATABASE, detect_types=sqlite3.PARSE_DECLTYPES)
+m.limiter.hit = lambda *args, **kwargs: (True, 0.0)
+with m.app.app_context():
+    m.init_db()
+    db = m.get_db()
+    db.execute('INSERT INTO user (username, password) VALUES (?, ?)', ({username!r}, m.hasher.hash({password!r})))
+    db.executemany('INSERT INTO note (title, content, user_id) VALUES (?, ?, 1)',
+                   [(f'笔记 {{i}}', '内容 ' * 200) for i in range({notes})])
+    db.commit()
+m.app.run(host='127.0.0.1', port={port}, threaded=True)
+'''
+
+
+def wait_for_port(port, timeout=15):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'端口 {port} 未就绪')
+
+
+def login_opener(base):
+    """ 返回已登录的 opener """
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    data = urllib.parse.urlencode({'username': USERNAME, 'password': PASSWORD}).encode()
+    opener.open(base + '/login', data, timeout=30).read()
+    return opener
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def measure_listing(opener, base, seconds):
+    """ 持续请求笔记列表 seconds 秒，返回每次请求的毫秒数 """
+    latencies = []
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        opener.open(base + '/', timeout=60).read()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def storm(base, stop, counts):
+    data = urllib.parse.urlencode({'username': USERNAME, 'password': PASSWORD}).encode()
+    while not stop.is_set():
+        try:
+            urllib.request.urlopen(base + '/login', data, timeout=60).read()
+            counts['ok'] += 1
+        except urllib.error.HTTPError as exc:
+            counts[exc.code] = counts.get(exc.code, 0) + 1
+        except OSError:
+            counts['error'] += 1
+
+
+def run_round(workers, args, workdir):
+    base = f'http://127.0.0.1:{PORT}'
+    script = SERVER_SCRIPT.format(root=ROOT, database=os.path.join(workdir, f'site-{workers}.db'),
+                                  username=USERNAME, password=PASSWORD, notes=args.notes, port=PORT)
+    server = subprocess.Popen([sys.executable, '-W', 'ignore', '-c', script], cwd=workdir,
+                              env=dict(os.environ, PASSWORD_WORKERS=str(workers)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(PORT)
+        opener = login_opener(base)
+        idle = measure_listing(opener, base, args.seconds / 2)
+
+        stop = threading.Event()
+        counts = {'ok': 0, 'error': 0}
+        threads = [threading.Thread(target=storm, args=(base, stop, counts)) for _ in range(args.storm)]
+        for thread in threads:
+            thread.start()
+        busy = measure_listing(opener, base, args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        'password_workers': workers,
+        'idle_p50_ms': round(statistics.median(idle), 2),
+        'idle_p99_ms': round(percentile(idle, 0.99), 2),
+        'storm_p50_ms': round(statistics.median(busy), 2),
+        'storm_p99_ms': round(percentile(busy, 0.99), 2),
+        'listing_requests': len(busy),
+        'logins': counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='0,2', help='逗号分隔的 PASSWORD_WORKERS 取值，0 为内联计算')
+    parser.add_argument('--storm', type=int, default=16, help='并发登录线程数')
+    parser.add_argument('--seconds', type=float, default=10, help='登录风暴期间的测量时长')
+    parser.add_argument('--notes', type=int, default=500, help='测试用户的笔记数')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-login-')
+    rounds = []
+    for workers in (int(n) for n in args.workers.split(',')):
+        result = run_round(workers, args, workdir)
+        rounds.append(result)
+        print(f"workers={workers}  idle p50/p99 {result['idle_p50_ms']:7.2f}/{result['idle_p99_ms']:7.2f} ms  "
+              f"storm p50/p99 {result['storm_p50_ms']:7.2f}/{result['storm_p99_ms']:7.2f} ms  "
+              f"logins {result['logins']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rounds, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+""" 正文分表+压缩基准：对比正文内联存储与 note_bodies 分表压缩存储的文件大小和查询耗时
+
+用法：python bench/bench_note_bodies.py --notes 20000 --body-kb 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations
+import note_bodies
+
+WORDS = ['会议', '记录', '项目', '计划', '读书', '笔记', '周报', '旅行', '预算', '学习',
+         'python', 'flask', 'sqlite', 'design', 'review', 'release', 'todo', 'idea']
+
+# 与 app.py 的 notes 表相同的列顺序：markdown_enabled 在 content 之后
+NOTES_SCHEMA = '''
+    CREATE TABLE notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        title TEXT,
+        content TEXT,
+        markdown_enabled INTEGER DEFAULT 0
+    );
+    CREATE INDEX idx_notes_user_id ON notes (user_id, id DESC);
+'''
+
+
+def make_body(rng, size):
+    """ 生成约 size 个字符的 Markdown 风格正文 """
+    lines = []
+    total = 0
+    while total < size:
+        line = '- ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+
+def build(path, split, args):
+    conn = sqlite3.connect(path)
+    steps = [NOTES_SCHEMA]
+    if split:
+        steps.append(note_bodies.bodies_schema('notes'))
+    migrations.migrate(conn, steps)
+    rng = random.Random(42)
+    rows = ((i % 100, f'笔记 {i}', make_body(rng, args.body_kb * 1024), i % 2) for i in range(args.notes))
+    start = time.perf_counter()
+    conn.executemany('INSERT INTO notes (user_id, title, content, markdown_enabled) VALUES (?, ?, ?, ?)', rows)
+    if split:
+        note_bodies.move_bodies(conn, 'notes', 1)  # 与 NoteStore.insert_many 相同
+    conn.commit()
+    insert = time.perf_counter() - start
+    conn.execute('VACUUM')
+    conn.close()
+    return insert
+
+
+def timed(conn, sql, params_list, decode=None):
+    start = time.perf_counter()
+    for params in params_list:
+        rows = conn.execute(sql, params).fetchall()
+        if decode is not None:
+            [decode(row[0]) for row in rows]
+    return (time.perf_counter() - start) * 1000 / len(params_list)
+
+
+def measure(path, split, args):
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA cache_size = -{args.cache_mb * 1024}')
+    content = note_bodies.content_sql('notes') if split else 'content'
+    rng = random.Random(1)
+    listing = timed(conn, 'SELECT id, title, markdown_enabled FROM notes WHERE user_id = ? ORDER BY id DESC',
+                    [(rng.randrange(100),) for _ in range(50)])
+    body = timed(conn, f'SELECT {content} FROM notes WHERE id = ?',
+                 [(rng.randrange(1, args.notes + 1),) for _ in range(500)], note_bodies.decode)
+    conn.close()
+    return listing, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=20000, help='笔记数量（分属 100 个用户）')
+    parser.add_argument('--body-kb', type=int, default=20, help='每条正文的大小（KB）')
+    parser.add_argument('--cache-mb', type=int, default=16, help='SQLite 页缓存大小（MB），与连接池默认值一致')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-bodies-')
+    for split in (False, True):
+        path = os.path.join(workdir, 'split.db' if split else 'inline.db')
+        insert = build(path, split, args)
+        listing, body = measure(path, split, args)
+        print(f"{'分表+压缩' if split else '内联原文'}：文件 {os.path.getsize(path) / 1024 / 1024:8.1f} MB  "
+              f"写入 {args.notes / insert:8.0f} 条/秒  "
+              f"按用户列出 {listing:7.2f} ms/次  读取正文 {body:6.3f} ms/条")
+
+
+if __name__ == '__main__':
+    main()
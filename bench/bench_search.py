@@ -0,0 +1,75 @@
+""" 搜索基准：对比旧的逐条 LCS 扫描与 FTS5 全文索引检索
+
+用法：python bench/bench_search.py --notes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_lcs import dp_lcs  # noqa: E402
+
+WORDS = ['会议', '记录', '项目', '计划', '读书', '笔记', '周报', '旅行', '预算', '学习',
+         'python', 'flask', 'sqlite', 'design', 'review', 'release', 'todo', 'idea']
+
+
+def make_title(rng):
+    """ 生成中英混合的随机标题 """
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def populate(app, conn, user_id, count, seed=42):
+    """ 为指定用户插入 count 条随机笔记（经由 NoteStore，同时建立全文索引） """
+    rng = random.Random(seed)
+    rows = ((make_title(rng), make_title(rng) * 10, 0) for _ in range(count))
+    app.notes_store.insert_many(conn, user_id, rows)
+
+
+def lcs_scan(conn, user_id, query):
+    """ 旧实现：取出全部笔记，逐条用 DP 表计算标题与查询的 LCS """
+    notes = conn.execute('SELECT * FROM notes WHERE user_id = ?', (user_id,)).fetchall()
+    return [note for note in notes if dp_lcs(note['title'], query) > 0]
+
+
+def timed(fn, repeat):
+    """ 重复执行 fn，返回最短耗时（秒）和最后一次结果 """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=100000, help='单个用户的笔记数量')
+    parser.add_argument('--query', default='项目计划', help='搜索关键词')
+    parser.add_argument('--repeat', type=int, default=3, help='每种实现的重复次数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-search-')
+    os.chdir(workdir)  # app 导入时会在当前目录创建 notebook.db
+    import app
+    import search_index
+
+    conn = app.get_db_connection()
+    populate(app, conn, 1, args.notes)
+
+    lcs_time, lcs_rows = timed(lambda: lcs_scan(conn, 1, args.query), args.repeat)
+    fts_time, fts_rows = timed(lambda: search_index.search(conn, 1, args.query), args.repeat)
+    conn.close()
+
+    print(f'notes={args.notes} query={args.query!r}')
+    print(f'LCS scan : {lcs_time * 1000:10.1f} ms  ({len(lcs_rows)} matches)')
+    print(f'FTS5     : {fts_time * 1000:10.1f} ms  ({len(fts_rows)} ranked, limit {search_index.SEARCH_LIMIT})')
+    print(f'speedup  : {lcs_time / fts_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+""" 部署方式吞吐对比：Werkzeug 开发服务器 vs serve.py（gunicorn gthread / uvicorn + asgi.py）
+
+每种方式在子进程中启动 app.py（临时目录中的数据库，预先写入测试笔记），若干客户端
+进程各开几个线程持续请求 /notes/get/<id>、/notes、/notes/page 的混合负载，统计
+每秒请求数和延迟分位数。开发服务器按 app.run(threaded=True) 启动（关闭调试器和重载）。
+需要 gunicorn 和 uvicorn：pip install -r requirements.txt
+用法：python bench/bench_serving.py --workers 2 --threads 8 --clients 4x4 --seconds 10
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5800
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+
+# 在工作目录中建库并写入测试数据
+SEED_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import app
+with app.db_pool.connection() as conn:
+    user_id = app.users.create(conn, {username!r}, {password_hash!r})
+    conn.commit()
+    app.notes_store.insert_many(conn, user_id, ((f'笔记 {{i}}', '- 内容 **加粗** ' * (20 + i % 300), i % 2)
+                                                for i in range({notes})))
+'''
+
+DEV_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import app
+app.app.run(host='127.0.0.1', port={port}, threaded=True)
+'''
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'端口 {port} 未就绪')
+
+
+def login_cookie():
+    data = urllib.parse.urlencode({'username': USERNAME, 'password': PASSWORD}).encode()
+    request = urllib.request.Request(f'http://127.0.0.1:{PORT}/login', data)
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+    try:
+        response = urllib.request.build_opener(NoRedirect).open(request, timeout=30)
+    except urllib.error.HTTPError as exc:
+        response = exc
+    return response.headers['Set-Cookie'].split(';')[0]
+
+
+def client_thread(cookie, paths, deadline, out):
+    """ 使用长连接循环请求，记录每次请求的毫秒数 """
+    conn = None
+    rng = random.Random()
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        path = rng.choice(paths)
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+            conn.request('GET', path, headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn = None
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    out.put((latencies, errors))
+
+
+def client_process(cookie, paths, deadline, threads, out):
+    import queue
+    import threading
+    results = queue.Queue()
+    workers = [threading.Thread(target=client_thread, args=(cookie, paths, deadline, results))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies, errors = [], 0
+    while not results.empty():
+        part, part_errors = results.get()
+        latencies.extend(part)
+        errors += part_errors
+    out.put((latencies, errors))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_mode(name, command, workdir, args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    server = subprocess.Popen(command, cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(PORT)
+        cookie = login_cookie()
+        paths = [f'/notes/get/{random.randint(1, args.notes)}' for _ in range(50)] + \
+                ['/notes', '/notes/page'] * 5
+        processes, threads = (int(n) for n in args.clients.split('x'))
+        out = multiprocessing.Queue()
+        deadline = time.time() + args.seconds
+        clients = [multiprocessing.Process(target=client_process, args=(cookie, paths, deadline, threads, out))
+                   for _ in range(processes)]
+        for client in clients:
+            client.start()
+        latencies, errors = [], 0
+        for _ in clients:
+            part, part_errors = out.get()
+            latencies.extend(part)
+            errors += part_errors
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+    result = {
+        'mode': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / args.seconds, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+    }
+    print(f"{name:<28} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:7.2f}  "
+          f"p99 {result['p99_ms']:7.2f} ms  errors {errors}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='serve.py 的工作进程数')
+    parser.add_argument('--threads', type=int, default=8, help='serve.py 每个工作进程的线程数')
+    parser.add_argument('--clients', default='4x4', help='客户端进程数x每进程线程数')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--modes', default='dev,wsgi,asgi', help='逗号分隔：dev / wsgi / asgi')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-serving-')
+    password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    subprocess.run([sys.executable, '-W', 'ignore', '-c', SEED_SCRIPT.format(
+        root=ROOT, username=USERNAME, password_hash=password_hash, notes=args.notes)], cwd=workdir, check=True)
+
+    serve = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{PORT}',
+             '--workers', str(args.workers), '--threads', str(args.threads)]
+    commands = {
+        'dev': ('werkzeug threaded', [sys.executable, '-c', DEV_SCRIPT.format(root=ROOT, port=PORT)]),
+        'wsgi': (f'gunicorn gthread {args.workers}x{args.threads}', serve),
+        'asgi': (f'uvicorn + asgi.py {args.workers}x{args.threads}', serve + ['--asgi']),
+    }
+    results = []
+    for mode in args.modes.split(','):
+        name, command = commands[mode]
+        results.append(run_mode(name, command, workdir, args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+""" 数据访问层基准：对比 store.NoteStore 与原先路由里的写法（sqlite3.Row 再复制成 dict、逐条插入）
+
+两个应用的表结构（app.py 的 notes、一键.py 的 note）各测一遍：
+列表页、按 id 取笔记、批量取笔记、插入，以及持有大量结果对象时的内存。
+用法：python bench/bench_store.py --notes 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations
+import note_bodies
+import revisions
+import store
+from db_pool import ConnectionPool
+
+SCHEMAS = {
+    'notes': '''
+    CREATE TABLE notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        title TEXT,
+        content TEXT,
+        markdown_enabled INTEGER DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX idx_notes_user_id ON notes (user_id, id DESC);
+    ''',
+    'note': '''
+    CREATE TABLE note (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        version INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX idx_note_user_id ON note (user_id, id DESC);
+    ''',
+}
+USERS = 20
+PAGE_SIZE = 50
+
+
+def make_store(table):
+    if table == 'notes':
+        return store.NoteStore('notes')
+    return store.NoteStore('note', markdown=False)
+
+
+def old_page(conn, table, user_id, preview):
+    """ 原先 一键.py index() 的写法：sqlite3.Row 逐行复制成 dict """
+    column = note_bodies.preview_sql(table, 200) if preview else 'title'
+    rows = conn.execute(f'SELECT id, title, {column} AS content FROM {table} '
+                        'WHERE user_id = ? ORDER BY id DESC LIMIT ?', (user_id, PAGE_SIZE + 1)).fetchall()
+    return [{'id': row['id'], 'title': row['title'], 'content': note_bodies.decode_preview(row['content'], 200)}
+            for row in rows[:PAGE_SIZE]]
+
+
+def old_get(conn, table, note_id, user_id):
+    """ 原先的写法：每次用 f-string 拼出 SQL，再复制成 dict """
+    row = conn.execute(f'SELECT id, title, {note_bodies.content_sql(table)} AS content, user_id FROM {table} '
+                       'WHERE id = ?', (note_id,)).fetchone()
+    if row is None or row['user_id'] != user_id:
+        return None
+    return {'id': row['id'], 'title': row['title'], 'content': note_bodies.decode(row['content'])}
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def held_bytes(func):
+    """ func 返回的对象在内存中占用的字节数 """
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def run(table, args, workdir):
+    path = os.path.join(workdir, f'{table}.db')
+    pool = ConnectionPool(path, size=1)
+    notes = make_store(table)
+    rng = random.Random(42)
+    data = [(f'笔记 {i} ' + '标题' * rng.randint(1, 5), '正文内容 ' * rng.randint(10, 400), i % 2)
+            for i in range(args.notes)]
+    results = {}
+    with pool.connection() as conn:
+        migrations.migrate(conn, [SCHEMAS[table], revisions.revisions_schema(table), note_bodies.bodies_schema(table)])
+
+        # 插入：逐条 INSERT + 提交 与 insert_many 批量插入
+        sample = data[:args.notes // 10]
+        start = time.perf_counter()
+        for title, content, markdown_enabled in sample:
+            notes.create(conn, 0, title, content, markdown_enabled)
+            conn.commit()
+        results['insert_row_per_s'] = len(sample) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for user_id in range(USERS):
+            notes.insert_many(conn, user_id + 1, data[user_id::USERS])
+        results['insert_many_per_s'] = len(data) / (time.perf_counter() - start)
+
+        ids = [rng.randrange(len(sample) + 1, len(sample) + len(data)) for _ in range(args.repeat)]
+        owners = {row[0]: row[1] for row in conn.execute(f'SELECT id, user_id FROM {table}')}
+
+        results['page_old_us'] = timed(lambda i: old_page(conn, table, i % USERS + 1, True), args.repeat)
+        results['page_store_us'] = timed(lambda i: notes.page(conn, i % USERS + 1, size=PAGE_SIZE, preview=True),
+                                         args.repeat)
+        results['get_old_us'] = timed(lambda i: old_get(conn, table, ids[i], owners[ids[i]]), args.repeat)
+        results['get_store_us'] = timed(lambda i: notes.get(conn, ids[i], owners[ids[i]]), args.repeat)
+        results['get_many_old_us'] = timed(lambda i: [old_get(conn, table, note_id, owners[note_id])
+                                                      for note_id in ids[i:i + 20]], args.repeat // 20)
+        results['get_many_store_us'] = timed(lambda i: notes.get_many(conn, ids[i:i + 20]), args.repeat // 20)
+
+        def all_titles_old():
+            return [{'id': row['id'], 'title': row['title']}
+                    for row in conn.execute(f'SELECT id, title FROM {table}')]
+
+        def all_titles_store():
+            return [note for user_id in range(USERS) for note in notes.titles(conn, user_id + 1)]
+        results['titles_old_kb'] = held_bytes(all_titles_old) / 1024
+        results['titles_store_kb'] = held_bytes(all_titles_store) / 1024
+    pool.close_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=20000, help=f'笔记数量（分属 {USERS} 个用户）')
+    parser.add_argument('--repeat', type=int, default=2000, help='每项读取测量的次数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-store-')
+    for table in ('notes', 'note'):
+        r = run(table, args, workdir)
+        print(f'[{table}]')
+        print(f"  插入      逐条提交 {r['insert_row_per_s']:9.0f} 条/秒   insert_many {r['insert_many_per_s']:9.0f} 条/秒")
+        print(f"  列表页    Row→dict {r['page_old_us']:9.1f} µs     NoteStore   {r['page_store_us']:9.1f} µs")
+        print(f"  取一条    Row→dict {r['get_old_us']:9.1f} µs     NoteStore   {r['get_store_us']:9.1f} µs")
+        print(f"  取 20 条  逐条查询 {r['get_many_old_us']:9.1f} µs     get_many    {r['get_many_store_us']:9.1f} µs")
+        print(f"  全部标题  dict     {r['titles_old_kb']:9.0f} KB     Note        {r['titles_store_kb']:9.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
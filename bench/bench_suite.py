@@ -0,0 +1,345 @@
+""" 回归基准套件：生成合成数据，经 Flask 测试客户端和 Socket.IO 测试客户端驱动三个应用，与基线对比
+
+场景覆盖 app.py 的 notes() / 搜索 / get_note()、一键.py 的 index() / search_notes()
+和聊天室的 on_text()。每个场景先预热，再分 --rounds 轮串行发出 --requests 次请求，记录吞吐和
+p50/p95/p99 延迟，结果写成 JSON。标题和正文混合中文、日文、韩文和英文。
+
+与基线比较：p95 比基线慢超过容差，或吞吐低于基线超过容差的场景记为回退，命令以
+状态码 1 退出，可以用作部署前的检查。整个套件在独立的子进程中运行 --runs 次（默认
+3 次），各项取各次的中位数。--update-baseline 默认运行 5 次，基线记录中位数，并按各次
+之间的波动为每个场景记录容差带（波动幅度的两倍，不小于 --tolerance），比较时取两者
+中较大的一个，单次运行的正常抖动不会被误报为回退。基线与机器有关，换机器或有意
+改变性能后用 --update-baseline 在部署环境上重新生成。
+
+用法：
+  python bench/bench_suite.py                          # 与 bench/baseline.json 比较
+  python bench/bench_suite.py --output result.json --scale 2 --rounds 5
+  python bench/bench_suite.py --update-baseline --runs 7
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BASELINE = os.path.join(ROOT, 'bench', 'baseline.json')
+COMPARE_RUNS = 3   # 与基线比较时默认的运行次数
+BASELINE_RUNS = 5  # --update-baseline 默认的运行次数
+
+WORDS = ['会议', '记录', '项目', '计划', '读书', '笔记', '周报', '旅行', '预算', '学习',
+         '議事録', '予定', 'メモ', '勉強', '회의', '일정', '메모', '공부',
+         'python', 'flask', 'sqlite', 'design', 'review', 'release', 'todo', 'idea']
+PASSWORD = 'bench-password'
+
+
+# ---------- 合成数据 ----------
+
+def make_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + f' {rng.randrange(10000)}'
+
+
+def make_body(rng):
+    """ 大多是几百字的短笔记，约 1/10 超过 note_bodies.INLINE_LIMIT """
+    size = rng.randint(4000, 8000) if rng.random() < 0.1 else rng.randint(50, 600)
+    lines = []
+    total = 0
+    while total < size:
+        line = '- ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+
+def make_notes(rng, count):
+    return [(make_title(rng), make_body(rng), rng.randrange(2)) for _ in range(count)]
+
+
+def search_terms(rng, count):
+    """ 一半为可走全文索引的 3 字以上查询，一半为走 LCS 的短查询 """
+    terms = []
+    for i in range(count):
+        word = rng.choice(WORDS)
+        terms.append(word if i % 2 else word[:2])
+    return terms
+
+
+# ---------- 计时 ----------
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_round(func, args):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.requests):
+        t = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput_rps': args.requests / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies),
+    }
+
+
+def run_scenario(name, func, args):
+    """ 预热后串行执行 func(i)，共 args.rounds 轮、每轮 args.requests 次，各项取各轮的中位数 """
+    for i in range(args.warmup):
+        func(i)
+    rounds = [run_round(func, args) for _ in range(args.rounds)]
+    result = {'requests': args.requests, 'rounds': args.rounds}
+    for key in rounds[0]:
+        result[key] = round(statistics.median(r[key] for r in rounds), 3)
+    print(f"{name:<22} {result['throughput_rps']:9.1f} req/s  p50 {result['p50_ms']:8.3f}  "
+          f"p95 {result['p95_ms']:8.3f}  p99 {result['p99_ms']:8.3f} ms")
+    return result
+
+
+def checked(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path} 返回 {response.status_code}')
+    return response
+
+
+def disable_login_limit(module):
+    """ 基准中同一 IP 会登录多个用户，关闭登录/注册限流 """
+    module.limiter.hit = lambda *args, **kwargs: (True, 0.0)
+
+
+# ---------- app.py ----------
+
+def bench_notebook(workdir, args, rng, results):
+    os.chdir(workdir)  # app.py 在当前目录创建 notebook.db
+    app = importlib.import_module('app')
+    disable_login_limit(app)
+    password = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    with app.db_pool.connection() as conn:
+        for user in range(args.users):
+            user_id = app.users.create(conn, f'user{user}', password)
+            conn.commit()
+            app.notes_store.insert_many(conn, user_id, make_notes(rng, args.notes))
+        note_ids = [row[0] for row in conn.execute('SELECT id FROM notes WHERE user_id = 1')]
+
+    client = app.app.test_client()
+    checked(client.post('/login', data={'username': 'user0', 'password': PASSWORD}), 302)
+    terms = search_terms(rng, 64)
+    picks = [rng.choice(note_ids) for _ in range(256)]
+    results['notebook.notes'] = run_scenario(
+        'notebook.notes', lambda i: checked(client.get('/notes')), args)
+    results['notebook.search'] = run_scenario(
+        'notebook.search', lambda i: checked(client.post('/notes', data={'search': terms[i % len(terms)]})), args)
+    results['notebook.get_note'] = run_scenario(
+        'notebook.get_note', lambda i: checked(client.get(f'/notes/get/{picks[i % len(picks)]}')), args)
+
+
+# ---------- 一键.py ----------
+
+def bench_oneclick(workdir, args, rng, results):
+    os.environ.setdefault('PASSWORD_WORKERS', '0')  # 基准中只登录一次，不需要进程池
+    os.environ['SITE_DATABASE'] = os.path.join(workdir, 'site.db')
+    app = importlib.import_module('一键')  # 导入时执行迁移
+    disable_login_limit(app)
+    hashed = app.hasher.hash(PASSWORD)
+    with app.db_pool.connection() as conn:
+        for user in range(args.users):
+            user_id = app.users.create(conn, f'user{user}', hashed)
+            conn.commit()
+            app.notes_store.insert_many(conn, user_id, make_notes(rng, args.notes))
+
+    client = app.app.test_client()
+    checked(client.post('/login', data={'username': 'user0', 'password': PASSWORD}), 302)
+    terms = search_terms(rng, 64)
+    results['oneclick.index'] = run_scenario(
+        'oneclick.index', lambda i: checked(client.get('/')), args)
+    results['oneclick.search'] = run_scenario(
+        'oneclick.search', lambda i: checked(client.get('/search', query_string={'query': terms[i % len(terms)]})),
+        args)
+
+
+# ---------- 简易聊天室.py ----------
+
+def bench_chat(workdir, args, rng, results):
+    os.environ['CHAT_DATABASE'] = os.path.join(workdir, 'chat.db')
+    os.environ['CHAT_TEXT_RATE'] = os.environ['CHAT_TEXT_BURST'] = '1000000'  # 关闭发言限流
+    chat = importlib.import_module('简易聊天室')
+    rooms = []
+    for room in range(args.rooms):
+        client = chat.app.test_client()
+        client.environ_base['REMOTE_ADDR'] = f'10.0.{room // 250}.{room % 250 + 1}'  # 每个 IP 只能加入一个房间
+        response = checked(client.post('/room', data={'username': f'user{room}'}), 302)
+        room_id = response.location.split('/room/')[1].split('?')[0]
+        socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+        socket.emit('join', {'room': room_id, 'user': f'user{room}'})
+        rooms.append((room_id, socket))
+
+    def send(i):
+        room_id, socket = rooms[i % len(rooms)]
+        socket.emit('text', {'room': room_id, 'user': 'bench', 'msg': make_title(rng)})
+        if i % 100 == 0:
+            socket.get_received()  # 丢弃收到的广播，避免测试客户端的队列无限增长
+
+    results['chat.on_text'] = run_scenario('chat.on_text', send, args)
+    for _, socket in rooms:
+        socket.disconnect()
+
+
+# ---------- 多次运行 ----------
+
+def run_suites(args):
+    """ 在本进程中运行一次选中的应用，返回 {场景: 结果} """
+    suites = {'notebook': bench_notebook, 'oneclick': bench_oneclick, 'chat': bench_chat}
+    selected = args.only.split(',') if args.only else list(suites)
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    rng = random.Random(args.seed)
+    results = {}
+    for name in selected:
+        suites[name](workdir, args, rng, results)
+    return results
+
+
+def run_repeated(args):
+    """ 每次在新的子进程中运行整个套件（各应用在导入时建库，不能在同一进程中重复运行），
+    返回各次的结果列表 """
+    runs = []
+    for run in range(args.runs):
+        print(f'--- 第 {run + 1}/{args.runs} 次 ---', flush=True)
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            command = [sys.executable, os.path.abspath(__file__), '--runs', '1', '--no-compare',
+                       '--output', output.name, '--users', str(args.users), '--notes', str(args.notes),
+                       '--rooms', str(args.rooms), '--requests', str(args.requests),
+                       '--rounds', str(args.rounds), '--warmup', str(args.warmup), '--seed', str(args.seed)]
+            if args.only:
+                command += ['--only', args.only]
+            subprocess.run(command, check=True)
+            with open(output.name) as f:
+                runs.append(json.load(f)['scenarios'])
+    return runs
+
+
+def relative_change(value, base):
+    """ value 相对 base 的变化幅度；base 为 0（如舍入后的极短延迟）时无法比较，记为 0 """
+    return value / base - 1 if base > 0 else 0.0
+
+
+def merge_runs(runs, tolerance):
+    """ 各项取各次的中位数；容差带为吞吐和 p95 偏离中位数的最大相对幅度的两倍，不小于 tolerance """
+    merged = {}
+    for name in runs[0]:
+        results = [run[name] for run in runs if name in run]
+        result = {'requests': results[0]['requests'], 'rounds': results[0]['rounds'], 'runs': len(results)}
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+            result[key] = round(statistics.median(r[key] for r in results), 3)
+        spread = max(abs(relative_change(r[key], result[key])) for r in results for key in ('throughput_rps', 'p95_ms'))
+        result['tolerance'] = round(max(tolerance, 2 * spread), 3)
+        merged[name] = result
+    return merged
+
+
+# ---------- 基线比较 ----------
+
+def compare(results, baseline, tolerance):
+    """ 打印与基线的差异，返回回退的场景名；容差取 tolerance 与基线中该场景的容差带中较大的一个 """
+    regressions = []
+    print(f"\n{'场景':<20} {'吞吐变化':>10} {'p95 变化':>10} {'容差':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f'{name:<22} （基线中没有）')
+            continue
+        allowed = max(tolerance, base.get('tolerance', 0))
+        throughput = relative_change(result['throughput_rps'], base['throughput_rps'])
+        p95 = relative_change(result['p95_ms'], base['p95_ms'])
+        regressed = throughput < -allowed or p95 > allowed
+        print(f"{name:<22} {throughput:+10.1%} {p95:+10.1%} {allowed:8.0%}{'  回退' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3, help='每个笔记应用的用户数')
+    parser.add_argument('--notes', type=int, default=2000, help='每个用户的笔记数')
+    parser.add_argument('--rooms', type=int, default=10, help='聊天室房间数（每个房间一个客户端）')
+    parser.add_argument('--scale', type=float, default=1.0, help='按比例放大用户、笔记和房间数')
+    parser.add_argument('--requests', type=int, default=500, help='每个场景测量的请求数')
+    parser.add_argument('--rounds', type=int, default=3, help='每个场景测量的轮数，结果取中位数以减小抖动')
+    parser.add_argument('--warmup', type=int, default=50, help='每个场景的预热请求数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='逗号分隔，只运行 notebook / oneclick / chat 中的部分应用')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', default=BASELINE, help='基线 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的相对回退幅度')
+    parser.add_argument('--runs', type=int,
+                        help=f'在独立子进程中重复运行整个套件的次数，结果取中位数'
+                             f'（默认 {COMPARE_RUNS}，--update-baseline 时为 {BASELINE_RUNS}，1 表示在本进程中运行一次）')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--no-compare', action='store_true', help='只运行和输出结果，不与基线比较')
+    args = parser.parse_args()
+    args.users = max(1, round(args.users * args.scale))
+    args.notes = max(1, round(args.notes * args.scale))
+    args.rooms = max(1, round(args.rooms * args.scale))
+    if args.runs is None:
+        args.runs = BASELINE_RUNS if args.update_baseline else COMPARE_RUNS
+
+    if args.runs > 1:
+        results = merge_runs(run_repeated(args), args.tolerance)
+        print('\n中位数：')
+        for name, result in results.items():
+            print(f"{name:<22} {result['throughput_rps']:9.1f} req/s  p50 {result['p50_ms']:8.3f}  "
+                  f"p95 {result['p95_ms']:8.3f}  p99 {result['p99_ms']:8.3f} ms  容差 {result['tolerance']:.0%}")
+    else:
+        results = run_suites(args)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users, 'notes_per_user': args.notes, 'rooms': args.rooms,
+            'requests': args.requests, 'rounds': args.rounds, 'runs': args.runs, 'seed': args.seed,
+            'tolerance': args.tolerance,
+        },
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'基线已写入 {args.baseline}')
+        return 0
+    if args.no_compare:
+        return 0
+    if not os.path.exists(args.baseline):
+        print('没有基线文件，跳过比较（先用 --update-baseline 生成）')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['scenarios'], args.tolerance)
+    if regressions:
+        print(f"\n回退：{', '.join(regressions)}（容差 {args.tolerance:.0%}）")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
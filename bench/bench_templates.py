@@ -0,0 +1,101 @@
+""" 模板渲染基准：一键.py 首页每 1,000 条笔记的渲染时间
+
+四种方式：
+  string     原先的写法，render_template_string 渲染内联模板，列表项在循环中逐条渲染
+  registry   template_registry 预编译的模板，render_template 按名字渲染，不缓存片段
+  cold       同上，启用片段缓存但全部未命中（每次渲染前清空），即缓存本身的开销
+  fragments  同上，列表项命中片段缓存（按笔记 id + 版本号，预热后）
+另外对比登录页这类没有列表的小页面在 string / registry 下的耗时。
+用法：python bench/bench_templates.py --notes 1000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('PASSWORD_WORKERS', '0')
+os.environ['SITE_DATABASE'] = os.path.join(tempfile.mkdtemp(prefix='bench-templates-'), 'site.db')
+
+from flask import render_template, render_template_string
+
+import store
+import template_registry
+
+oneclick = __import__('一键')
+
+WORDS = ['会议', '记录', '项目', '计划', '读书', '笔记', '議事録', 'メモ', '회의', '메모',
+         'python', 'flask', 'sqlite', '<b>', '&', 'release']
+
+
+def make_notes(rng, count):
+    notes = []
+    for i in range(count, 0, -1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+        preview = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 60)))[:200]
+        notes.append(store.Note(i, title, preview, 1, 0, rng.randint(1, 5)))
+    return notes
+
+
+def timed(func, repeat):
+    """ 返回每次调用的中位毫秒数 """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1000, help='列表中的笔记数')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = oneclick.app
+    notes = make_notes(random.Random(42), args.notes)
+    # 原先的首页模板：列表项直接写在循环里
+    inline_index = oneclick.HTML_INDEX.replace('{{ cached_note_item(note_item, note) }}', oneclick.HTML_NOTE_ITEM)
+    cached = oneclick.note_fragments
+    uncached = template_registry.FragmentCache(0)
+
+    def string():
+        return render_template_string(inline_index, notes=notes, next_after_id=None)
+
+    def registry():
+        return render_template('oneclick/index.html', notes=notes, next_after_id=None)
+
+    def cold():
+        cached.clear()
+        return registry()
+
+    with app.test_request_context('/'):
+        assert string().split() == registry().split()  # 两种方式输出相同（忽略空白）
+        oneclick.note_fragments = uncached
+        no_cache_ms = timed(registry, args.repeat)
+        oneclick.note_fragments = cached
+        cold_ms = timed(cold, args.repeat)
+        registry()  # 预热片段缓存
+        fragment_ms = timed(registry, args.repeat)
+        string_ms = timed(string, args.repeat)
+        login_string_ms = timed(lambda: render_template_string(oneclick.HTML_LOGIN), args.repeat * 50)
+        login_registry_ms = timed(lambda: render_template('oneclick/login.html'), args.repeat * 50)
+
+    per_thousand = 1000 / args.notes
+    print(f'首页 {args.notes} 条笔记，每 1,000 条笔记的渲染时间：')
+    print(f'  string     {string_ms * per_thousand:8.2f} ms')
+    print(f'  registry   {no_cache_ms * per_thousand:8.2f} ms')
+    print(f'  cold       {cold_ms * per_thousand:8.2f} ms')
+    print(f'  fragments  {fragment_ms * per_thousand:8.2f} ms   '
+          f'（片段缓存命中 {cached.hits}，未命中 {cached.misses}）')
+    print('登录页：')
+    print(f'  string     {login_string_ms * 1000:8.1f} µs')
+    print(f'  registry   {login_registry_ms * 1000:8.1f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+""" 批量导入/导出基准：NDJSON 导入吞吐（对比逐条插入并提交）和流式导出吞吐
+
+用法：python bench/bench_transfer.py --notes 1000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ['会议', '记录', '项目', '计划', '读书', '笔记', '周报', '旅行', '预算', '学习',
+         'python', 'flask', 'sqlite', 'design', 'review', 'release', 'todo', 'idea']
+
+
+def write_ndjson(path, count, seed=42):
+    """ 生成 count 条随机笔记的 NDJSON 文件 """
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+            content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+            f.write(json.dumps({'title': title, 'content': content, 'markdown_enabled': 0}, ensure_ascii=False))
+            f.write('\n')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1000000, help='导入的笔记数量')
+    parser.add_argument('--baseline', type=int, default=5000, help='逐条插入对照组的笔记数量')
+    parser.add_argument('--batch', type=int, default=10000, help='每个事务插入的行数')
+    parser.add_argument('--no-fts', action='store_true', help='不维护全文索引，只测量 notes 表本身的写入')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-transfer-')
+    os.chdir(workdir)  # app 导入时会在当前目录创建 notebook.db
+    import app
+    import store
+    import transfer
+
+    path = os.path.join(workdir, 'notes.ndjson')
+    write_ndjson(path, args.notes)
+    print(f'NDJSON 文件 {os.path.getsize(path) / 1024 / 1024:.1f} MB，{args.notes} 条笔记')
+
+    notes = store.NoteStore('notes') if args.no_fts else app.notes_store
+    conn = app.db_pool.acquire()
+    # 对照组：与逐个表单提交相同，每条笔记一次 INSERT + COMMIT
+    with open(path, 'rb') as f:
+        rows = [(n['title'], n['content'], 0) for n, _ in zip(transfer.parse_ndjson(f), range(args.baseline))]
+    start = time.perf_counter()
+    for title, content, markdown_enabled in rows:
+        notes.create(conn, 1, title, content, markdown_enabled)
+        conn.commit()
+    single = len(rows) / (time.perf_counter() - start)
+    print(f'逐条插入：{single:12.0f} 条/秒（{len(rows)} 条）')
+
+    rss_before = peak_rss_mb()
+    with open(path, 'rb') as f:
+        rows = ((n['title'], n['content'], 1 if n.get('markdown_enabled') else 0) for n in transfer.parse_ndjson(f))
+        start = time.perf_counter()
+        total = notes.insert_many(conn, 2, rows, batch=args.batch)
+        elapsed = time.perf_counter() - start
+    print(f'批量导入：{total / elapsed:12.0f} 条/秒（{total} 条，{elapsed:.1f} 秒，'
+          f'峰值 RSS {rss_before:.0f} → {peak_rss_mb():.0f} MB）')
+    conn.close()
+
+    start = time.perf_counter()
+    size = 0
+    for chunk in transfer.ndjson_stream(notes.export(app.db_pool, 2)):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(f'NDJSON 导出：{total / elapsed:9.0f} 条/秒（{size / 1024 / 1024:.1f} MB，峰值 RSS {peak_rss_mb():.0f} MB）')
+
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in transfer.zip_stream(notes.export(app.db_pool, 2)))
+    elapsed = time.perf_counter() - start
+    print(f'zip 导出：{total / elapsed:12.0f} 条/秒（{size / 1024 / 1024:.1f} MB，峰值 RSS {peak_rss_mb():.0f} MB）')
+
+
+if __name__ == '__main__':
+    main()
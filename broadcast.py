@@ -0,0 +1,137 @@
+""" 房间广播调度：按固定节拍合并消息，并对跟不上的客户端做背压
+
+每个节拍内同一房间的消息合并为一个 'messages' 帧发送，房间有 M 个成员、
+一个节拍内有 N 条消息时只发 M 个帧而不是 N×M 个。
+
+客户端每收到一帧就回送 'ack'，携带累计收到的帧数。本进程记录加入房间后发给
+每个客户端的帧数（包括其他进程通过消息队列转发来的帧），两者之差即该客户端
+尚未确认的帧数；确认数不会超过实际发出的帧数，客户端不能靠提前确认绕过背压。超过 high_water 的客户端被移出广播房间并收到 'lagging'
+通知，之后的帧不再发给它（计入丢弃），直到客户端发送 'resync' 重新加入。
+"""
+import threading
+from collections import defaultdict
+
+
+class ClientState:
+    """ 本进程上一个客户端的广播状态 """
+    __slots__ = ('room', 'sent', 'acked', 'lagging')
+
+    def __init__(self, room):
+        self.room = room
+        self.sent = 0           # 加入（或重新同步）后发给客户端的帧数
+        self.acked = 0          # 客户端确认收到的帧数，不超过 sent
+        self.lagging = False
+
+
+class RoomBroadcaster:
+    """ 合并房间消息并跟踪每个客户端的发送积压 """
+
+    def __init__(self, socketio, tick=0.02, high_water=100, namespace='/'):
+        self.socketio = socketio
+        self.tick = tick
+        self.high_water = high_water
+        self.namespace = namespace
+        self._pending = defaultdict(list)   # room -> [message, ...]
+        self._clients = {}                  # sid -> ClientState
+        self._members = defaultdict(set)    # room -> {sid, ...}，最后一个成员离开时删除
+        self._lock = threading.Lock()
+        self._running = False
+        self.counters = {
+            'messages_enqueued': 0,
+            'frames_sent': 0,
+            'clients_degraded': 0,
+            'messages_dropped': 0,
+        }
+
+    # ---------- 消息入队与发送 ----------
+
+    def enqueue(self, room, message):
+        """ 把消息放入房间的待发队列，在下一个节拍发送 """
+        with self._lock:
+            self._pending[room].append(message)
+            self.counters['messages_enqueued'] += 1
+        if not self._running:
+            self._running = True
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while self._running:
+            self.socketio.sleep(self.tick)
+            self.flush()
+
+    def flush(self):
+        """ 把所有房间的待发消息各合并成一帧发出 """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(list)
+        for room, messages in pending.items():
+            self.socketio.emit('messages', {'room': room, 'messages': messages},
+                               to=room, namespace=self.namespace)
+            self.counters['frames_sent'] += 1
+            self.frame_delivered(room, len(messages))
+
+    def frame_delivered(self, room, size):
+        """ 一帧送达房间（本进程发出或其他进程转发），检查成员积压 """
+        degraded = []
+        with self._lock:
+            for sid in self._members.get(room, ()):
+                state = self._clients[sid]
+                if state.lagging:
+                    self.counters['messages_dropped'] += size
+                    continue
+                state.sent += 1
+                if state.sent - state.acked > self.high_water:
+                    state.lagging = True
+                    self.counters['clients_degraded'] += 1
+                    degraded.append(sid)
+        for sid in degraded:
+            self.socketio.server.leave_room(sid, room, namespace=self.namespace)
+            self.socketio.emit('lagging', {'room': room}, to=sid, namespace=self.namespace)
+
+    # ---------- 客户端状态 ----------
+
+    def track(self, sid, room):
+        """ 客户端加入房间（或重新同步）后调用 """
+        with self._lock:
+            self._untrack_locked(sid)
+            self._clients[sid] = ClientState(room)
+            self._members[room].add(sid)
+
+    def untrack(self, sid):
+        """ 客户端离开或断开时调用 """
+        with self._lock:
+            self._untrack_locked(sid)
+
+    def _untrack_locked(self, sid):
+        state = self._clients.pop(sid, None)
+        if state is not None:
+            members = self._members.get(state.room)
+            if members is not None:
+                members.discard(sid)
+                if not members:
+                    del self._members[state.room]
+
+    def ack(self, sid, count):
+        """ 客户端确认累计收到 count 帧；超过实际发出帧数的部分不予承认 """
+        with self._lock:
+            state = self._clients.get(sid)
+            if state is not None and count > state.acked:
+                state.acked = min(count, state.sent)
+
+    def depth(self, sid):
+        """ 客户端尚未确认的帧数 """
+        with self._lock:
+            state = self._clients.get(sid)
+            if state is None:
+                return 0
+            return state.sent - state.acked
+
+    def stats(self):
+        """ 返回计数器和当前状态 """
+        with self._lock:
+            depths = [s.sent - s.acked for s in self._clients.values() if not s.lagging]
+            return dict(self.counters,
+                        clients=len(self._clients),
+                        rooms=len(self._members),
+                        clients_lagging=sum(1 for s in self._clients.values() if s.lagging),
+                        max_client_depth=max(depths, default=0),
+                        pending_messages=sum(len(m) for m in self._pending.values()))
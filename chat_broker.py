@@ -0,0 +1,194 @@
+""" 聊天室多进程广播：基于 Unix 套接字的本地发布/订阅代理
+
+多个聊天室进程通过同一个代理交换 Socket.IO 房间广播，使连接在不同进程上的
+客户端能进入同一个房间。生产环境也可以改用 Redis 等消息队列，由
+CHAT_MESSAGE_QUEUE 选择：
+
+- 留空                         单进程，使用 Socket.IO 默认的进程内管理器
+- unix:///tmp/chat-broker.sock 本模块提供的代理（先运行 python chat_broker.py）
+- redis://... / amqp://...     交给 Flask-SocketIO 自带的消息队列后端
+
+帧格式：4 字节大端长度 + JSON 数据。连接建立后先发送 1 字节角色：
+b'P' 只发布，b'S' 只订阅。代理把每个发布的帧转发给所有订阅者。
+"""
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+
+import socketio
+
+HEADER = struct.Struct('>I')
+ROLE_PUBLISH = b'P'
+ROLE_SUBSCRIBE = b'S'
+MAX_SUBSCRIBER_BUFFER = 16 * 1024 * 1024  # 订阅者积压超过该字节数时断开它
+
+
+# ---------- 代理 ----------
+
+class Broker:
+    """ 发布/订阅代理，单线程 asyncio 实现 """
+
+    def __init__(self, path):
+        self.path = path
+        self.subscribers = set()
+        self.frames = 0
+
+    async def handle(self, reader, writer):
+        try:
+            role = await reader.readexactly(1)
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        if role == ROLE_SUBSCRIBE:
+            self.subscribers.add(writer)
+            try:
+                await reader.read()  # 订阅者不发送数据，等待其断开
+            finally:
+                self.subscribers.discard(writer)
+                writer.close()
+            return
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                payload = await reader.readexactly(HEADER.unpack(header)[0])
+                self.frames += 1
+                for subscriber in list(self.subscribers):
+                    if subscriber.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                        self.subscribers.discard(subscriber)  # 慢订阅者，断开后由其自行重连
+                        subscriber.close()
+                        continue
+                    subscriber.write(header + payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        async with server:
+            await server.serve_forever()
+
+
+def run_broker(path):
+    """ 在当前进程运行代理，直到被中断 """
+    try:
+        asyncio.run(Broker(path).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------- Socket.IO 客户端管理器 ----------
+
+class RemoteEmitMixin:
+    """ 其他进程的广播到达本进程时调用 remote_emit_callback(event, room, args)，与 PubSubManager 子类组合使用 """
+    remote_emit_callback = None
+
+    def _handle_emit(self, message):
+        super()._handle_emit(message)
+        callback = self.remote_emit_callback
+        if callback is not None and message.get('host_id') != self.host_id and not message.get('binary'):
+            callback(message['event'], message.get('room'), message['data'])
+
+
+class RedisManager(RemoteEmitMixin, socketio.RedisManager):
+    """ 可观察远端广播的 Redis 管理器 """
+
+
+class KombuManager(RemoteEmitMixin, socketio.KombuManager):
+    """ 可观察远端广播的 Kombu（AMQP 等）管理器 """
+
+
+class UnixSocketManager(RemoteEmitMixin, socketio.PubSubManager):
+    """ 通过 Unix 套接字代理在多个进程间同步房间广播的客户端管理器 """
+    name = 'unix'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('unix://'):]
+        self._socket_module = socket
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def initialize(self):
+        if self.server.async_mode == 'eventlet':  # 未 monkey patch 时也不阻塞事件循环
+            from eventlet.green import socket as green_socket
+            from eventlet.semaphore import Semaphore
+            self._socket_module = green_socket
+            self._publish_lock = Semaphore()
+        super().initialize()
+
+    def _connect(self, role):
+        sock = self._socket_module.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.sendall(role)
+        return sock
+
+    def _publish(self, data):
+        frame = self.json.dumps(data).encode('utf-8')
+        frame = HEADER.pack(len(frame)) + frame
+        with self._publish_lock:
+            for retries_left in (1, 0):  # 连接断开时重连一次
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(ROLE_PUBLISH)
+                    self._publisher.sendall(frame)
+                    return
+                except OSError:
+                    self._publisher = None
+                    if not retries_left:
+                        self._get_logger().error('无法连接聊天广播代理 %s', self.path)
+
+    def _read_exactly(self, sock, size):
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('代理连接已关闭')
+            data += chunk
+        return data
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect(ROLE_SUBSCRIBE)
+            except OSError:
+                self.server.sleep(1)  # 代理尚未启动，稍后重试
+                continue
+            try:
+                while True:
+                    size = HEADER.unpack(self._read_exactly(sock, HEADER.size))[0]
+                    yield self._read_exactly(sock, size)
+            except (OSError, ConnectionError):
+                sock.close()
+                self.server.sleep(1)
+
+
+def socketio_options(url):
+    """ 根据消息队列地址返回 SocketIO() 的参数（按地址选择管理器，与 Flask-SocketIO 的 message_queue 相同） """
+    if not url:
+        return {}
+    if url.startswith('unix://'):
+        return {'client_manager': UnixSocketManager(url)}
+    if url.startswith(('redis://', 'rediss://')):
+        return {'client_manager': RedisManager(url)}
+    return {'client_manager': KombuManager(url)}
+
+
+def on_remote_emit(manager, callback):
+    """ 其他进程广播事件到达本进程时调用 callback(event, room, args) """
+    if isinstance(manager, RemoteEmitMixin):  # 单进程模式没有远端广播
+        manager.remote_emit_callback = callback
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='聊天室广播代理')
+    parser.add_argument('--socket', default='/tmp/chat-broker.sock', help='Unix 套接字路径')
+    args = parser.parse_args()
+    print(f'{time.strftime("%H:%M:%S")} 聊天广播代理监听 {args.socket}')
+    run_broker(args.socket)
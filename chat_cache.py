@@ -0,0 +1,140 @@
+""" 聊天室成员与房间缓存：把 joins / rooms 的存在性检查留在内存中
+
+- TTLCache     带过期时间的读穿缓存，缺失结果也会缓存（较短的负缓存时间）
+- BloomFilter  房间 id 的布隆过滤器，判定“肯定不存在”时无需查库
+- RoomDirectory / MembershipCache 在上面两者之上封装房间存在性和 IP 加入记录
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """ 定长、带过期时间的缓存；过期项在读取时惰性删除 """
+
+    def __init__(self, maxsize=10000, ttl=3600.0, negative_ttl=5.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl  # 值为 None（查不到）时的缓存时间
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ 返回缓存的值；未命中或已过期时返回 MISSING """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry[1] <= self.clock():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (value, self.clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter:
+    """ 布隆过滤器：可能误判为存在，但不会把已添加的元素判为不存在 """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))  # 双重散列
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RoomDirectory:
+    """ 房间存在性检查：布隆过滤器 → 缓存 → 数据库
+
+    authoritative 为 True 时，布隆过滤器判定不存在即返回，只在所有建房都经过
+    本进程时成立；多进程部署时其他进程新建的房间不在本进程的过滤器中，
+    此时过滤器的否定结果仍会回查缓存和数据库。
+    """
+
+    def __init__(self, pool, authoritative=True, capacity=100000):
+        self.pool = pool
+        self.authoritative = authoritative
+        self.bloom = BloomFilter(capacity)
+        self.cache = TTLCache()
+        self.bloom_rejects = 0
+        with self.pool.connection() as db:
+            for (room_id,) in db.execute('SELECT id FROM rooms'):
+                self.bloom.add(room_id)
+
+    def exists(self, room_id):
+        if self.authoritative and room_id not in self.bloom:
+            self.bloom_rejects += 1
+            return False
+        cached = self.cache.get(room_id)
+        if cached is not MISSING:
+            return cached is not None
+        with self.pool.connection() as db:
+            found = db.execute('SELECT 1 FROM rooms WHERE id = ?', (room_id,)).fetchone() is not None
+        self.cache.put(room_id, True if found else None)
+        if found:
+            self.bloom.add(room_id)
+        return found
+
+    def added(self, room_id):
+        """ 新房间写入数据库后调用 """
+        self.bloom.add(room_id)
+        self.cache.put(room_id, True)
+
+
+class MembershipCache:
+    """ IP 所加入房间的读穿/写穿缓存 """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.cache = TTLCache()
+
+    def room_of(self, ip):
+        """ 返回该 IP 加入的房间 id，未加入时返回 None """
+        cached = self.cache.get(ip)
+        if cached is not MISSING:
+            return cached
+        with self.pool.connection() as db:
+            row = db.execute('SELECT room_id FROM joins WHERE ip = ?', (ip,)).fetchone()
+        room_id = row[0] if row else None
+        self.cache.put(ip, room_id)
+        return room_id
+
+    def joined(self, ip, room_id):
+        """ 加入记录写入数据库后调用 """
+        self.cache.put(ip, room_id)
@@ -0,0 +1,169 @@
+""" SQLite 连接池：复用长连接，避免每个请求重新连接和读取表结构 """
+import itertools
+import queue
+import sqlite3
+import threading
+
+# 每个新连接执行一次的 PRAGMA
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),         # 读写互不阻塞
+    ('synchronous', 'NORMAL'),       # WAL 模式下只在检查点时 fsync
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16000),          # 负数单位为 KiB，约 16 MB 页缓存
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+
+class PoolTimeout(Exception):
+    """ 在超时时间内没有可用连接 """
+
+
+class PooledConnection(sqlite3.Connection):
+    """ 由连接池管理的连接：close() 把连接归还给连接池而不是真正关闭
+
+    每次 acquire() 给连接分配新的租约编号 lease，归还后为 None。close() 由当前持有者
+    调用；替持有者归还连接的代码（例如请求结束钩子）应记下取出时的 lease，
+    用 pool.release(conn, lease) 归还，连接已被归还并由他人取走时不会误归还。
+    """
+    pool = None
+    lease = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+
+class ConnectionPool:
+    """ 有界连接池，连接在首次需要时创建，最多 size 个 """
+
+    def __init__(self, database, size=8, timeout=10.0, pragmas=DEFAULT_PRAGMAS,
+                 row_factory=sqlite3.Row, detect_types=0, cached_statements=256, on_connect=None,
+                 factory=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.row_factory = row_factory
+        self.detect_types = detect_types
+        self.cached_statements = cached_statements  # 每个连接缓存的预编译语句数
+        self.on_connect = on_connect  # 新连接创建后调用，例如注册 SQL 函数
+        self.factory = factory or PooledConnection  # 连接类，必须是 PooledConnection 的子类
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用页缓存最热的连接
+        self._lock = threading.Lock()
+        self._leases = itertools.count(1)
+        self._created = 0
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def _connect(self):
+        """ 创建并配置一个新连接 """
+        conn = sqlite3.connect(
+            self.database,
+            detect_types=self.detect_types,
+            check_same_thread=False,  # 连接会在不同线程之间传递，但同一时间只有一个持有者
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+        )
+        conn.row_factory = self.row_factory
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """ 取出一个连接；池已满时等待其他请求归还 """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    self._waits += 1
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f'{self.timeout} 秒内没有可用的数据库连接') from None
+        with self._lock:
+            self._acquired += 1
+            conn.lease = next(self._leases)
+        return conn
+
+    def release(self, conn, lease=None):
+        """ 归还连接，回滚未提交的事务；重复归还会被忽略
+
+        传入 lease 时只在它仍是连接当前的租约时归还：连接已被归还、又被其他调用方
+        取出后，过期的归还不会回滚对方的事务或把正在使用的连接放回池中。
+        """
+        if conn.lease is None or (lease is not None and lease != conn.lease):
+            return
+        conn.lease = None
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def connection(self):
+        """ 以 with 语句使用连接，结束时自动归还 """
+        return _Lease(self)
+
+    def close_all(self):
+        """ 关闭所有空闲连接 """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            sqlite3.Connection.close(conn)
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        """ 返回连接池指标 """
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'created': self._created,
+                'idle': idle,
+                'in_use': self._created - idle,
+                'acquired_total': self._acquired,
+                'waits_total': self._waits,
+                'timeouts_total': self._timeouts,
+            }
+
+
+class _Lease:
+    """ connection() 返回的上下文管理器 """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+        self.lease = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire()
+        self.lease = self.conn.lease
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.conn, self.lease)
+        self.conn = self.lease = None
@@ -0,0 +1,112 @@
+""" 聊天消息写后日志：处理函数只把消息放入队列，后台任务批量写入 SQLite
+
+durability 决定消息何时落盘：
+- 'sync'  每条消息立即插入并提交（原来的行为，最安全也最慢）
+- 'batch' 消息先进入内存队列，后台每隔 flush_interval 秒或积累 batch_size 条后
+          用一个事务批量写入；进程崩溃时最多丢失最近一个间隔内的消息
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('sync', 'batch')
+
+INSERT_MESSAGE = 'INSERT INTO messages (room_id, ip, username, content, sent_at) VALUES (?, ?, ?, ?, ?)'
+
+
+def _start_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+class MessageJournal:
+    """ 批量持久化聊天消息 """
+
+    def __init__(self, pool, durability='batch', batch_size=200, flush_interval=0.05,
+                 start_background_task=_start_thread, sleep=time.sleep):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'未知的 durability 模式：{durability}')
+        self.pool = pool
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.start_background_task = start_background_task  # 在 eventlet 下传入 socketio.start_background_task
+        self.sleep = sleep
+        self._pending = deque()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self.written = 0   # 已写入的消息数
+        self.batches = 0   # 已提交的事务数
+
+    def append(self, room_id, ip, username, content, sent_at, item=None):
+        """ 记录一条消息；batch 模式下立即返回。写入后把消息 id 赋给 item.id """
+        row = (room_id, ip, username, content, sent_at)
+        if self.durability == 'sync':
+            with self.pool.connection() as db:
+                cursor = db.execute(INSERT_MESSAGE, row)
+                db.commit()
+            if item is not None:
+                item.id = cursor.lastrowid
+            self.written += 1
+            self.batches += 1
+            return
+        self._pending.append((row, item))
+        if not self._running:
+            self.start()
+        elif len(self._pending) >= self.batch_size:
+            self.start_background_task(self.flush)  # 积压达到批量大小，不等定时器
+
+    def start(self):
+        """ 启动后台写入任务 """
+        if self._running:
+            return
+        self._running = True
+        self.start_background_task(self._run)
+
+    def _run(self):
+        while self._running:
+            self.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('写入聊天消息失败，将在下次重试')
+
+    def flush(self):
+        """ 把队列中的消息全部写入数据库，返回写入条数 """
+        with self._flush_lock:
+            total = 0
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                try:
+                    with self.pool.connection() as db:
+                        db.executemany(INSERT_MESSAGE, [row for row, _ in batch])
+                        # 事务持有写锁，同一批消息的自增 id 连续
+                        last_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+                        db.commit()
+                except Exception:
+                    self._pending.extendleft(reversed(batch))  # 放回队首，保持顺序
+                    raise
+                first_id = last_id - len(batch) + 1
+                for offset, (_, item) in enumerate(batch):
+                    if item is not None:
+                        item.id = first_id + offset
+                total += len(batch)
+                self.written += len(batch)
+                self.batches += 1
+            return total
+
+    def stop(self):
+        """ 停止后台任务并写入剩余消息，进程退出前调用 """
+        self._running = False
+        self.flush()
+
+    @property
+    def pending(self):
+        """ 尚未写入的消息数 """
+        return len(self._pending)
@@ -0,0 +1,366 @@
+""" 可选的请求级指标：路由延迟直方图、SQL 语句数和耗时、模板渲染耗时、LCS 比较次数
+
+默认关闭，设置环境变量 METRICS_ENABLED=1 后启用：
+
+- GET /metrics 以 Prometheus 文本格式输出按路由（endpoint）汇总的指标；
+- METRICS_PROFILE_MS 大于 0 时，按 METRICS_PROFILE_SAMPLE 的比例（默认 0.01）
+  对请求开启 cProfile，耗时超过该毫秒数的请求把统计写入 METRICS_PROFILE_DIR
+  （默认 profiles/），可用 python -m pstats 或 snakeviz 查看。同一时间只采样一个请求。
+
+SQL 指标需要在连接池创建连接之前调用 instrument(pool)：语句数来自
+set_trace_callback（包括触发器内执行的语句），耗时来自包装后的连接和游标
+（execute 以及逐行读取结果的时间）。不在请求中执行的 SQL（例如后台写入任务）
+记在 route="-" 下。
+
+/metrics 不做鉴权，只应暴露给内网的采集端。
+"""
+import bisect
+import cProfile
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import before_render_template, request, template_rendered
+
+from db_pool import PooledConnection
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = '-'  # 请求之外的 SQL 记在这个路由名下
+UNMATCHED = '<unmatched>'  # 没有匹配到路由的请求（404 等）
+
+_local = threading.local()  # 当前请求的累计值；eventlet monkey patch 后按协程隔离
+
+
+class _Histogram:
+    """ 累计直方图，counts[i] 为落入第 i 个桶（不累计）的次数，最后一个为 +Inf """
+
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+
+
+class _RouteStats:
+    __slots__ = ('latency', 'requests', 'errors', 'sql_statements', 'sql_seconds',
+                 'render_seconds', 'counters')
+
+    def __init__(self, buckets):
+        self.latency = _Histogram(len(buckets))
+        self.requests = 0
+        self.errors = 0  # 状态码 >= 500 或抛出异常
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.counters = {}  # Metrics.count() 记录的自定义计数，例如 lcs_comparisons
+
+
+class _RequestState:
+    __slots__ = ('route', 'start', 'sql_statements', 'sql_seconds', 'render_start',
+                 'render_seconds', 'counters', 'profiler', 'failed')
+
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.render_start = None
+        self.render_seconds = 0.0
+        self.counters = {}
+        self.profiler = None
+        self.failed = False
+
+
+def _current():
+    return getattr(_local, 'state', None)
+
+
+class Metrics:
+    """ 指标汇总；enabled 为 False 时 init_app / instrument 什么也不做 """
+
+    def __init__(self, enabled=True, buckets=LATENCY_BUCKETS, profile_ms=0, profile_sample=0.01,
+                 profile_dir='profiles'):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.profile_ms = profile_ms
+        self.profile_sample = profile_sample
+        self.profile_dir = profile_dir
+        self.profiles_written = 0
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """ 按 METRICS_* 环境变量创建 """
+        return cls(enabled=os.environ.get('METRICS_ENABLED', '0') == '1',
+                   profile_ms=float(os.environ.get('METRICS_PROFILE_MS', '0')),
+                   profile_sample=float(os.environ.get('METRICS_PROFILE_SAMPLE', '0.01')),
+                   profile_dir=os.environ.get('METRICS_PROFILE_DIR', 'profiles'))
+
+    # ---------- 接入 ----------
+
+    def init_app(self, app):
+        """ 注册请求钩子、模板渲染信号和 /metrics 路由 """
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._after_render, app, weak=False)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    def instrument(self, pool):
+        """ 让连接池之后创建的连接记录 SQL 语句数和耗时 """
+        if not self.enabled:
+            return
+        on_connect = pool.on_connect
+
+        def trace(conn):
+            if on_connect is not None:
+                on_connect(conn)
+            conn.set_trace_callback(self._on_statement)
+        pool.on_connect = trace
+        pool.factory = type('TimedConnection', (TimedConnection,), {'metrics': self})
+
+    def track(self, name):
+        """ 装饰非 HTTP 的处理函数（例如 Socket.IO 事件），按 name 记录与路由相同的指标 """
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                self._begin(name)
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    _local.state.failed = True
+                    raise
+                finally:
+                    self._end()
+            return wrapper
+        return decorator
+
+    def count(self, name, amount=1):
+        """ 给当前请求的自定义计数器加 amount，输出为 <name>_total；未启用或不在请求中时什么也不做 """
+        state = _current()
+        if state is not None:
+            state.counters[name] = state.counters.get(name, 0) + amount
+
+    # ---------- 请求生命周期 ----------
+
+    def _begin(self, route):
+        state = _RequestState(route)
+        if self.profile_ms > 0 and random.random() < self.profile_sample \
+                and self._profile_lock.acquire(blocking=False):
+            state.profiler = cProfile.Profile()
+            state.profiler.enable()
+        _local.state = state
+
+    def _end(self):
+        state = _current()
+        if state is None:
+            return
+        _local.state = None
+        elapsed = time.perf_counter() - state.start
+        if state.profiler is not None:
+            state.profiler.disable()
+            self._profile_lock.release()
+            if elapsed * 1000 >= self.profile_ms:
+                self._dump_profile(state, elapsed)
+        index = bisect.bisect_left(self.buckets, elapsed)  # 第一个上界 >= elapsed 的桶
+        with self._lock:
+            stats = self._stats(state.route)
+            stats.requests += 1
+            stats.errors += state.failed
+            stats.latency.counts[index] += 1
+            stats.latency.sum += elapsed
+            stats.sql_statements += state.sql_statements
+            stats.sql_seconds += state.sql_seconds
+            stats.render_seconds += state.render_seconds
+            for name, amount in state.counters.items():
+                stats.counters[name] = stats.counters.get(name, 0) + amount
+
+    def _before_request(self):
+        self._begin(request.endpoint or UNMATCHED)
+
+    def _after_request(self, response):
+        state = _current()
+        if state is not None and response.status_code >= 500:
+            state.failed = True
+        return response
+
+    def _teardown_request(self, exception):
+        state = _current()
+        if state is not None:
+            state.failed = state.failed or exception is not None
+            self._end()
+
+    def _before_render(self, sender, template, context, **extra):
+        state = _current()
+        if state is not None:
+            state.render_start = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        state = _current()
+        if state is not None and state.render_start is not None:
+            state.render_seconds += time.perf_counter() - state.render_start
+            state.render_start = None
+
+    def _stats(self, route):
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = _RouteStats(self.buckets)
+        return stats
+
+    def _on_statement(self, statement):
+        """ set_trace_callback 的回调，每条语句（包括触发器内的语句）调用一次 """
+        state = _current()
+        if state is not None:
+            state.sql_statements += 1
+        else:
+            with self._lock:
+                self._stats(BACKGROUND).sql_statements += 1
+
+    def _on_sql_time(self, seconds):
+        state = _current()
+        if state is not None:
+            state.sql_seconds += seconds
+        else:
+            with self._lock:
+                self._stats(BACKGROUND).sql_seconds += seconds
+
+    def _dump_profile(self, state, elapsed):
+        with self._lock:
+            self.profiles_written += 1
+            number = self.profiles_written
+        os.makedirs(self.profile_dir, exist_ok=True)
+        route = ''.join(char if char.isalnum() or char in '-_' else '_' for char in state.route)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{number}-{route}-{elapsed * 1000:.0f}ms.prof'
+        state.profiler.dump_stats(os.path.join(self.profile_dir, name))
+
+    # ---------- 输出 ----------
+
+    def render(self):
+        """ Prometheus 文本格式 """
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP http_request_duration_seconds 请求处理耗时',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for route, stats in routes:
+                if not stats.requests:
+                    continue
+                label = _escape(route)
+                total = 0
+                for bound, bucket in zip(self.buckets + (None,), stats.latency.counts):
+                    total += bucket
+                    le = '+Inf' if bound is None else repr(bound)
+                    lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="{le}"}} {total}')
+                lines.append(f'http_request_duration_seconds_sum{{route="{label}"}} {stats.latency.sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{route="{label}"}} {stats.requests}')
+            lines += _counter_lines('http_request_errors_total', '状态码 >= 500 或抛出异常的请求数',
+                                    ((route, stats.errors) for route, stats in routes if stats.requests))
+            lines += _counter_lines('sql_statements_total', '执行的 SQL 语句数（含触发器内的语句）',
+                                    ((route, stats.sql_statements) for route, stats in routes))
+            lines += _counter_lines('sql_seconds_total', '执行 SQL 和读取结果的耗时',
+                                    ((route, f'{stats.sql_seconds:.6f}') for route, stats in routes))
+            lines += _counter_lines('template_render_seconds_total', '模板渲染耗时',
+                                    ((route, f'{stats.render_seconds:.6f}') for route, stats in routes
+                                     if stats.requests))
+            names = sorted({name for _, stats in routes for name in stats.counters})
+            for name in names:
+                lines += _counter_lines(f'{name}_total', None,
+                                        ((route, stats.counters.get(name, 0)) for route, stats in routes
+                                         if stats.requests))
+            lines += ['# TYPE slow_request_profiles_total counter',
+                      f'slow_request_profiles_total {self.profiles_written}']
+        return '\n'.join(lines) + '\n'
+
+    def _metrics_view(self):
+        return self.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _counter_lines(name, help_text, values):
+    lines = []
+    if help_text:
+        lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for route, value in values:
+        lines.append(f'{name}{{route="{_escape(route)}"}} {value}')
+    return lines
+
+
+# ---------- SQL 计时 ----------
+
+class TimedCursor(sqlite3.Cursor):
+    """ 记录 execute 和读取结果耗时的游标 """
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            self.connection.metrics._on_sql_time(time.perf_counter() - start)
+
+
+class TimedConnection(PooledConnection):
+    """ 游标为 TimedCursor 的池化连接；Metrics.instrument 生成设置了 metrics 的子类作为连接池的连接类 """
+    metrics = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
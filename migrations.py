@@ -0,0 +1,53 @@
+""" 数据库迁移：按 PRAGMA user_version 记录的版本号依次执行未应用的迁移
+
+每个应用维护自己的迁移列表，列表第 i 项（从 1 开始计数）把数据库升级到版本 i。
+迁移项可以是一段 SQL 脚本，也可以是接收连接的函数。已发布的迁移不要修改，
+需要变更结构时在列表末尾追加新的迁移。
+"""
+import sqlite3
+
+
+def split_statements(script):
+    """ 把 SQL 脚本拆成单条语句（正确处理触发器中的 BEGIN ... END） """
+    statements = []
+    buffer = ''
+    parts = script.split(';')
+    for i, part in enumerate(parts):  # 在每个分号处检查，同一行里的多条语句也能拆开
+        buffer += part if i == len(parts) - 1 else part + ';'
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def current_version(conn):
+    """ 返回数据库当前的结构版本 """
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations):
+    """ 执行所有未应用的迁移，每个迁移在独立事务中完成，返回最终版本 """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # 手动管理事务
+    try:
+        for version, step in enumerate(migrations, start=1):
+            if current_version(conn) >= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')  # 获取写锁，防止多个进程同时迁移
+            try:
+                if current_version(conn) < version:  # 拿到锁后再次确认
+                    if callable(step):
+                        step(conn)
+                    else:
+                        for statement in split_statements(step):
+                            conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return current_version(conn)
+    finally:
+        conn.isolation_level = isolation_level
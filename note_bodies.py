@@ -0,0 +1,121 @@
+""" 大笔记正文的压缩与分表存储
+
+超过 INLINE_LIMIT 个字符的正文移到 note_bodies 表，笔记表的 content
+列只留下一个零长度 BLOB 作为标记。列表、搜索等只读标题的查询不再扫过正文
+所在的溢出页，也不会把它们读进页缓存。note_bodies.data 的第一个字节说明编码：
+
+- 0  其余字节为 UTF-8 原文
+- 1  其余字节为 zlib 压缩后的 UTF-8（压缩后节省不到 1/8 时存原文）
+
+编码和分表由数据访问层（store.NoteStore）在 Python 中完成，数据库结构里只有纯 SQL：
+写入时用 inline() 得到 content 列的值，再用 store_body() 写入或删除 note_bodies 中的
+正文；读取时用 content_sql() / preview_sql() 生成的表达式代替 content 列，结果是
+TEXT（内联的正文）或 BLOB（pack() 的结果），由 decode() / decode_preview() 转为文本。
+sqlite3 命令行等没有注册任何函数的连接也能正常读写（直接写入的长正文保持内联）。
+"""
+import zlib
+
+import migrations
+
+INLINE_LIMIT = 2048     # 超过该字符数的正文移到 note_bodies
+COMPRESS = True         # 关闭后仍分表存储，但不压缩
+RAW = 0
+ZLIB = 1
+
+
+def pack(text):
+    """ 正文编码为带格式字节的 BLOB """
+    data = text.encode('utf-8')
+    if COMPRESS:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data) - len(data) // 8:
+            return bytes((ZLIB,)) + compressed
+    return bytes((RAW,)) + data
+
+
+def unpack(blob):
+    """ pack() 的逆操作 """
+    if blob is None:
+        return None
+    if blob[0] == ZLIB:
+        return zlib.decompress(blob[1:]).decode('utf-8')
+    return blob[1:].decode('utf-8')
+
+
+def preview(blob, length):
+    """ 只解码正文的前 length 个字符，压缩数据只解压需要的部分 """
+    if blob is None:
+        return None
+    limit = length * 4  # UTF-8 每个字符最多 4 字节
+    if blob[0] == ZLIB:
+        data = zlib.decompressobj().decompress(blob[1:], limit)
+    else:
+        data = blob[1:1 + limit]
+    return data.decode('utf-8', 'ignore')[:length]
+
+
+def decode(value):
+    """ content_sql() 读出的值转为正文 """
+    return unpack(value) if isinstance(value, bytes) else value
+
+
+def decode_preview(value, length):
+    """ preview_sql() 读出的值转为正文的前 length 个字符 """
+    return preview(value, length) if isinstance(value, bytes) else value
+
+
+def inline(content):
+    """ 写入笔记表 content 列的值：长正文只留一个零长度 BLOB 作为标记 """
+    return b'' if len(content) > INLINE_LIMIT else content
+
+
+def store_body(conn, note_id, content):
+    """ content 列写入 inline(content) 之后调用，写入或删除 note_bodies 中的正文 """
+    conn.execute('DELETE FROM note_bodies WHERE note_id = ?', (note_id,))
+    if len(content) > INLINE_LIMIT:
+        conn.execute('INSERT INTO note_bodies (note_id, data) VALUES (?, ?)', (note_id, pack(content)))
+
+
+def move_bodies(conn, table, first_id):
+    """ 把 id 不小于 first_id、以文本写入的长正文移到 note_bodies（批量导入后调用） """
+    rows = conn.execute(f"SELECT id, content FROM {table} WHERE id >= ? "
+                        f"AND typeof(content) = 'text' AND length(content) > {INLINE_LIMIT}",
+                        (first_id,)).fetchall()
+    for note_id, content in rows:
+        conn.execute('INSERT OR REPLACE INTO note_bodies (note_id, data) VALUES (?, ?)', (note_id, pack(content)))
+        conn.execute(f"UPDATE {table} SET content = X'' WHERE id = ?", (note_id,))
+
+
+def bodies_schema(table):
+    """ note_bodies 表及删除笔记时的清理触发器，并把已有的长正文移入（作为迁移执行），table 为笔记表名 """
+    script = f'''
+    CREATE TABLE IF NOT EXISTS note_bodies (
+        note_id INTEGER PRIMARY KEY,
+        data BLOB NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_ad AFTER DELETE ON {table} BEGIN
+        DELETE FROM note_bodies WHERE note_id = old.id;
+    END;
+    '''
+
+    def migrate(conn):
+        for statement in migrations.split_statements(script):
+            conn.execute(statement)
+        move_bodies(conn, table, 0)
+    return migrate
+
+
+def content_sql(table):
+    """ 读取正文的 SQL 表达式，结果用 decode() 转为文本 """
+    return (f"CASE WHEN typeof({table}.content) = 'blob' "
+            f"THEN (SELECT data FROM note_bodies WHERE note_id = {table}.id) "
+            f"ELSE {table}.content END")
+
+
+def preview_sql(table, length):
+    """ 读取正文前 length 个字符的 SQL 表达式，结果用 decode_preview() 转为文本 """
+    length = int(length)
+    return (f"CASE WHEN typeof({table}.content) = 'blob' "
+            f"THEN (SELECT data FROM note_bodies WHERE note_id = {table}.id) "
+            f"ELSE substr({table}.content, 1, {length}) END")
@@ -0,0 +1,101 @@
+""" 密码哈希进程池：把慢速 KDF 移出请求线程
+
+generate_password_hash / check_password_hash 故意很慢，放在请求线程里执行时，
+一波登录请求就会占满 Web 进程。PasswordHasher 把它们交给固定大小的进程池：
+
+- 同时排队和执行的任务数不超过 max_pending，超出时立即抛出 PasswordPoolBusy
+- 单个任务等待超过 timeout 秒也抛出 PasswordPoolBusy，由调用方返回 503
+- workers 为 0 时在当前线程直接计算（调试或单测时使用）
+
+进程池在应用启动时由 start() 创建，工作进程用 forkserver 方式启动（不支持时用 spawn）：
+Web 进程此时可能已有多个线程，直接 fork 会把其他线程持有的锁原样复制到子进程里。
+forkserver 预先导入 werkzeug.security，工作进程从它 fork 出来。与 spawn 一样，
+直接以 python 脚本.py 运行时工作进程会重新导入该脚本，start() 在工作进程中什么也不做；
+由 gunicorn 等加载时没有这个问题。gunicorn --preload 等在创建进程池之后 fork 出的
+Web 进程首次使用时各自重新创建。
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class PasswordPoolBusy(Exception):
+    """ 密码哈希进程池已满或等待超时 """
+
+
+class PasswordHasher:
+    """ 有界的密码哈希/校验执行器 """
+
+    def __init__(self, workers=2, max_pending=32, timeout=5.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None  # 创建进程池的进程
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self):
+        """ 创建进程池并启动工作进程，应用启动时调用 """
+        if not self.workers or multiprocessing.current_process().name != 'MainProcess':
+            return  # 直接运行脚本时，工作进程会重新导入启动脚本，此时不再创建进程池
+        with self._lock:
+            executor = self._ensure_executor()
+        # 每个工作进程先执行一个空任务，避免第一批登录请求承担启动进程的时间
+        concurrent.futures.wait([executor.submit(int) for _ in range(self.workers)])
+
+    def _ensure_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            context = multiprocessing.get_context(START_METHOD)
+            if START_METHOD == 'forkserver':
+                context.set_forkserver_preload(['werkzeug.security'])
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            self._pid = os.getpid()
+        return self._executor
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+            future = self._ensure_executor().submit(func, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # 尚未开始的任务直接取消，已在执行的任务完成后计数自动归还
+            with self._lock:
+                self.timeouts += 1
+            raise PasswordPoolBusy()
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self):
+        """ 排队和执行中的任务数 """
+        return self._pending
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():  # fork 出的进程不能关闭父进程的进程池
+            executor.shutdown(wait=False, cancel_futures=True)
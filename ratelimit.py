@@ -0,0 +1,168 @@
+""" 令牌桶限流：用于 Flask 路由和 Socket.IO 事件处理函数
+
+每个键（IP、用户、房间等）一个令牌桶，按 rate（个/秒）补充，最多 burst 个。
+桶状态存放在可替换的后端中：
+
+- MemoryBackend  进程内字典，每个活跃键 O(1) 内存；空闲到桶已补满的键视同不存在，
+                 每隔若干次调用顺带清理，无需后台线程
+- SQLiteBackend  多个进程共享同一个 SQLite 表，适合多进程部署（设置 RATELIMIT_DATABASE）
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+
+from flask import request
+
+
+def per_minute(count):
+    """ 把“每分钟 count 次”换算为每秒补充的令牌数 """
+    return count / 60.0
+
+
+class MemoryBackend:
+    """ 进程内令牌桶存储 """
+
+    def __init__(self, sweep_every=1000, clock=time.monotonic):
+        self.sweep_every = sweep_every
+        self.clock = clock
+        self._buckets = {}  # key -> [tokens, updated_at, full_at]
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key, rate, burst, cost=1):
+        """ 尝试取出 cost 个令牌，返回 (是否允许, 需要等待的秒数) """
+        now = self.clock()
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.sweep_every == 0:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            self._buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+            return allowed, retry_after
+
+    def _sweep(self, now):
+        """ 删除已经补满的桶，它们与不存在的桶等价 """
+        expired = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in expired:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    """ 基于 SQLite 的共享令牌桶存储，多个进程使用同一个数据库文件 """
+
+    def __init__(self, database, sweep_every=1000, clock=time.time):
+        self.sweep_every = sweep_every
+        self.clock = clock  # 多进程共享，使用墙上时间
+        self._local = threading.local()
+        self.database = database
+        self._calls = 0
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    full_at REAL NOT NULL
+                )
+            ''')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        now = self.clock()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._calls += 1
+            if self._calls % self.sweep_every == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE full_at <= ?', (now,))
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                         (key, tokens, now, now + (burst - tokens) / rate))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+def backend_from_env():
+    """ 设置了 RATELIMIT_DATABASE 时使用共享的 SQLite 后端，否则使用进程内后端 """
+    database = os.environ.get('RATELIMIT_DATABASE')
+    return SQLiteBackend(database) if database else MemoryBackend()
+
+
+def remote_ip():
+    """ 默认的限流键：客户端 IP """
+    return request.remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """ 限流器，提供路由和 Socket.IO 事件的装饰器 """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else backend_from_env()
+        self.rejected = 0
+
+    def hit(self, key, rate, burst, cost=1):
+        allowed, retry_after = self.backend.take(key, rate, burst, cost)
+        if not allowed:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def limit(self, rate, burst, key_func=remote_ip, methods=('POST',)):
+        """ Flask 路由装饰器：超出限制时返回 429 和 Retry-After """
+        def decorator(view):
+            scope = view.__name__
+
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method in methods:
+                    allowed, retry_after = self.hit(f'{scope}:{key_func()}', rate, burst)
+                    if not allowed:
+                        return '请求过于频繁，请稍后再试。', 429, {'Retry-After': str(int(retry_after) + 1)}
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def limit_event(self, rate, burst, key_func, on_reject=None):
+        """ Socket.IO 事件装饰器：key_func 接收事件数据，超出限制时丢弃事件并调用 on_reject """
+        def decorator(handler):
+            scope = handler.__name__
+
+            @functools.wraps(handler)
+            def wrapper(data, *args):
+                allowed, retry_after = self.hit(f'{scope}:{key_func(data)}', rate, burst)
+                if not allowed:
+                    if on_reject is not None:
+                        on_reject(data, retry_after)
+                    return None
+                return handler(data, *args)
+            return wrapper
+        return decorator
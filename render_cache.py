@@ -0,0 +1,100 @@
+""" Markdown 渲染缓存：每条笔记每次编辑只渲染一次
+
+两级缓存：进程内 LRU 在前，note_renders 表在后（多进程共享、重启后仍有效）。
+缓存项以笔记 id 为键并记录内容哈希，内容变化后旧结果自动失效。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from markdown2 import markdown
+
+# 渲染结果表，笔记删除时由触发器一并删除（作为迁移执行）
+RENDER_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS note_renders (
+        note_id INTEGER PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        html TEXT NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS note_renders_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM note_renders WHERE note_id = old.id;
+    END;
+'''
+
+MARKDOWN_EXTRAS = ['fenced-code-blocks', 'tables', 'strike']
+
+
+class LRUCache:
+    """ 线程安全的定长 LRU 缓存 """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # 淘汰最久未使用的项
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+memory_cache = LRUCache(maxsize=1024)  # note_id -> (content_hash, html)
+
+
+def content_hash(content):
+    """ 计算笔记内容的哈希 """
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def render_markdown(content):
+    """ 渲染 Markdown，原始 HTML 会被转义 """
+    return markdown(content, extras=MARKDOWN_EXTRAS, safe_mode='escape')
+
+
+def render_note(conn, note_id, content):
+    """ 返回笔记渲染后的 HTML，优先使用缓存 """
+    digest = content_hash(content)
+
+    cached = memory_cache.get(note_id)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+
+    row = conn.execute('SELECT content_hash, html FROM note_renders WHERE note_id = ?', (note_id,)).fetchone()
+    if row is not None and row['content_hash'] == digest:
+        html = row['html']
+    else:
+        html = render_markdown(content)
+        conn.execute('INSERT OR REPLACE INTO note_renders (note_id, content_hash, html) VALUES (?, ?, ?)',
+                     (note_id, digest, html))
+        conn.commit()
+
+    memory_cache.put(note_id, (digest, html))
+    return html
+
+
+def invalidate(conn, note_id):
+    """ 笔记被修改后删除其渲染缓存（不提交事务，由调用方提交） """
+    memory_cache.pop(note_id)
+    conn.execute('DELETE FROM note_renders WHERE note_id = ?', (note_id,))
@@ -0,0 +1,196 @@
+""" 笔记修订历史：定期全文快照 + 快照之间的行级增量
+
+每次编辑前把笔记的旧内容记为一个修订。修订 1 以及此后每隔 SNAPSHOT_INTERVAL 个
+修订存一份全文快照，其余修订只存相对上一修订的行级差异，数据都经 zlib 压缩。
+还原任意修订只需读取最近的快照和它之后的至多 SNAPSHOT_INTERVAL - 1 个增量。
+
+差异算法与标题搜索使用的 LCS 同源：Myers 的线性空间算法（分治找“中间蛇”）
+求两版文本按行的最长公共子序列，不匹配的部分记为替换区间。
+"""
+import json
+import zlib
+
+import note_bodies
+
+SNAPSHOT_INTERVAL = 16
+SNAPSHOT = 0
+DELTA = 1
+
+
+def revisions_schema(table):
+    """ 修订表及笔记删除时的清理触发器（作为迁移执行），table 为笔记表名 """
+    return f'''
+    CREATE TABLE IF NOT EXISTS note_revisions (
+        note_id INTEGER NOT NULL,
+        revision INTEGER NOT NULL,
+        kind INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (note_id, revision)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS note_revisions_ad AFTER DELETE ON {table} BEGIN
+        DELETE FROM note_revisions WHERE note_id = old.id;
+    END;
+    '''
+
+
+# ---------- 行级差异（Myers 线性空间算法） ----------
+
+def _middle_snake(a, alo, ahi, b, blo, bhi):
+    """ 同时从两端搜索最短编辑路径，返回两者相遇处的对角线段 (x0, y0, x1, y1) """
+    n, m = ahi - alo, bhi - blo
+    delta = n - m
+    odd = delta & 1
+    offset = (n + m + 1) // 2 + 1
+    forward = [0] * (2 * offset + 1)   # 对角线 k 上前向路径到达的最远 x
+    backward = [0] * (2 * offset + 1)  # 对角线 k 上反向路径到达的最远 x（从末尾算起）
+    for d in range(offset):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return alo + x0, blo + y0, alo + x, blo + y
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return ahi - x, bhi - y, ahi - x0, bhi - y0
+    raise AssertionError('未找到中间蛇')
+
+
+def _matching_blocks(a, alo, ahi, b, blo, bhi, blocks):
+    """ 把 a[alo:ahi] 与 b[blo:bhi] 的公共行段 (i, j, 长度) 按顺序追加到 blocks """
+    prefix = 0
+    while alo + prefix < ahi and blo + prefix < bhi and a[alo + prefix] == b[blo + prefix]:
+        prefix += 1
+    if prefix:
+        blocks.append((alo, blo, prefix))
+        alo += prefix
+        blo += prefix
+    suffix = 0
+    while ahi - suffix > alo and bhi - suffix > blo and a[ahi - 1 - suffix] == b[bhi - 1 - suffix]:
+        suffix += 1
+    ahi -= suffix
+    bhi -= suffix
+    if alo < ahi and blo < bhi:  # 去掉首尾公共部分后两边都非空，编辑距离至少为 2，可以继续二分
+        x0, y0, x1, y1 = _middle_snake(a, alo, ahi, b, blo, bhi)
+        _matching_blocks(a, alo, x0, b, blo, y0, blocks)
+        if x1 > x0:
+            blocks.append((x0, y0, x1 - x0))
+        _matching_blocks(a, x1, ahi, b, y1, bhi, blocks)
+    if suffix:
+        blocks.append((ahi, bhi, suffix))
+
+
+def diff_lines(a, b):
+    """ 返回把行列表 a 变为 b 的替换区间列表 [[i, j, 新行], ...]，表示 a[i:j] 替换为新行 """
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]  # 行映射为整数，比较更快
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    blocks = []
+    _matching_blocks(a_ids, 0, len(a), b_ids, 0, len(b), blocks)
+    blocks.append((len(a), len(b), 0))
+    hunks = []
+    i = j = 0
+    for block_i, block_j, size in blocks:
+        if i < block_i or j < block_j:
+            hunks.append([i, block_i, b[j:block_j]])
+        i, j = block_i + size, block_j + size
+    return hunks
+
+
+def apply_hunks(lines, hunks):
+    """ diff_lines 的逆操作 """
+    result = []
+    position = 0
+    for start, end, new_lines in hunks:
+        result.extend(lines[position:start])
+        result.extend(new_lines)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
+# ---------- 修订存取 ----------
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data))
+
+
+def record_edit(conn, table, note_id, title, content, coalesce=0):
+    """ 笔记即将被修改为 (title, content) 时调用，把当前内容记为新修订
+
+    在写事务中读取旧内容，调用方随后执行 UPDATE 并提交。内容没有变化时不记录。
+    coalesce 大于 0 时，距最近一个修订不足 coalesce 秒则不记录（自动保存使用，
+    一次编辑过程只在开始时留下编辑前的内容，之后每隔 coalesce 秒留一个）。
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')  # 先拿写锁，保证读到的旧内容就是被覆盖的内容
+    if coalesce > 0 and conn.execute(
+            'SELECT 1 FROM note_revisions WHERE note_id = ? AND created_at > datetime(\'now\', ?) LIMIT 1',
+            (note_id, f'-{int(coalesce)} seconds')).fetchone():
+        return
+    old = conn.execute(f'SELECT title, {note_bodies.content_sql(table)} FROM {table} WHERE id = ?',
+                       (note_id,)).fetchone()
+    if old is None:
+        return
+    old = (old[0], note_bodies.decode(old[1]))
+    if old == (title, content):
+        return
+    last = conn.execute('SELECT max(revision) FROM note_revisions WHERE note_id = ?', (note_id,)).fetchone()[0]
+    revision = 1 if last is None else last + 1
+    snapshot = _pack({'title': old[0], 'content': old[1]})
+    if last is None or revision % SNAPSHOT_INTERVAL == 1:
+        kind, data = SNAPSHOT, snapshot
+    else:
+        previous = get_revision(conn, note_id, last)
+        hunks = diff_lines(previous[1].splitlines(True), old[1].splitlines(True))
+        data = _pack({'title': old[0], 'hunks': hunks})
+        kind = DELTA
+        if len(data) * 2 > len(snapshot):  # 改动太大时增量没有意义，直接存快照
+            kind, data = SNAPSHOT, snapshot
+    conn.execute('INSERT INTO note_revisions (note_id, revision, kind, data) VALUES (?, ?, ?, ?)',
+                 (note_id, revision, kind, data))
+
+
+def get_revision(conn, note_id, revision):
+    """ 还原修订，返回 (title, content)，不存在时返回 None """
+    rows = conn.execute(
+        'SELECT revision, data FROM note_revisions WHERE note_id = ? AND revision <= ? AND revision >= '
+        '(SELECT max(revision) FROM note_revisions WHERE note_id = ? AND revision <= ? AND kind = ?) '
+        'ORDER BY revision', (note_id, revision, note_id, revision, SNAPSHOT)).fetchall()
+    if not rows or rows[-1][0] != revision:
+        return None
+    snapshot = _unpack(rows[0][1])
+    title, lines = snapshot['title'], snapshot['content'].splitlines(True)
+    for _, data in rows[1:]:
+        delta = _unpack(data)
+        title, lines = delta['title'], apply_hunks(lines, delta['hunks'])
+    return title, ''.join(lines)
+
+
+def list_revisions(conn, note_id):
+    """ 返回笔记的修订列表（新的在前） """
+    return conn.execute('SELECT revision, kind, length(data) AS size, created_at FROM note_revisions '
+                        'WHERE note_id = ? ORDER BY revision DESC', (note_id,)).fetchall()
@@ -0,0 +1,78 @@
+""" 房间消息历史：每个活跃房间在内存中保留最近的若干条消息
+
+新用户加入时直接从环形缓冲区返回最近消息，无需查询数据库；更早的消息
+按 before_id 游标走 (room_id, id) 索引分页查询。
+"""
+import threading
+from collections import OrderedDict, deque
+
+
+class HistoryItem:
+    """ 一条聊天消息；id 在消息写入数据库后才确定 """
+    __slots__ = ('id', 'user', 'msg', 'sent_at')
+
+    def __init__(self, id, user, msg, sent_at):
+        self.id = id
+        self.user = user
+        self.msg = msg
+        self.sent_at = sent_at
+
+    def to_dict(self):
+        return {'id': self.id, 'user': self.user, 'msg': self.msg, 'sent_at': self.sent_at}
+
+
+class RoomHistory:
+    """ 按房间维护定长环形缓冲区，超过 max_rooms 时淘汰最久未活跃的房间 """
+
+    def __init__(self, pool, capacity=50, page_size=50, max_rooms=1000):
+        self.pool = pool
+        self.capacity = capacity
+        self.page_size = page_size
+        self.max_rooms = max_rooms
+        self._rooms = OrderedDict()  # room_id -> deque[HistoryItem]
+        self._lock = threading.Lock()
+
+    def _buffer(self, room_id):
+        """ 返回房间的缓冲区，首次访问时从数据库加载最近的消息 """
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            if buffer is not None:
+                self._rooms.move_to_end(room_id)
+                return buffer
+        items = self.query(room_id, None, self.capacity)
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            if buffer is None:  # 加载期间其他请求可能已经建好了缓冲区
+                buffer = self._rooms[room_id] = deque(items, maxlen=self.capacity)
+                if len(self._rooms) > self.max_rooms:
+                    self._rooms.popitem(last=False)
+            return buffer
+
+    def add(self, room_id, item):
+        """ 把新消息追加到房间缓冲区，最旧的消息自动移出 """
+        self._buffer(room_id).append(item)
+
+    def recent(self, room_id):
+        """ 返回房间最近的消息（按时间正序） """
+        return list(self._buffer(room_id))
+
+    def query(self, room_id, before_id, limit):
+        """ 从数据库查询 before_id 之前的消息（按时间正序） """
+        with self.pool.connection() as db:
+            if before_id is None:
+                rows = db.execute(
+                    'SELECT id, username, content, sent_at FROM messages '
+                    'WHERE room_id = ? ORDER BY id DESC LIMIT ?',
+                    (room_id, limit)
+                ).fetchall()
+            else:
+                rows = db.execute(
+                    'SELECT id, username, content, sent_at FROM messages '
+                    'WHERE room_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                    (room_id, before_id, limit)
+                ).fetchall()
+        return [HistoryItem(row[0], row[1], row[2], str(row[3])) for row in reversed(rows)]
+
+    def older(self, room_id, before_id):
+        """ 翻页查询更早的一页消息 """
+        return self.query(room_id, before_id, self.page_size)
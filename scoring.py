@@ -0,0 +1,85 @@
+""" LCS 相似度打分：只计算最长公共子序列长度
+
+单次比较使用位并行算法（Allison–Dix / Hyyrö），把查询串的 DP 列压缩进 Python 大整数，
+每读入一个字符只做几次整数位运算，内存为 O(n)。安装了 NumPy 时，LcsScorer.score_many
+对一批标题同时打分（查询不超过 64 个字符时每个标题占一个 uint64）。
+"""
+try:
+    import numpy as np
+except ImportError:  # NumPy 可选，缺失时逐条使用大整数实现
+    np = None
+
+WORD_BITS = 64      # NumPy 批量模式下每个标题的位向量宽度
+BLOCK_SIZE = 4096   # NumPy 批量模式下每块处理的标题数，限制临时矩阵大小
+
+
+class LcsScorer:
+    """ 预编译查询串的字符位掩码，用于与大量文本重复计算 LCS 长度 """
+
+    def __init__(self, query):
+        self.query = query
+        self.length = len(query)
+        self.full = (1 << self.length) - 1
+        self.masks = {}
+        for i, char in enumerate(query):  # 第 i 位表示查询串第 i 个字符
+            self.masks[char] = self.masks.get(char, 0) | (1 << i)
+
+    def score(self, text, threshold=0):
+        """ 返回 text 与查询串的 LCS 长度；确定达不到 threshold 时提前返回 0 """
+        if min(self.length, len(text)) < threshold:
+            return 0
+        masks, full = self.masks, self.full
+        v = full  # v 中为 0 的位表示 DP 列在该位置递增
+        remaining = len(text)
+        for char in text:
+            u = v & masks.get(char, 0)
+            v = ((v + u) | (v - u)) & full
+            remaining -= 1
+            if remaining < threshold and self.length - bin(v).count('1') + remaining < threshold:
+                return 0  # 剩余字符全部匹配也达不到阈值
+        return self.length - bin(v).count('1')
+
+    def score_many(self, texts, threshold=0):
+        """ 批量计算 LCS 长度，返回与 texts 等长的列表；低于 threshold 的记为 0 """
+        if np is None or not 0 < self.length <= WORD_BITS:
+            return [self.score(text, threshold) for text in texts]
+        scores = []
+        for start in range(0, len(texts), BLOCK_SIZE):
+            scores.extend(self._score_block(texts[start:start + BLOCK_SIZE], threshold))
+        return scores
+
+    def _score_block(self, texts, threshold):
+        """ 用 NumPy 对一块标题并行执行位并行 LCS """
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        width = int(lengths.max()) if len(texts) else 0
+        if width == 0:
+            return [0] * len(texts)
+
+        # 把标题按 Unicode 码点排成矩阵，不足部分补 0（补位字符不匹配任何查询字符）
+        flat = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+        codes = np.zeros((len(texts), width), dtype=np.uint32)
+        codes[np.arange(width) < lengths[:, None]] = flat
+
+        # 查表得到每个位置的匹配掩码
+        keys = np.array(sorted(ord(char) for char in self.masks if char != '\0'), dtype=np.uint32)
+        values = np.array([self.masks[chr(key)] for key in keys], dtype=np.uint64)
+        if len(keys) == 0:
+            return [0] * len(texts)
+        index = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
+        matches = np.where(keys[index] == codes, values[index], np.uint64(0))
+
+        full = np.uint64(self.full)
+        v = np.full(len(texts), full, dtype=np.uint64)
+        for column in range(width):  # uint64 加法溢出按模 2**64 截断，与掩码后的结果一致
+            u = v & matches[:, column]
+            v = ((v + u) | (v - u)) & full
+
+        ones = np.unpackbits(v.view(np.uint8)).reshape(len(texts), WORD_BITS).sum(axis=1)
+        result = self.length - ones
+        result[result < threshold] = 0
+        return result.tolist()
+
+
+def lcs_length(a, b):
+    """ 计算字符串 a 和 b 的最长公共子序列长度 """
+    return LcsScorer(a).score(b)
@@ -0,0 +1,115 @@
+""" 笔记全文检索：SQLite FTS5 虚拟表（trigram 分词，支持中文标题） """
+import note_bodies
+
+# 无内容（contentless）的 FTS5 表，只保存标题和正文的索引（作为迁移执行）。
+# 由 store.NoteStore 在写入笔记时调用 add() / remove() 维护，不依赖触发器或 SQL 函数；
+# 不经过 NoteStore 修改了笔记时调用 rebuild() 重建
+FTS_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title,
+        content,
+        content='',
+        tokenize='trigram'
+    );
+'''
+
+TRIGRAM = 3             # trigram 分词器能索引的最短查询长度
+TITLE_WEIGHT = 10.0     # bm25 排序时标题相对内容的权重
+SEARCH_LIMIT = 200      # 单次搜索最多返回的笔记数
+
+
+def add(conn, note_id, title, content):
+    """ 把笔记加入索引 """
+    conn.execute('INSERT INTO notes_fts (rowid, title, content) VALUES (?, ?, ?)', (note_id, title, content))
+
+
+def remove(conn, note_id, title, content):
+    """ 从索引中删除笔记；无内容的 FTS5 表要求传入建立索引时的标题和正文 """
+    conn.execute("INSERT INTO notes_fts (notes_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)",
+                 (note_id, title, content))
+
+
+def add_from(conn, first_id):
+    """ 索引 id 不小于 first_id 的笔记（批量导入后、正文移到 note_bodies 之前调用） """
+    conn.execute('INSERT INTO notes_fts (rowid, title, content) SELECT id, title, content FROM notes WHERE id >= ?',
+                 (first_id,))
+
+
+def rebuild(conn):
+    """ 按 notes 表重建全部索引（也作为迁移执行），不提交 """
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('delete-all')")
+    cursor = conn.execute(f'SELECT id, title, {note_bodies.content_sql("notes")} FROM notes')
+    for note_id, title, content in cursor:
+        add(conn, note_id, title, note_bodies.decode(content))
+
+
+def split_terms(query):
+    """ 把用户输入拆成可走 trigram 索引的词和不足 TRIGRAM 个字符的短词 """
+    terms = query.split()
+    return [term for term in terms if len(term) >= TRIGRAM], [term for term in terms if len(term) < TRIGRAM]
+
+
+def build_match_query(terms):
+    """ 把 split_terms() 得到的长词转换为 FTS5 MATCH 表达式 """
+    # 每个词作为短语加引号，避免用户输入被解析为 FTS5 语法
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def like_pattern(term):
+    """ 短词的 LIKE 模式（转义 % 和 _，配合 ESCAPE '\\'） """
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search(conn, user_id, query, limit=SEARCH_LIMIT):
+    """ 在用户笔记的标题和内容中全文检索，按相关度返回笔记；没有可索引的长词时返回 None
+
+    长词走 trigram 索引；同时出现的短词不能走索引，改为在索引命中的笔记中用 LIKE 过滤
+    标题和内联的正文，正文在 note_bodies 中的笔记在 Python 中解码后检查，
+    结果中的笔记包含查询中的全部词。
+    """
+    terms, short_terms = split_terms(query)
+    if not terms:
+        return None
+    if not short_terms:
+        return conn.execute(
+            '''
+            SELECT notes.id, notes.title, notes.markdown_enabled
+            FROM notes_fts
+            JOIN notes ON notes.id = notes_fts.rowid
+            WHERE notes_fts MATCH ? AND notes.user_id = ?
+            ORDER BY bm25(notes_fts, ?, 1.0)
+            LIMIT ?
+            ''',
+            (build_match_query(terms), user_id, TITLE_WEIGHT, limit)
+        ).fetchall()
+
+    # 每个短词出现在标题或内联正文中；正文在 note_bodies 中（content 为 BLOB）的笔记先留下
+    conditions = []
+    params = [build_match_query(terms), user_id]
+    for term in short_terms:
+        conditions.append("(notes.title LIKE ? ESCAPE '\\' OR typeof(notes.content) = 'blob' "
+                          "OR notes.content LIKE ? ESCAPE '\\')")
+        params += [like_pattern(term)] * 2
+    cursor = conn.execute(
+        f'''
+        SELECT notes.id, notes.title, notes.markdown_enabled, typeof(notes.content) = 'blob' AS packed
+        FROM notes_fts
+        JOIN notes ON notes.id = notes_fts.rowid
+        WHERE notes_fts MATCH ? AND notes.user_id = ? AND {' AND '.join(conditions)}
+        ORDER BY bm25(notes_fts, ?, 1.0)
+        ''',
+        params + [TITLE_WEIGHT]
+    )
+    folded = [term.lower() for term in short_terms]
+    results = []
+    for row in cursor:
+        note_id, title, _, packed = row
+        if packed:
+            text = title.lower() + '\n' + note_bodies.decode(conn.execute(
+                'SELECT data FROM note_bodies WHERE note_id = ?', (note_id,)).fetchone()[0]).lower()
+            if not all(term in text for term in folded):
+                continue
+        results.append(row)
+        if len(results) == limit:
+            break
+    return results
@@ -0,0 +1,68 @@
+""" 生产环境启动入口：gunicorn 预派生多个工作进程运行 app.py
+
+用法：
+  python serve.py --workers 4 --threads 8                # WSGI，gunicorn gthread 工作进程
+  python serve.py --asgi --workers 4 --threads 8         # ASGI，uvicorn 工作进程 + asgi.py 线程池
+
+主进程导入 app.py（只执行一次数据库迁移）后关闭连接池里的连接再 fork，SQLite
+连接不跨进程使用，每个工作进程按需重新连接。连接池大小至少为每进程线程数。
+多进程时登录限流的计数默认各进程独立，需要全局限流时设置 RATELIMIT_DATABASE。
+参数也可以用环境变量 SERVE_BIND / SERVE_WORKERS / SERVE_THREADS 设置。
+"""
+import argparse
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+class NotebookServer(BaseApplication):
+    """ 以代码方式配置的 gunicorn 应用 """
+
+    def __init__(self, options, threads, asgi=False):
+        self.options = options
+        self.threads = threads
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        os.environ['ASGI_THREADS'] = str(self.threads)
+        import app as notebook  # 导入时执行数据库迁移
+        notebook.db_pool.size = max(notebook.db_pool.size, self.threads)
+        notebook.db_pool.close_all()  # fork 前关闭迁移用过的连接
+        if self.asgi:
+            import asgi
+            return asgi.application
+        return notebook.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以多进程方式运行笔记应用')
+    parser.add_argument('--bind', default=os.environ.get('SERVE_BIND', '127.0.0.1:8000'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1)),
+                        help='工作进程数，默认等于 CPU 数')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVE_THREADS', '8')),
+                        help='每个工作进程处理请求的线程数')
+    parser.add_argument('--asgi', action='store_true', help='使用 uvicorn 工作进程和 asgi.py')
+    parser.add_argument('--timeout', type=int, default=30, help='工作进程无响应多少秒后重启')
+    args = parser.parse_args()
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'timeout': args.timeout,
+        'preload_app': True,
+    }
+    if args.asgi:
+        options['worker_class'] = 'uvicorn.workers.UvicornWorker'
+    else:
+        options['worker_class'] = 'gthread'
+        options['threads'] = args.threads
+    NotebookServer(options, args.threads, args.asgi).run()
+
+
+if __name__ == '__main__':
+    main()
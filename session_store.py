@@ -0,0 +1,240 @@
+""" 服务端会话：会话数据保存在 SQLite 的 sessions 表，Cookie 中只有随机的会话 id
+
+Flask 默认把整个会话签名后放在 Cookie 里，每个请求都要校验签名并反序列化。
+这里改为服务端保存：
+
+- 每个进程有一个 LRU 缓存：会话 id → 会话数据，命中时请求不访问数据库；
+- 滑动过期：每次请求把过期时间推迟到 idle_timeout 秒之后，只在内存中更新，
+  距上次写入超过 touch_interval 秒时才写回数据库；
+- 后台清理任务每 sweep_interval 秒删除过期的会话；
+- 会话中的 user_id 变化（登录、切换用户）时换发新的会话 id，防止会话固定攻击。
+
+多进程部署时各进程的缓存互相独立：Cookie 值为 "会话 id.写入次数"，会话数据每次
+写入后次数加 1 并重新下发 Cookie，其他进程发现次数与缓存不一致时从数据库重新读取。
+缓存项最多使用 cache_ttl 秒，之后重新读取一次，其他进程中的登出最迟在这段时间后生效。
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from db_pool import ConnectionPool
+from render_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# 会话表（作为迁移执行）
+SESSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        data TEXT NOT NULL,
+        generation INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+'''
+
+SELECT_SESSION = 'SELECT user_id, data, generation, expires_at FROM sessions WHERE id = ?'
+SAVE_SESSION = ('INSERT OR REPLACE INTO sessions (id, user_id, data, generation, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)')
+TOUCH_SESSION = 'UPDATE sessions SET expires_at = ? WHERE id = ?'
+DELETE_SESSION = 'DELETE FROM sessions WHERE id = ?'
+DELETE_EXPIRED = 'DELETE FROM sessions WHERE expires_at < ?'
+
+
+def _start_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+@dataclass(slots=True)
+class _Entry:
+    """ 缓存中的一个会话；data 保存序列化后的字符串，每个请求各自反序列化一份 """
+    sid: str
+    user_id: int
+    data: str
+    generation: int
+    expires_at: float         # 内存中的过期时间，每个请求都会推迟
+    stored_expires_at: float  # 数据库中的过期时间
+    checked_at: float         # 上次从数据库读取或写入的时间
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """ 服务端会话，修改时 modified 置为 True """
+
+    def __init__(self, initial=None, entry=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.entry = entry
+        self.modified = False
+
+    @property
+    def sid(self):
+        return None if self.entry is None else self.entry.sid
+
+
+class SessionStore(SessionInterface):
+    """ 保存在 SQLite 中的 Flask 会话 """
+
+    def __init__(self, database, idle_timeout=86400, cache_size=4096, cache_ttl=60,
+                 touch_interval=60, sweep_interval=300, pool_size=4,
+                 start_background_task=_start_thread, sleep=time.sleep):
+        # 单独的连接池：保存会话时请求自己的连接可能还没有归还
+        self.pool = ConnectionPool(database, size=pool_size)
+        self.idle_timeout = idle_timeout
+        self.cache_ttl = cache_ttl
+        self.touch_interval = min(touch_interval, idle_timeout)
+        self.sweep_interval = sweep_interval
+        self.start_background_task = start_background_task  # 在 eventlet 下传入 socketio.start_background_task
+        self.sleep = sleep
+        self._cache = LRUCache(cache_size)
+        self._sweeper_pid = None  # 清理任务所在的进程，fork 出的工作进程需要各自启动
+        self._sweeper_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.swept = 0
+
+    @classmethod
+    def from_env(cls, database):
+        """ 按环境变量 SESSION_IDLE_TIMEOUT / SESSION_CACHE_SIZE / SESSION_CACHE_TTL /
+        SESSION_SWEEP_INTERVAL（秒）创建 """
+        return cls(database,
+                   idle_timeout=float(os.environ.get('SESSION_IDLE_TIMEOUT', '86400')),
+                   cache_size=int(os.environ.get('SESSION_CACHE_SIZE', '4096')),
+                   cache_ttl=float(os.environ.get('SESSION_CACHE_TTL', '60')),
+                   sweep_interval=float(os.environ.get('SESSION_SWEEP_INTERVAL', '300')))
+
+    def init_app(self, app):
+        app.session_interface = self
+
+    # ---------- SessionInterface ----------
+
+    def open_session(self, app, request):
+        if self._sweeper_pid != os.getpid():
+            self._start_sweeper()
+        sid, generation = self._parse_cookie(request.cookies.get(self.get_cookie_name(app)))
+        now = time.time()
+        entry = self._load(sid, generation, now) if sid else None
+        if entry is None:
+            return ServerSession()
+        entry.expires_at = now + self.idle_timeout  # 滑动过期
+        return ServerSession(session_json_serializer.loads(entry.data), entry)
+
+    def save_session(self, app, session, response):
+        entry = session.entry
+        if entry is None and not session:
+            return
+        response.vary.add('Cookie')
+        if not session:  # 会话被清空（登出），删除服务端记录和 Cookie
+            self._delete(entry.sid)
+            response.delete_cookie(self.get_cookie_name(app), domain=self.get_cookie_domain(app),
+                                   path=self.get_cookie_path(app))
+            return
+        now = time.time()
+        if entry is None or session.modified:
+            entry = self._write(entry, dict(session), now)
+        elif entry.expires_at - entry.stored_expires_at >= self.touch_interval:
+            self._touch(entry)
+            if not session.permanent:  # 非永久会话的 Cookie 没有过期时间，不必重新下发
+                return
+        else:
+            return
+        response.set_cookie(
+            self.get_cookie_name(app), f'{entry.sid}.{entry.generation}',
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    # ---------- 读写 ----------
+
+    @staticmethod
+    def _parse_cookie(value):
+        sid, _, generation = (value or '').partition('.')
+        return sid, int(generation) if generation.isdigit() else 0
+
+    def _load(self, sid, generation, now):
+        """ 先查缓存，缓存缺失、过旧或写入次数不一致时从数据库读取；会话不存在或已过期时返回 None """
+        entry = self._cache.get(sid)
+        if (entry is not None and entry.generation == generation and entry.expires_at > now
+                and now - entry.checked_at < self.cache_ttl):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_SESSION, (sid,)).fetchone()
+            if row is None or row[3] <= now:
+                self._cache.pop(sid)
+                return None
+        user_id, data, stored_generation, expires_at = row
+        entry = _Entry(sid, user_id, data, stored_generation, expires_at, expires_at, now)
+        self._cache.put(sid, entry)
+        return entry
+
+    def _write(self, entry, data, now):
+        """ 保存会话数据，user_id 变化时换发新的会话 id，返回新的缓存项 """
+        user_id = data.get('user_id')
+        expires_at = now + self.idle_timeout
+        with self.pool.connection() as conn:
+            if entry is not None and entry.user_id == user_id:
+                sid, generation = entry.sid, entry.generation + 1
+            else:
+                if entry is not None:
+                    conn.execute(DELETE_SESSION, (entry.sid,))
+                    self._cache.pop(entry.sid)
+                sid, generation = secrets.token_urlsafe(32), 1
+            serialized = session_json_serializer.dumps(data)
+            conn.execute(SAVE_SESSION, (sid, user_id, serialized, generation, expires_at))
+            conn.commit()
+        entry = _Entry(sid, user_id, serialized, generation, expires_at, expires_at, now)
+        self._cache.put(sid, entry)
+        return entry
+
+    def _touch(self, entry):
+        with self.pool.connection() as conn:
+            conn.execute(TOUCH_SESSION, (entry.expires_at, entry.sid))
+            conn.commit()
+        entry.stored_expires_at = entry.expires_at
+
+    def _delete(self, sid):
+        with self.pool.connection() as conn:
+            conn.execute(DELETE_SESSION, (sid,))
+            conn.commit()
+        self._cache.pop(sid)
+
+    # ---------- 过期清理 ----------
+
+    def _start_sweeper(self):
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        self.start_background_task(self._run_sweeper)
+
+    def _run_sweeper(self):
+        pid = os.getpid()
+        while self._sweeper_pid == pid:
+            self.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('清理过期会话失败，将在下次重试')
+
+    def sweep(self, now=None):
+        """ 删除过期的会话，返回删除的条数 """
+        with self.pool.connection() as conn:
+            count = conn.execute(DELETE_EXPIRED, (time.time() if now is None else now,)).rowcount
+            conn.commit()
+        self.swept += count
+        return count
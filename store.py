@@ -0,0 +1,252 @@
+""" 笔记与用户的数据访问层，app.py 和 一键.py 共用
+
+两个应用的表结构不同：app.py 使用 users / notes 表，笔记带 markdown_enabled 列；
+一键.py 使用 user / note 表，没有这一列。NoteStore / UserStore 按表名
+和可选列在创建时拼好全部 SQL，之后每次调用都使用同一条 SQL 文本，命中连接上
+sqlite3 的预编译语句缓存（ConnectionPool 的 cached_statements），不再重复解析。
+
+查询结果由游标的 row_factory 直接构造 Note / User（__slots__ dataclass），
+不经过 sqlite3.Row 再复制成 dict。表里没有的列以常量补齐（markdown_enabled
+为 0、version 为 1），模板和路由对两种表结构使用同样的字段。
+
+所有方法的第一个参数都是连接（导出使用连接池），写操作不提交，由调用方提交；
+insert_many 例外，按批提交。写入的正文统一换成 LF 换行（见 text_patch）。
+长正文的压缩分表（note_bodies）和全文索引（search_index，indexed=True 时）也在
+这里维护，数据库结构不依赖应用注册的 SQL 函数。
+"""
+from dataclasses import dataclass
+from functools import partial
+
+import note_bodies
+import revisions
+import search_index
+import text_patch
+import transfer
+
+MAX_VARIABLES = 500  # IN (...) 查询每批的参数个数，低于 SQLite 的变量数上限
+
+
+@dataclass(slots=True)
+class Note:
+    id: int
+    title: str = None
+    content: str = None
+    user_id: int = None
+    markdown_enabled: int = 0
+    version: int = 1
+
+
+@dataclass(slots=True)
+class User:
+    id: int
+    username: str
+    password: str
+
+
+def _note_row(cursor, row):
+    note = Note(*row)
+    if type(note.content) is bytes:  # 正文在 note_bodies 中
+        note.content = note_bodies.unpack(note.content)
+    return note
+
+
+def _preview_row(length, cursor, row):
+    note = Note(*row)
+    if type(note.content) is bytes:
+        note.content = note_bodies.preview(note.content, length)
+    return note
+
+
+def _user_row(cursor, row):
+    return User(*row)
+
+
+def _query(conn, factory, sql, params):
+    """ 执行查询，结果行由 factory 构造 """
+    cursor = conn.cursor()
+    cursor.row_factory = factory
+    return cursor.execute(sql, params)
+
+
+class NoteStore:
+    """ 笔记表的读写，markdown / versioned 表示表中是否有 markdown_enabled / version 列，
+    indexed 表示由 search_index 为该表维护全文索引 """
+
+    def __init__(self, table, markdown=True, versioned=True, preview_length=200, indexed=False):
+        self.table = table
+        self.markdown = markdown
+        self.versioned = versioned
+        self.indexed = indexed
+        self._preview_row = partial(_preview_row, preview_length)
+        content = note_bodies.content_sql(table)
+        preview = note_bodies.preview_sql(table, preview_length)
+        markdown_column = 'markdown_enabled' if markdown else '0'
+        version_column = 'version' if versioned else '1'
+        # 选择列的顺序与 Note 字段一致，结果行按位置构造 Note
+        full = f'id, title, {content}, user_id, {markdown_column}, {version_column}'
+        self._get = f'SELECT {full} FROM {table} WHERE id = ? AND user_id = ?'
+        self._get_many = f'SELECT {full} FROM {table} WHERE id IN ({{}})'
+        self._version = f'SELECT {version_column} FROM {table} WHERE id = ? AND user_id = ?'
+        self._titles = f'SELECT id, title FROM {table} WHERE user_id = ?'
+        self._text = f'SELECT title, {content} FROM {table} WHERE id = ?'
+        listing = f'user_id, {markdown_column}, {version_column}'  # 列表项也带上版本号，可用作缓存键
+        self._first_page = (f'SELECT id, title, NULL, {listing} FROM {table} '
+                            'WHERE user_id = ? ORDER BY id DESC LIMIT ?')
+        self._next_page = (f'SELECT id, title, NULL, {listing} FROM {table} '
+                           'WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?')
+        self._first_preview = (f'SELECT id, title, {preview}, {listing} FROM {table} '
+                               'WHERE user_id = ? ORDER BY id DESC LIMIT ?')
+        self._next_preview = (f'SELECT id, title, {preview}, {listing} FROM {table} '
+                              'WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?')
+        if markdown:
+            self._insert = f'INSERT INTO {table} (user_id, title, content, markdown_enabled) VALUES (?, ?, ?, ?)'
+            self._export_columns = ('title', f'{content} AS content', 'markdown_enabled')
+        else:
+            self._insert = f'INSERT INTO {table} (user_id, title, content) VALUES (?, ?, ?)'
+            self._export_columns = ('title', f'{content} AS content')
+        self._delete = f'DELETE FROM {table} WHERE id = ? AND user_id = ?'
+
+    def get(self, conn, note_id, user_id):
+        """ 返回用户的一条笔记（含完整正文），不存在或不属于该用户时返回 None """
+        return _query(conn, _note_row, self._get, (note_id, user_id)).fetchone()
+
+    def get_many(self, conn, note_ids):
+        """ 按给定 id 的顺序返回笔记（含完整正文），不存在的 id 被跳过 """
+        note_ids = list(note_ids)
+        by_id = {}
+        for start in range(0, len(note_ids), MAX_VARIABLES):
+            chunk = note_ids[start:start + MAX_VARIABLES]
+            sql = self._get_many.format(', '.join('?' * len(chunk)))
+            for note in _query(conn, _note_row, sql, chunk):
+                by_id[note.id] = note
+        return [by_id[note_id] for note_id in note_ids if note_id in by_id]
+
+    def version(self, conn, note_id, user_id):
+        """ 只查版本号，笔记不存在时返回 None """
+        row = conn.execute(self._version, (note_id, user_id)).fetchone()
+        return None if row is None else row[0]
+
+    def exists(self, conn, note_id, user_id):
+        return self.version(conn, note_id, user_id) is not None
+
+    def titles(self, conn, user_id):
+        """ 逐条返回用户全部笔记的 id 和标题（游标，不一次性读入） """
+        return _query(conn, _note_row, self._titles, (user_id,))
+
+    def page(self, conn, user_id, after_id=None, size=50, preview=False):
+        """ 按 id 倒序取 after_id 之后的一页笔记，返回笔记和下一页游标
+
+        preview 为 True 时 content 字段为正文开头的一段，否则不取正文。
+        """
+        if after_id is None:
+            sql = self._first_preview if preview else self._first_page
+            params = (user_id, size + 1)
+        else:
+            sql = self._next_preview if preview else self._next_page
+            params = (user_id, after_id, size + 1)
+        notes = _query(conn, self._preview_row if preview else _note_row, sql, params).fetchall()
+        if len(notes) > size:  # 多取的一行说明还有下一页
+            return notes[:size], notes[size - 1].id
+        return notes, None
+
+    def export(self, pool, user_id):
+        """ 按 id 升序逐条返回导出用的 dict，见 transfer.iter_notes """
+        for note in transfer.iter_notes(pool, self.table, user_id, self._export_columns):
+            note['content'] = note_bodies.decode(note['content'])
+            yield note
+
+    def _old_text(self, conn, note_id):
+        """ 修改前的标题和正文，维护全文索引用 """
+        row = conn.execute(self._text, (note_id,)).fetchone()
+        return None if row is None else (row[0], note_bodies.decode(row[1]))
+
+    def create(self, conn, user_id, title, content, markdown_enabled=0):
+        """ 插入一条笔记，返回新 id """
+        content = text_patch.normalize_newlines(content)
+        stored = note_bodies.inline(content)
+        params = (user_id, title, stored, markdown_enabled) if self.markdown else (user_id, title, stored)
+        note_id = conn.execute(self._insert, params).lastrowid
+        if stored is not content:
+            note_bodies.store_body(conn, note_id, content)
+        if self.indexed:
+            search_index.add(conn, note_id, title, content)
+        return note_id
+
+    def insert_many(self, conn, user_id, notes, batch=transfer.IMPORT_BATCH):
+        """ 批量插入 (title, content, markdown_enabled) 元组，每 batch 条提交一次，返回插入的行数 """
+        normalize = text_patch.normalize_newlines
+        if self.markdown:
+            rows = ((user_id, title, normalize(content), markdown_enabled)
+                    for title, content, markdown_enabled in notes)
+        else:
+            rows = ((user_id, title, normalize(content)) for title, content, _ in notes)
+        return transfer.import_rows(conn, self._insert, rows, batch, self._after_import)
+
+    def _after_import(self, conn, first_id):
+        """ 每批导入后：先按完整正文建立索引，再把长正文移到 note_bodies """
+        if self.indexed:
+            search_index.add_from(conn, first_id)
+        note_bodies.move_bodies(conn, self.table, first_id)
+
+    def update(self, conn, note_id, title, content=None, markdown_enabled=None, coalesce=0):
+        """ 修改笔记并记录修订，content / markdown_enabled 为 None 时不修改该列
+
+        调用方需要先确认笔记属于当前用户。有 version 列时版本号加 1。
+        coalesce 见 revisions.record_edit，自动保存时传入，避免每次保存都产生修订。
+        """
+        if content is not None:
+            content = text_patch.normalize_newlines(content)
+        revisions.record_edit(conn, self.table, note_id, title, content, coalesce)  # 旧内容记入修订历史
+        if self.indexed:
+            old = self._old_text(conn, note_id)
+            if old is not None:
+                search_index.remove(conn, note_id, *old)
+        columns = ['title = ?']
+        params = [title]
+        if content is not None:
+            columns.append('content = ?')
+            params.append(note_bodies.inline(content))
+        if markdown_enabled is not None and self.markdown:
+            columns.append('markdown_enabled = ?')
+            params.append(markdown_enabled)
+        if self.versioned:
+            columns.append('version = version + 1')
+        params.append(note_id)
+        if not conn.execute(f'UPDATE {self.table} SET {", ".join(columns)} WHERE id = ?', params).rowcount:
+            return
+        if content is not None:
+            note_bodies.store_body(conn, note_id, content)
+        if self.indexed:
+            search_index.add(conn, note_id, title, old[1] if content is None else content)
+
+    def delete(self, conn, note_id, user_id):
+        """ 删除用户的一条笔记，返回是否删除 """
+        if self.indexed:
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')  # 读出的旧内容必须与被删除的一致
+            old = self._old_text(conn, note_id)
+            if old is None or not conn.execute(self._delete, (note_id, user_id)).rowcount:
+                return False
+            search_index.remove(conn, note_id, *old)
+            return True
+        return conn.execute(self._delete, (note_id, user_id)).rowcount > 0
+
+
+class UserStore:
+    """ 用户表的读写 """
+
+    def __init__(self, table):
+        self.table = table
+        self._by_username = f'SELECT id, username, password FROM {table} WHERE username = ?'
+        self._get = f'SELECT id, username, password FROM {table} WHERE id = ?'
+        self._insert = f'INSERT INTO {table} (username, password) VALUES (?, ?)'
+
+    def get(self, conn, user_id):
+        return _query(conn, _user_row, self._get, (user_id,)).fetchone()
+
+    def by_username(self, conn, username):
+        return _query(conn, _user_row, self._by_username, (username,)).fetchone()
+
+    def create(self, conn, username, password):
+        """ 插入用户（password 为哈希值），返回新 id；用户名已存在时抛出 sqlite3.IntegrityError """
+        return conn.execute(self._insert, (username, password)).lastrowid
@@ -0,0 +1,53 @@
+""" 内联模板注册表和列表项片段缓存，一键.py 和 简易聊天室.py 共用
+
+render_template_string 每次请求都把整段模板源码交给 Jinja，靠以源码为键的缓存
+避免重复编译，每次仍要哈希整段源码。register() 在启动时把模块里的模板字符串按
+名字注册到应用的 Jinja 环境并立即编译，路由改用 render_template(名字)。
+加载器排在 templates/ 目录之后：templates/ 中同名的文件优先，内联模板也可以被
+templates/ 中的模板 extends / include。
+
+FragmentCache 缓存单个列表项渲染出的 HTML，键由调用方给出（笔记 id + 版本号），
+笔记修改后版本号变化，旧的片段不再被命中，随 LRU 淘汰。列表项写成宏，未命中时
+在列表模板的同一次渲染中调用（每一项单独渲染一个模板要新建上下文，列表页慢近一倍）。
+全部未命中时比不缓存慢约 10%，命中一项省下约 90% 的渲染时间，命中率超过约 1/8 即有收益
+（bench/bench_templates.py 的 cold / fragments）。
+"""
+from jinja2 import ChoiceLoader, DictLoader
+from markupsafe import Markup
+
+from render_cache import LRUCache
+
+FRAGMENT_MAX_BYTES = 16 * 1024  # 超过此长度的片段不缓存，避免少数长笔记占满缓存
+
+
+def register(app, templates):
+    """ 把 {名字: 模板源码} 注册到 app 的 Jinja 环境并预先编译 """
+    env = app.jinja_env
+    env.loader = ChoiceLoader([env.loader, DictLoader(templates)])
+    for name in templates:
+        env.get_template(name)  # 编译结果进入环境的模板缓存
+
+
+class FragmentCache:
+    """ 按键缓存模板宏的渲染结果，maxsize 为 0 时不缓存 """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize)
+
+    def render(self, key, macro, *args):
+        """ 返回键对应的片段，未命中时调用 macro(*args) 渲染 """
+        html = self._cache.get(key) if self.maxsize else None
+        if html is not None:
+            self.hits += 1
+            return html
+        self.misses += 1
+        html = Markup(macro(*args))
+        if self.maxsize and len(html) <= FRAGMENT_MAX_BYTES:
+            self._cache.put(key, html)
+        return html
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,60 @@
+""" 测试公用的夹具：应用模块在临时目录中导入，数据库不落在仓库里 """
+import importlib
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def notebook(tmp_path_factory):
+    """ 导入 app.py；它在当前目录创建 notebook.db，所以整个测试会话都在临时目录中运行 """
+    os.chdir(tmp_path_factory.mktemp('notebook'))
+    module = importlib.import_module('app')
+    module.limiter.hit = lambda *args, **kwargs: (True, 0.0)  # 关闭登录/注册限流
+    return module
+
+
+@pytest.fixture
+def make_client(notebook):
+    """ 每次调用返回一个用新注册的用户登录的测试客户端 """
+    def make():
+        client = notebook.app.test_client()
+        username = f'user{next(_usernames)}'
+        client.post('/register', data={'username': username, 'password': 'password'})
+        response = client.post('/login', data={'username': username, 'password': 'password'})
+        assert response.status_code == 302
+        with notebook.db_pool.connection() as conn:
+            client.user_id = notebook.users.by_username(conn, username).id
+        return client
+    return make
+
+
+@pytest.fixture
+def client(make_client):
+    """ 用新注册的用户登录的测试客户端 """
+    return make_client()
+
+
+@pytest.fixture(scope='session')
+def chat(tmp_path_factory):
+    """ 导入 简易聊天室.py，数据库放在临时目录，关闭发言限流 """
+    os.environ['CHAT_DATABASE'] = str(tmp_path_factory.mktemp('chat') / 'chat.db')
+    os.environ['CHAT_TEXT_RATE'] = os.environ['CHAT_TEXT_BURST'] = '1000000'
+    return importlib.import_module('简易聊天室')
+
+
+@pytest.fixture(scope='session')
+def oneclick(tmp_path_factory):
+    """ 导入 一键.py，数据库放在临时目录，密码在本进程中哈希，关闭登录/注册限流 """
+    os.environ['SITE_DATABASE'] = str(tmp_path_factory.mktemp('oneclick') / 'site.db')
+    os.environ['PASSWORD_WORKERS'] = '0'
+    module = importlib.import_module('一键')
+    module.limiter.hit = lambda *args, **kwargs: (True, 0.0)
+    return module
@@ -0,0 +1,63 @@
+""" asgi.py 的适配器：请求在线程池中执行，请求体和流式响应按 ASGI 规范收发 """
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def application(notebook):
+    import asgi
+    return asgi.ExecutorWsgiToAsgi(notebook.app, threads=2)
+
+
+def call(application, method, path, body=b'', headers=(), chunk=7):
+    """ 执行一次 HTTP 请求，请求体按 chunk 字节分段送入，返回 (状态码, 响应头, 响应体, 响应体消息数) """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver')] + [(k.encode(), v.encode()) for k, v in headers],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    parts = [body[i:i + chunk] for i in range(0, len(body), chunk)] or [b'']
+    messages = [{'type': 'http.request', 'body': part, 'more_body': i < len(parts) - 1}
+                for i, part in enumerate(parts)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start, bodies = sent[0], sent[1:]
+    assert start['type'] == 'http.response.start' and not bodies[-1].get('more_body')
+    return start['status'], dict(start['headers']), b''.join(m.get('body', b'') for m in bodies), len(bodies)
+
+
+def test_form_post_and_redirect(application):
+    body = b'username=asgiuser&password=password'
+    status, headers, _, _ = call(application, 'POST', '/register', body,
+                                 [('content-type', 'application/x-www-form-urlencoded'),
+                                  ('content-length', str(len(body)))])
+    assert status == 302 and headers[b'location'].endswith(b'/login')
+
+
+def test_get_page(application):
+    status, headers, body, _ = call(application, 'GET', '/login')
+    assert status == 200 and headers[b'content-type'].startswith(b'text/html')
+    assert '登录'.encode() in body
+
+
+def test_lifespan(application):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(application({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
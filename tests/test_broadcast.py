@@ -0,0 +1,88 @@
+""" 房间广播：按节拍合并、背压降级、确认数校验和房间状态清理 """
+from types import SimpleNamespace
+
+import pytest
+
+from broadcast import RoomBroadcaster
+
+
+class FakeSocketIO:
+    """ 记录 emit 和 leave_room 调用，后台任务不启动 """
+
+    def __init__(self):
+        self.emitted = []
+        self.left = []
+        self.server = SimpleNamespace(leave_room=lambda sid, room, namespace: self.left.append((sid, room)))
+
+    def emit(self, event, data, to, namespace):
+        self.emitted.append((event, to, data))
+
+    def start_background_task(self, target):
+        pass
+
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+
+@pytest.fixture
+def broadcaster(socketio):
+    return RoomBroadcaster(socketio, high_water=3)
+
+
+def test_messages_in_one_tick_are_coalesced(broadcaster, socketio):
+    broadcaster.track('a', 'r1')
+    for i in range(5):
+        broadcaster.enqueue('r1', {'msg': i})
+    broadcaster.enqueue('r2', {'msg': 'x'})
+    broadcaster.flush()
+    assert [(event, to, len(data['messages'])) for event, to, data in socketio.emitted] == [
+        ('messages', 'r1', 5), ('messages', 'r2', 1)]
+    assert broadcaster.depth('a') == 1
+
+
+def test_lagging_client_is_removed_until_resync(broadcaster, socketio):
+    broadcaster.track('slow', 'r1')
+    broadcaster.track('fast', 'r1')
+    for i in range(5):
+        broadcaster.frame_delivered('r1', 2)
+        broadcaster.ack('fast', i + 1)
+    assert socketio.left == [('slow', 'r1')]
+    assert ('lagging', 'slow', {'room': 'r1'}) in socketio.emitted
+    stats = broadcaster.stats()
+    assert (stats['clients_lagging'], stats['clients_degraded'], stats['messages_dropped']) == (1, 1, 2)
+
+    broadcaster.track('slow', 'r1')  # resync
+    assert broadcaster.depth('slow') == 0
+    assert broadcaster.stats()['clients_lagging'] == 0
+
+
+def test_ack_is_clamped_to_frames_sent(broadcaster):
+    broadcaster.track('a', 'r1')
+    broadcaster.frame_delivered('r1', 1)
+    broadcaster.ack('a', 10 ** 6)  # 提前确认不能关闭背压
+    assert broadcaster.depth('a') == 0
+    for _ in range(3):
+        broadcaster.frame_delivered('r1', 1)
+    assert broadcaster.depth('a') == 3
+    broadcaster.frame_delivered('r1', 1)
+    assert broadcaster.stats()['clients_lagging'] == 1
+
+    broadcaster.ack('b', 5)  # 未跟踪的客户端被忽略
+    broadcaster.ack('a', -1)
+    assert broadcaster.depth('b') == 0
+
+
+def test_room_state_is_dropped_when_last_member_leaves(broadcaster):
+    for room in range(100):
+        broadcaster.track(f's{room}', f'room{room}')
+        broadcaster.frame_delivered(f'room{room}', 1)
+        broadcaster.untrack(f's{room}')
+    broadcaster.frame_delivered('nobody-here', 1)
+    assert broadcaster.stats()['rooms'] == 0
+    assert broadcaster._members == {} and broadcaster._clients == {}
+
+    broadcaster.track('a', 'r1')
+    broadcaster.track('a', 'r2')  # 换房间时离开原房间
+    assert set(broadcaster._members) == {'r2'}
@@ -0,0 +1,59 @@
+def join(chat, ip, username, room_id=''):
+    """ 以给定 IP 通过 /room 加入（或创建）房间，返回房间 id 和 Socket.IO 测试客户端 """
+    client = chat.app.test_client()
+    client.environ_base['REMOTE_ADDR'] = ip
+    response = client.post('/room', data={'username': username, 'room_id': room_id})
+    assert response.status_code == 302
+    room_id = response.location.split('/room/')[1].split('?')[0]
+    return room_id, chat.socketio.test_client(chat.app, flask_test_client=client)
+
+
+def outsider(chat, ip):
+    client = chat.app.test_client()
+    client.environ_base['REMOTE_ADDR'] = ip
+    return chat.socketio.test_client(chat.app, flask_test_client=client)
+
+
+def events(socket, name):
+    return [event['args'][0] for event in socket.get_received() if event['name'] == name]
+
+
+def test_member_gets_history(chat):
+    room, socket = join(chat, '10.9.0.1', 'alice')
+    socket.emit('join', {'room': room, 'user': 'alice'})
+    socket.emit('text', {'room': room, 'user': 'alice', 'msg': 'hello'})
+    socket.get_received()
+    socket.emit('history', {'room': room, 'before_id': 10 ** 9})
+    assert events(socket, 'history')
+    socket.disconnect()
+
+
+def test_outsider_cannot_join_or_read_history(chat):
+    room, member = join(chat, '10.9.0.2', 'bob')
+    member.emit('join', {'room': room, 'user': 'bob'})
+    member.emit('text', {'room': room, 'user': 'bob', 'msg': 'secret'})
+
+    socket = outsider(chat, '10.9.0.3')
+    socket.emit('history', {'room': room, 'before_id': 10 ** 9})
+    socket.emit('join', {'room': room, 'user': 'eve'})
+    socket.emit('resync', {'room': room})
+    received = socket.get_received()
+    assert [event['name'] for event in received] == ['access_denied'] * 3
+    assert 'secret' not in str(received)
+    member.disconnect()
+    socket.disconnect()
+
+
+def test_outsider_cannot_send_text(chat):
+    room, member = join(chat, '10.9.0.4', 'carol')
+    member.emit('join', {'room': room, 'user': 'carol'})
+    member.get_received()
+
+    socket = outsider(chat, '10.9.0.5')
+    socket.emit('text', {'room': room, 'user': 'mallory', 'msg': 'spam'})
+    assert [event['name'] for event in socket.get_received()] == ['access_denied']
+    assert all(item.msg != 'spam' for item in chat.history.recent(room))
+    chat.broadcaster.flush()
+    assert 'spam' not in str(member.get_received())
+    member.disconnect()
+    socket.disconnect()
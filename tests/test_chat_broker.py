@@ -0,0 +1,40 @@
+""" 通过 Unix 套接字代理在进程间转发房间广播 """
+import asyncio
+import threading
+import time
+
+import socketio
+
+import chat_broker
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_remote_emit_reaches_other_manager(tmp_path):
+    path = str(tmp_path / 'broker.sock')
+    broker = chat_broker.Broker(path)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(broker.serve(),), daemon=True).start()
+
+    servers = []
+    received = {}
+    for name in ('a', 'b'):
+        manager = chat_broker.UnixSocketManager(f'unix://{path}')
+        server = socketio.Server(client_manager=manager, async_mode='threading')
+        manager.initialize()
+        received[name] = []
+        chat_broker.on_remote_emit(manager, lambda *args, name=name: received[name].append(args))
+        servers.append(server)
+    assert wait_for(lambda: len(broker.subscribers) == 2)
+
+    servers[0].emit('messages', {'messages': []}, room='room1')
+    assert wait_for(lambda: received['b'])
+    assert received['b'] == [('messages', 'room1', [{'messages': []}])]
+    assert broker.frames == 1
+    time.sleep(0.1)
+    assert received['a'] == []  # 自己发出的广播不算远端广播
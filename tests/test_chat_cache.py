@@ -0,0 +1,78 @@
+""" 聊天室缓存：TTL 缓存的过期和负缓存、布隆过滤器、房间目录和成员缓存 """
+import pytest
+
+from chat_cache import MISSING, BloomFilter, MembershipCache, RoomDirectory, TTLCache
+from db_pool import ConnectionPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_negative_ttl_and_size():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, negative_ttl=1, clock=clock)
+    cache.put('a', 1)
+    cache.put('missing', None)
+    assert cache.get('a') == 1 and cache.get('missing') is None
+    clock.now = 1
+    assert cache.get('missing') is MISSING  # 负缓存先过期
+    assert cache.get('a') == 1
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)  # 超过 maxsize，淘汰最久未使用的 b
+    assert cache.get('b') is MISSING and cache.get('a') == 1
+    clock.now = 20
+    assert cache.get('a') is MISSING
+    assert (cache.hits, cache.misses) == (5, 3)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f'room-{i}' for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 300  # 期望约 1%
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'chat.db'), size=2)
+    with pool.connection() as conn:
+        conn.executescript('''
+            CREATE TABLE rooms (id TEXT PRIMARY KEY);
+            CREATE TABLE joins (ip TEXT PRIMARY KEY, room_id TEXT);
+            INSERT INTO rooms VALUES ('existing');
+        ''')
+    yield pool
+    pool.close_all()
+
+
+def test_room_directory(pool):
+    rooms = RoomDirectory(pool)
+    assert rooms.exists('existing')
+    assert not rooms.exists('nope') and rooms.bloom_rejects == 1
+    with pool.connection() as conn:  # 其他进程建的房间不在本进程的过滤器中
+        conn.execute("INSERT INTO rooms VALUES ('remote')")
+        conn.commit()
+    assert not rooms.exists('remote')
+    assert RoomDirectory(pool, authoritative=False).exists('remote')
+    rooms.added('local')
+    assert rooms.exists('local')
+
+
+def test_membership_cache_reads_through_and_writes_through(pool):
+    membership = MembershipCache(pool)
+    assert membership.room_of('1.2.3.4') is None
+    membership.joined('1.2.3.4', 'existing')
+    assert membership.room_of('1.2.3.4') == 'existing'
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO joins VALUES ('5.6.7.8', 'other')")
+        conn.commit()
+    assert MembershipCache(pool).room_of('5.6.7.8') == 'other'
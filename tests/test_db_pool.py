@@ -0,0 +1,86 @@
+""" 连接池：有界、复用连接、按租约归还 """
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=2, timeout=0.1)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+def count(pool):
+    with pool.connection() as conn:
+        return conn.execute('SELECT count(*) FROM t').fetchone()[0]
+
+
+def test_reuses_connections_up_to_size(pool):
+    first = pool.acquire()
+    first.close()
+    assert pool.acquire() is first  # 后进先出，复用刚归还的连接
+    second = pool.acquire()
+    assert second is not first
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert (stats['created'], stats['in_use'], stats['timeouts_total']) == (2, 2, 1)
+
+
+def test_waiter_gets_released_connection(pool):
+    held = [pool.acquire(), pool.acquire()]
+    pool.timeout = 5
+    threading.Timer(0.05, held[0].close).start()
+    assert pool.acquire() is held[0]
+    assert pool.stats()['waits_total'] == 1
+
+
+def test_release_rolls_back_and_ignores_repeats(pool):
+    conn = pool.acquire()
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.close()
+    conn.close()
+    assert not conn.in_transaction
+    assert count(pool) == 0
+    assert pool.stats()['idle'] == 1  # 重复归还没有把连接放回两次
+
+
+def test_stale_release_does_not_touch_next_holder(pool):
+    """ A 取出并归还，B 取到同一个连接开始写入，A 按旧租约再次归还不影响 B """
+    a = pool.acquire()
+    lease = a.lease
+    a.close()
+    b = pool.acquire()
+    assert b is a and b.lease != lease
+    b.execute('INSERT INTO t VALUES (1)')
+    pool.release(a, lease)
+    assert b.in_transaction
+    c = pool.acquire()
+    assert c is not b
+    b.commit()
+    c.close()
+    b.close()
+    assert count(pool) == 1
+
+
+def test_request_teardown_after_route_closed_connection(notebook):
+    """ 路由中 close() 之后连接被其他请求取走，请求结束钩子不会再次归还它 """
+    with notebook.app.app_context():
+        conn = notebook.get_db_connection()
+        conn.close()
+        other = notebook.db_pool.acquire()
+        assert other is conn
+        other.execute('CREATE TEMP TABLE IF NOT EXISTS lease_check (x)')
+        other.execute('INSERT INTO lease_check VALUES (1)')
+    assert other.in_transaction  # 请求结束钩子没有回滚其他持有者的事务
+    third = notebook.db_pool.acquire()
+    assert third is not other
+    third.close()
+    other.rollback()
+    other.close()
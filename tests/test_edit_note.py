@@ -0,0 +1,3 @@
+def test_edit_missing_note_is_404(client):
+    assert client.get('/notes/edit/999999').status_code == 404
+    assert client.post('/notes/edit/999999', data={'title': 't', 'content': 'c'}).status_code == 404
@@ -0,0 +1,103 @@
+""" 消息写后日志：sync 立即落盘，batch 按批写入并回填消息 id，失败时保留队列 """
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from db_pool import ConnectionPool
+from message_journal import MessageJournal
+
+SCHEMA = '''
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        room_id TEXT, ip TEXT, username TEXT, content TEXT, sent_at TEXT
+    )
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'chat.db'), size=2)
+    with pool.connection() as conn:
+        conn.execute(SCHEMA)
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+class Tasks:
+    """ 记录后台任务而不执行 """
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, target):
+        self.started.append(target)
+
+
+def stored(pool):
+    with pool.connection() as conn:
+        return [tuple(row) for row in conn.execute('SELECT id, room_id, content FROM messages ORDER BY id')]
+
+
+def append(journal, i):
+    item = SimpleNamespace(id=None)
+    journal.append('room', '127.0.0.1', 'user', f'msg {i}', '2026-01-01 00:00:00', item)
+    return item
+
+
+def test_sync_writes_immediately(pool):
+    tasks = Tasks()
+    journal = MessageJournal(pool, durability='sync', start_background_task=tasks)
+    item = append(journal, 0)
+    assert stored(pool) == [(1, 'room', 'msg 0')]
+    assert item.id == 1
+    assert (journal.written, journal.batches, journal.pending, tasks.started) == (1, 1, 0, [])
+
+
+def test_batch_defers_and_assigns_ids_in_order(pool):
+    tasks = Tasks()
+    journal = MessageJournal(pool, batch_size=3, start_background_task=tasks)
+    items = [append(journal, i) for i in range(7)]
+    assert stored(pool) == []
+    assert journal.pending == 7
+    # 第一条消息启动定时任务，此后每次积压达到 batch_size 时额外触发一次 flush
+    assert tasks.started[0] == journal._run
+    assert tasks.started[1:] == [journal.flush] * 5
+
+    assert journal.flush() == 7
+    assert [item.id for item in items] == list(range(1, 8))
+    assert [row[2] for row in stored(pool)] == [f'msg {i}' for i in range(7)]
+    assert (journal.written, journal.batches, journal.pending) == (7, 3, 0)
+
+
+def test_failed_flush_keeps_messages_queued(pool):
+    journal = MessageJournal(pool, batch_size=2, start_background_task=Tasks())
+    items = [append(journal, i) for i in range(3)]
+    with pool.connection() as conn:
+        conn.execute('ALTER TABLE messages RENAME TO broken')
+        conn.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        journal.flush()
+    assert journal.pending == 3 and items[0].id is None
+
+    with pool.connection() as conn:
+        conn.execute('ALTER TABLE broken RENAME TO messages')
+        conn.commit()
+    journal.stop()
+    assert [row[2] for row in stored(pool)] == ['msg 0', 'msg 1', 'msg 2']
+    assert [item.id for item in items] == [1, 2, 3]
+
+
+def test_background_task_flushes_on_interval(pool):
+    tasks = Tasks()
+    journal = MessageJournal(pool, start_background_task=tasks,
+                             sleep=lambda seconds: setattr(journal, '_running', False))
+    append(journal, 0)
+    tasks.started[0]()  # 运行一个节拍
+    assert journal.pending == 0 and len(stored(pool)) == 1
+
+
+def test_unknown_durability_is_rejected(pool):
+    with pytest.raises(ValueError):
+        MessageJournal(pool, durability='never')
@@ -0,0 +1,97 @@
+""" 请求指标：延迟直方图、SQL 语句数、模板渲染、自定义计数、错误数和慢请求采样 """
+import pytest
+from flask import Flask, render_template_string
+
+from db_pool import ConnectionPool
+from metrics import BACKGROUND, Metrics
+
+
+def make_app(metrics, pool):
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/items')
+    def items():
+        with pool.connection() as conn:
+            conn.execute('SELECT 1').fetchone()
+            conn.execute('SELECT 2').fetchall()
+        metrics.count('lcs_comparisons', 5)
+        return render_template_string('{{ n }}', n=1)
+
+    @app.route('/boom')
+    def boom():
+        return 'error', 500
+
+    return app
+
+
+def value(text, line_prefix):
+    return next(line.rsplit(' ', 1)[1] for line in text.splitlines() if line.startswith(line_prefix))
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'metrics.db'), size=1)
+    yield pool
+    pool.close_all()
+
+
+def test_route_metrics(pool):
+    metrics = Metrics(buckets=(0.5, 10.0))
+    metrics.instrument(pool)
+    client = make_app(metrics, pool).test_client()
+    for _ in range(3):
+        assert client.get('/items').status_code == 200
+    client.get('/boom')
+    client.get('/missing')
+
+    text = client.get('/metrics').text
+    assert value(text, 'http_request_duration_seconds_count{route="items"}') == '3'
+    assert value(text, 'http_request_duration_seconds_bucket{route="items",le="+Inf"}') == '3'
+    assert value(text, 'sql_statements_total{route="items"}') == '6'
+    assert float(value(text, 'sql_seconds_total{route="items"}')) > 0
+    assert float(value(text, 'template_render_seconds_total{route="items"}')) > 0
+    assert value(text, 'lcs_comparisons_total{route="items"}') == '15'
+    assert value(text, 'http_request_errors_total{route="boom"}') == '1'
+    assert value(text, 'http_request_errors_total{route="items"}') == '0'
+    assert value(text, 'http_request_duration_seconds_count{route="<unmatched>"}') == '1'
+
+
+def test_background_sql_and_tracked_events(pool):
+    metrics = Metrics()
+    metrics.instrument(pool)
+    with pool.connection() as conn:
+        conn.execute('SELECT 1')
+
+    @metrics.track('on_text')
+    def on_text(fail):
+        with pool.connection() as conn:
+            conn.execute('SELECT 1')
+        if fail:
+            raise ValueError
+
+    on_text(False)
+    with pytest.raises(ValueError):
+        on_text(True)
+    text = metrics.render()
+    assert value(text, f'sql_statements_total{{route="{BACKGROUND}"}}') == '1'
+    assert value(text, 'sql_statements_total{route="on_text"}') == '2'
+    assert value(text, 'http_request_errors_total{route="on_text"}') == '1'
+
+
+def test_slow_requests_are_profiled(pool, tmp_path):
+    metrics = Metrics(profile_ms=0.0001, profile_sample=1.0, profile_dir=str(tmp_path / 'profiles'))
+    client = make_app(metrics, pool).test_client()
+    client.get('/items')
+    assert metrics.profiles_written == 1
+    assert [path.suffix for path in (tmp_path / 'profiles').iterdir()] == ['.prof']
+
+
+def test_disabled_metrics_add_nothing(pool):
+    metrics = Metrics(enabled=False)
+    factory = pool.factory
+    metrics.instrument(pool)
+    app = make_app(metrics, pool)
+    assert pool.factory is factory
+    assert app.test_client().get('/metrics').status_code == 404
+    assert metrics.track('x')(len) is len
@@ -0,0 +1,59 @@
+""" 迁移执行器：按 user_version 只执行未应用的迁移，失败的迁移整体回滚 """
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'migrate.db'))
+    yield conn
+    conn.close()
+
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_split_statements_keeps_trigger_bodies():
+    script = '''
+        CREATE TABLE a (x);
+        CREATE TRIGGER t AFTER INSERT ON a BEGIN
+            INSERT INTO a VALUES (1);
+            DELETE FROM a WHERE x = 2;
+        END;
+        SELECT 1
+    '''
+    statements = migrations.split_statements(script)
+    assert len(statements) == 3
+    assert statements[1].startswith('CREATE TRIGGER') and statements[1].endswith('END;')
+
+
+def test_applies_pending_steps_once(conn):
+    calls = []
+    steps = ['CREATE TABLE a (x);', lambda c: calls.append(c.execute('SELECT count(*) FROM a').fetchone()[0])]
+    assert migrations.migrate(conn, steps) == 2
+    assert migrations.migrate(conn, steps) == 2
+    assert calls == [0]
+
+    steps.append("CREATE TABLE b (y); INSERT INTO b VALUES ('a;b');")  # 同一行的两条语句
+    assert migrations.migrate(conn, steps) == 3
+    assert tables(conn) == {'a', 'b'}
+    assert calls == [0]
+
+
+def test_failed_step_is_rolled_back(conn):
+    def fail(c):
+        c.execute('CREATE TABLE partial (x)')
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn, ['CREATE TABLE a (x);', fail, 'CREATE TABLE c (z);'])
+    assert migrations.current_version(conn) == 1
+    assert tables(conn) == {'a'}
+    assert not conn.in_transaction
+    assert conn.isolation_level == ''  # 恢复调用方的事务设置
+
+    assert migrations.migrate(conn, ['CREATE TABLE a (x);', 'CREATE TABLE b (y);']) == 2
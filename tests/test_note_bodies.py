@@ -0,0 +1,90 @@
+""" 长正文分表和全文索引由 NoteStore 维护，不依赖连接上注册的 SQL 函数 """
+import sqlite3
+
+import pytest
+
+import migrations
+import search_index
+
+LONG = '长正文 trigram ' * 400  # 超过 INLINE_LIMIT
+
+
+@pytest.fixture
+def conn(notebook):
+    """ 没有注册任何 SQL 函数的普通连接 """
+    conn = sqlite3.connect(notebook.db_pool.database)
+    yield conn
+    conn.close()
+
+
+def search_ids(conn, user_id, query):
+    return [row[0] for row in search_index.search(conn, user_id, query)]
+
+
+def test_long_note_round_trip(notebook, conn):
+    notes = notebook.notes_store
+    note_id = notes.create(conn, 9001, '长笔记', LONG)
+    conn.commit()
+    assert conn.execute('SELECT typeof(content) FROM notes WHERE id = ?', (note_id,)).fetchone()[0] == 'blob'
+    assert conn.execute('SELECT count(*) FROM note_bodies WHERE note_id = ?', (note_id,)).fetchone()[0] == 1
+    assert notes.get(conn, note_id, 9001).content == LONG
+    page, _ = notes.page(conn, 9001, preview=True)
+    assert page[0].content == LONG[:200]
+
+    notes.update(conn, note_id, '短笔记', 'short')
+    conn.commit()
+    assert notes.get(conn, note_id, 9001).content == 'short'
+    assert conn.execute('SELECT count(*) FROM note_bodies WHERE note_id = ?', (note_id,)).fetchone()[0] == 0
+
+
+def test_search_index_follows_writes(notebook, conn):
+    notes = notebook.notes_store
+    note_id = notes.create(conn, 9002, 'alpha', LONG)
+    conn.commit()
+    assert search_ids(conn, 9002, 'trigram') == [note_id]
+
+    notes.update(conn, note_id, 'beta', 'gamma delta')
+    conn.commit()
+    assert search_ids(conn, 9002, 'trigram') == []
+    assert search_ids(conn, 9002, 'gamma') == [note_id]
+
+    notes.update(conn, note_id, 'epsilon')  # 只改标题，正文沿用
+    conn.commit()
+    assert search_ids(conn, 9002, 'beta') == []
+    assert search_ids(conn, 9002, 'gamma') == search_ids(conn, 9002, 'epsilon') == [note_id]
+
+    assert notes.delete(conn, note_id, 9002)
+    conn.commit()
+    assert search_ids(conn, 9002, 'gamma') == []
+
+
+def test_insert_many_and_rebuild(notebook, conn):
+    notes = notebook.notes_store
+    assert notes.insert_many(conn, 9003, [('first', LONG, 0), ('second', 'zeta', 1)], batch=1) == 2
+    ids = sorted(search_ids(conn, 9003, 'trigram') + search_ids(conn, 9003, 'zeta'))
+    assert [note.content for note in notes.get_many(conn, ids)] == [LONG, 'zeta']
+    assert conn.execute('SELECT count(*) FROM note_bodies WHERE note_id = ?', (ids[0],)).fetchone()[0] == 1
+
+    search_index.rebuild(conn)
+    conn.commit()
+    assert search_ids(conn, 9003, 'trigram') == ids[:1]
+
+
+def test_migrations_run_without_sql_functions(notebook, tmp_path):
+    """ 在没有注册任何函数的连接上，把引入迁移之前的数据库升级到最新版本 """
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT);
+        CREATE TABLE notes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, title TEXT,
+                            content TEXT, markdown_enabled INTEGER DEFAULT 0);
+    ''')
+    conn.execute("INSERT INTO notes (user_id, title, content) VALUES (1, 'old long', ?)", (LONG,))
+    conn.execute("INSERT INTO notes (user_id, title, content) VALUES (1, 'old short', 'zeta')")
+    conn.commit()
+
+    assert migrations.migrate(conn, notebook.MIGRATIONS) == len(notebook.MIGRATIONS)
+    assert conn.execute('SELECT typeof(content) FROM notes ORDER BY id').fetchall() == [('blob',), ('text',)]
+    assert notebook.notes_store.get(conn, 1, 1).content == LONG
+    assert search_ids(conn, 1, 'trigram') == [1]
+    assert search_ids(conn, 1, 'zeta') == [2]
+    conn.close()
@@ -0,0 +1,25 @@
+""" /notes/get/<id> 的强 ETag：版本号不变时回 304，修改后失效 """
+
+
+def test_etag_round_trip(notebook, client):
+    client.post('/notes/new', data={'title': 't', 'content': '*hi*', 'markdown_enabled': 'on'})
+    with notebook.db_pool.connection() as conn:
+        note_id = notebook.notes_store.page(conn, client.user_id)[0][0].id
+
+    response = client.get(f'/notes/get/{note_id}')
+    assert response.status_code == 200
+    assert '<em>hi</em>' in response.get_json()['html']
+    etag = response.headers['ETag']
+    assert client.get(f'/notes/get/{note_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    client.post(f'/notes/edit/{note_id}', data={'title': 't', 'content': 'changed'})
+    response = client.get(f'/notes/get/{note_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert response.get_json()['content'] == 'changed'
+
+
+def test_other_users_note_is_404(notebook, client, make_client):
+    client.post('/notes/new', data={'title': 't', 'content': 'c'})
+    with notebook.db_pool.connection() as conn:
+        note_id = notebook.notes_store.page(conn, client.user_id)[0][0].id
+    assert make_client().get(f'/notes/get/{note_id}').status_code == 404
@@ -0,0 +1,24 @@
+""" 笔记列表按 after_id 游标分页 """
+
+
+def create_notes(notebook, client, count):
+    with notebook.db_pool.connection() as conn:
+        notebook.notes_store.insert_many(conn, client.user_id, [(f'note {i}', '', 0) for i in range(count)])
+
+
+def test_pages_follow_cursor(notebook, client, monkeypatch):
+    monkeypatch.setattr(notebook, 'NOTES_PAGE_SIZE', 3)
+    create_notes(notebook, client, 7)
+    titles = []
+    after_id = None
+    for _ in range(3):
+        page = client.get('/notes/page', query_string={'after_id': after_id} if after_id else {}).get_json()
+        titles += [note['title'] for note in page['notes']]
+        after_id = page['next_after_id']
+    assert titles == [f'note {i}' for i in reversed(range(7))]  # 新的在前，不重不漏
+    assert after_id is None
+
+
+def test_pages_only_show_own_notes(notebook, client, make_client):
+    create_notes(notebook, client, 2)
+    assert make_client().get('/notes/page').get_json() == {'notes': [], 'next_after_id': None}
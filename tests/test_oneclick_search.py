@@ -0,0 +1,45 @@
+""" 一键.py 的标题搜索：按 LCS 得分取前 offset + limit 个，分页不重不漏 """
+import re
+
+import pytest
+
+TITLES = ['项目计划书', '项目周报', '计划', '读书笔记', '项目计划表 v2', '周末', 'zzz']
+
+
+@pytest.fixture
+def client(oneclick):
+    client = oneclick.app.test_client()
+    client.post('/register', data={'username': 'searcher', 'password': 'password'})
+    assert client.post('/login', data={'username': 'searcher', 'password': 'password'}).status_code == 302
+    with oneclick.db_pool.connection() as conn:
+        user_id = oneclick.users.by_username(conn, 'searcher').id
+        oneclick.notes_store.insert_many(conn, user_id, [(title, '正文', 0) for title in TITLES])
+    return client
+
+
+def search(client, **params):
+    page = client.get('/search', query_string=params).text
+    return re.findall(r'<h5>(.*?)</h5>', page), '下一页' in page
+
+
+def test_results_are_ranked_and_paginated(oneclick, client):
+    scorer = oneclick.LcsScorer('项目计划')
+    matching = [title for title in TITLES if scorer.score(title) > 0]
+
+    found = []
+    for offset in range(0, len(matching), 2):
+        titles, has_next = search(client, query='项目计划', limit=2, offset=offset)
+        assert len(titles) == min(2, len(matching) - offset)
+        assert has_next == (offset + 2 < len(matching))
+        found += titles
+    assert sorted(found) == sorted(matching)  # 每个匹配的标题恰好出现在一页中
+    scores = [scorer.score(title) for title in found]
+    assert scores == sorted(scores, reverse=True)
+    assert search(client, query='项目计划', limit=2, offset=len(matching)) == ([], False)
+
+
+def test_limit_is_clamped(oneclick, client):
+    titles, _ = search(client, query='项目计划', limit=10 ** 6)
+    assert len(titles) <= oneclick.SEARCH_MAX_LIMIT
+    titles, _ = search(client, query='项目计划', limit=0, offset=-5)
+    assert len(titles) == 1
@@ -0,0 +1,23 @@
+""" 密码哈希进程池在启动时创建，工作进程不由 fork 直接复制 """
+import password_pool
+from password_pool import PasswordHasher
+
+
+def test_start_creates_pool_with_forkserver_or_spawn():
+    hasher = PasswordHasher(workers=1, timeout=30)
+    try:
+        hasher.start()
+        executor = hasher._executor
+        assert executor._mp_context.get_start_method() == password_pool.START_METHOD != 'fork'
+        pwhash = hasher.hash('secret')
+        assert hasher.verify(pwhash, 'secret') and not hasher.verify(pwhash, 'other')
+        assert hasher._executor is executor  # 请求中沿用启动时创建的进程池
+    finally:
+        hasher.shutdown()
+
+
+def test_inline_mode_has_no_pool():
+    hasher = PasswordHasher(workers=0)
+    hasher.start()
+    assert hasher._executor is None
+    assert hasher.verify(hasher.hash('secret'), 'secret')
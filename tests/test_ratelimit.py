@@ -0,0 +1,84 @@
+""" 令牌桶：突发上限、按速率补充、清理补满的桶和路由装饰器 """
+import pytest
+from flask import Flask
+
+from ratelimit import MemoryBackend, RateLimiter, SQLiteBackend, per_minute
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    clock = Clock()
+    if request.param == 'memory':
+        backend = MemoryBackend(sweep_every=5, clock=clock)
+    else:
+        backend = SQLiteBackend(str(tmp_path / 'rate.db'), sweep_every=5, clock=clock)
+    return backend
+
+
+def test_burst_then_refill(backend):
+    clock = backend.clock
+    assert [backend.take('k', rate=2, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = backend.take('k', rate=2, burst=3)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    clock.now += 0.5  # 补充 1 个
+    assert backend.take('k', rate=2, burst=3) == (True, 0.0)
+    assert not backend.take('k', rate=2, burst=3)[0]
+    clock.now += 3600  # 补充不超过 burst
+    assert [backend.take('k', rate=2, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+    assert backend.take('other', rate=2, burst=3)[0]  # 键之间互不影响
+
+
+def test_cost_larger_than_tokens(backend):
+    assert backend.take('k', rate=1, burst=5, cost=4)[0]
+    allowed, retry_after = backend.take('k', rate=1, burst=5, cost=4)
+    assert not allowed and retry_after == pytest.approx(3)
+
+
+def test_memory_sweep_drops_full_buckets():
+    clock = Clock()
+    backend = MemoryBackend(sweep_every=10, clock=clock)
+    for i in range(9):
+        backend.take(f'k{i}', rate=1, burst=2)
+    assert len(backend) == 9
+    clock.now += 1  # 所有桶都已补满
+    backend.take('last', rate=1, burst=2)
+    assert len(backend) == 1
+
+
+def test_route_decorator_limits_post_only():
+    app = Flask(__name__)
+    limiter = RateLimiter(MemoryBackend())
+
+    @app.route('/login', methods=['GET', 'POST'])
+    @limiter.limit(per_minute(60), burst=2)
+    def login():
+        return 'ok'
+
+    client = app.test_client()
+    assert [client.post('/login').status_code for _ in range(3)] == [200, 200, 429]
+    assert int(client.post('/login').headers['Retry-After']) >= 1
+    assert client.get('/login').status_code == 200
+    assert limiter.rejected == 2
+
+
+def test_event_decorator_calls_on_reject():
+    limiter = RateLimiter(MemoryBackend())
+    rejected = []
+
+    @limiter.limit_event(rate=1, burst=1, key_func=lambda data: data['user'],
+                         on_reject=lambda data, retry_after: rejected.append(data['user']))
+    def on_text(data):
+        return data['msg']
+
+    assert on_text({'user': 'a', 'msg': 'hi'}) == 'hi'
+    assert on_text({'user': 'a', 'msg': 'again'}) is None
+    assert on_text({'user': 'b', 'msg': 'hi'}) == 'hi'
+    assert rejected == ['a']
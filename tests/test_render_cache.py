@@ -0,0 +1,73 @@
+""" Markdown 渲染缓存：进程内 LRU + note_renders 表，内容变化后失效 """
+import pytest
+
+import render_cache
+from db_pool import ConnectionPool
+from render_cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('b', 'x') == 'x'
+    assert (cache.get('a'), cache.get('c'), len(cache)) == (1, 3, 2)
+    cache.pop('a')
+    cache.pop('missing')
+    assert len(cache) == 1
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache, 'memory_cache', LRUCache())
+    pool = ConnectionPool(str(tmp_path / 'render.db'), size=1)
+    with pool.connection() as conn:
+        conn.executescript('CREATE TABLE notes (id INTEGER PRIMARY KEY);' + render_cache.RENDER_SCHEMA)
+        conn.execute('INSERT INTO notes (id) VALUES (1)')
+        conn.commit()
+        yield conn
+    pool.close_all()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """ 记录真正执行的渲染次数 """
+    calls = []
+    original = render_cache.render_markdown
+
+    def render(content):
+        calls.append(content)
+        return original(content)
+    monkeypatch.setattr(render_cache, 'render_markdown', render)
+    return calls
+
+
+def test_render_is_cached_per_content(conn, renders):
+    html = render_cache.render_note(conn, 1, '# 标题')
+    assert '<h1>标题</h1>' in html
+    assert render_cache.render_note(conn, 1, '# 标题') == html
+    render_cache.memory_cache.clear()  # 其他进程或重启后从表中读取
+    assert render_cache.render_note(conn, 1, '# 标题') == html
+    assert renders == ['# 标题']
+
+    assert '<em>改了</em>' in render_cache.render_note(conn, 1, '*改了*')  # 内容哈希不同，重新渲染
+    assert len(renders) == 2
+
+
+def test_invalidate_and_delete_remove_renders(conn, renders):
+    render_cache.render_note(conn, 1, 'text')
+    render_cache.invalidate(conn, 1)
+    conn.commit()
+    assert conn.execute('SELECT count(*) FROM note_renders').fetchone()[0] == 0
+    render_cache.render_note(conn, 1, 'text')
+    assert len(renders) == 2
+
+    conn.execute('DELETE FROM notes WHERE id = 1')
+    conn.commit()
+    assert conn.execute('SELECT count(*) FROM note_renders').fetchone()[0] == 0
+
+
+def test_raw_html_is_escaped():
+    assert '<script>' not in render_cache.render_markdown('<script>alert(1)</script>')
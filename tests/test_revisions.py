@@ -0,0 +1,60 @@
+import revisions
+
+
+def create_note(notebook, client, content):
+    with notebook.db_pool.connection() as conn:
+        note_id = notebook.notes_store.create(conn, client.user_id, 'title', content)
+        conn.commit()
+    return note_id
+
+
+def revision_count(notebook, note_id):
+    with notebook.db_pool.connection() as conn:
+        return len(revisions.list_revisions(conn, note_id))
+
+
+def test_autosaves_are_coalesced(notebook, client):
+    """ 一次编辑过程中的多次自动保存只留下编辑前的内容 """
+    note_id = create_note(notebook, client, 'v0')
+    version = 1
+    for i in range(5):
+        response = client.patch(f'/notes/{note_id}', json={
+            'base_version': version, 'edits': [{'start': 1, 'end': len(str(i)) + 1, 'text': str(i + 1)}]})
+        assert response.status_code == 200
+        version = response.get_json()['version']
+    assert revision_count(notebook, note_id) == 1
+    with notebook.db_pool.connection() as conn:
+        assert revisions.get_revision(conn, note_id, 1) == ('title', 'v0')
+
+    # 点击“更新”保存时总是记录修订
+    client.post(f'/notes/edit/{note_id}', data={'title': 'title', 'content': 'final'})
+    assert revision_count(notebook, note_id) == 2
+    with notebook.db_pool.connection() as conn:
+        assert revisions.get_revision(conn, note_id, 2) == ('title', 'v5')
+
+
+def test_get_revision_across_snapshot_boundaries(notebook, client):
+    """ 跨过多个快照间隔后，每个修订都能从最近的快照和其后的增量还原 """
+    # 正文足够长，增量才比快照小得多，不会退化为快照
+    initial = ''.join(f'line {j}: {"lorem ipsum " * (j % 7 + 1)}\n' for j in range(200))
+    note_id = create_note(notebook, client, initial)
+    versions = [('title', initial)]
+    edits = revisions.SNAPSHOT_INTERVAL * 2 + 8
+    for i in range(1, edits + 1):
+        lines = versions[-1][1].splitlines(True)
+        if i % 3:
+            lines[i * 7 % len(lines)] = f'changed {i}\n'
+        content = ''.join(lines) + f'appended {i}\n'
+        title = f'title {i // 5}'
+        client.post(f'/notes/edit/{note_id}', data={'title': title, 'content': content})
+        versions.append((title, content))
+
+    with notebook.db_pool.connection() as conn:
+        kinds = {row['revision']: row['kind'] for row in revisions.list_revisions(conn, note_id)}
+        assert len(kinds) == edits
+        # 修订 1、17、33 为快照，其余为增量
+        assert [r for r, kind in sorted(kinds.items()) if kind == revisions.SNAPSHOT] == [1, 17, 33]
+        for revision in range(1, edits + 1):
+            assert revisions.get_revision(conn, note_id, revision) == versions[revision - 1]
+        assert revisions.get_revision(conn, note_id, edits + 1) is None
+        assert revisions.get_revision(conn, note_id, 0) is None
@@ -0,0 +1,45 @@
+""" 房间历史：环形缓冲区保留最近消息，更早的消息按 before_id 分页，房间数有上限 """
+import pytest
+
+from db_pool import ConnectionPool
+from room_history import HistoryItem, RoomHistory
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'chat.db'), size=2)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, room_id TEXT, '
+                     'username TEXT, content TEXT, sent_at TEXT)')
+        conn.executemany('INSERT INTO messages (room_id, username, content, sent_at) VALUES (?, ?, ?, ?)',
+                         [(f'r{i % 2}', 'u', f'm{i}', '2026-01-01') for i in range(20)])
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+def test_buffer_loads_recent_and_keeps_capacity(pool):
+    history = RoomHistory(pool, capacity=4, page_size=3)
+    assert [item.msg for item in history.recent('r0')] == ['m12', 'm14', 'm16', 'm18']
+    history.add('r0', HistoryItem(None, 'u', 'new', '2026-01-02'))
+    assert [item.msg for item in history.recent('r0')] == ['m14', 'm16', 'm18', 'new']
+    assert history.recent('empty') == []
+
+
+def test_older_pages_by_id(pool):
+    history = RoomHistory(pool, page_size=3)
+    first = history.recent('r1')[0]
+    assert first.to_dict() == {'id': 2, 'user': 'u', 'msg': 'm1', 'sent_at': '2026-01-01'}
+    page = history.older('r1', 14)  # m13 的 id 为 14
+    assert [item.msg for item in page] == ['m7', 'm9', 'm11']
+    assert history.older('r1', first.id) == []
+
+
+def test_least_recently_used_room_is_evicted(pool):
+    history = RoomHistory(pool, max_rooms=2)
+    history.add('a', HistoryItem(1, 'u', 'only in memory', ''))
+    history.recent('b')
+    history.recent('a')  # a 变为最近使用
+    history.recent('c')  # 淘汰 b
+    assert set(history._rooms) == {'a', 'c'}
+    assert [item.msg for item in history.recent('a')] == ['only in memory']
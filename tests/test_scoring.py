@@ -0,0 +1,63 @@
+""" 位并行 LCS 与朴素 DP 的结果一致（包括 NumPy 批量模式和提前退出的阈值） """
+import random
+
+import pytest
+
+import scoring
+from scoring import LcsScorer, lcs_length
+
+CHARS = '会议记录项目计划😀ab c'
+
+
+def dp_lcs(a, b):
+    """ 参考实现：(m+1)×(n+1) DP 表 """
+    dp = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            dp[i + 1][j + 1] = dp[i][j] + 1 if x == y else max(dp[i][j + 1], dp[i + 1][j])
+    return dp[-1][-1]
+
+
+def random_text(rng, max_length):
+    return ''.join(rng.choice(CHARS) for _ in range(rng.randint(0, max_length)))
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1234)
+
+
+def test_score_matches_dp(rng):
+    for _ in range(300):
+        a, b = random_text(rng, 20), random_text(rng, 30)
+        assert lcs_length(a, b) == dp_lcs(a, b), (a, b)
+
+
+def test_long_query_uses_big_integers(rng):
+    for _ in range(20):
+        a, b = random_text(rng, 200) + 'x', random_text(rng, 200)
+        assert lcs_length(a, b) == dp_lcs(a, b)
+
+
+def test_threshold_returns_zero_only_below_it(rng):
+    for _ in range(300):
+        a, b = random_text(rng, 12), random_text(rng, 20)
+        threshold = rng.randint(0, 8)
+        expected = dp_lcs(a, b)
+        assert LcsScorer(a).score(b, threshold) == (expected if expected >= threshold else 0)
+
+
+@pytest.mark.parametrize('numpy', [True, False])
+def test_score_many_matches_dp(rng, monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(scoring, 'BLOCK_SIZE', 7)  # 跨多个块
+    else:
+        monkeypatch.setattr(scoring, 'np', None)
+    for length in (1, 5, scoring.WORD_BITS, scoring.WORD_BITS + 1):
+        query = ''.join(rng.choice(CHARS) for _ in range(length))
+        texts = [random_text(rng, 80) for _ in range(40)] + ['', '\0' + query]
+        expected = [dp_lcs(query, text) for text in texts]
+        assert LcsScorer(query).score_many(texts) == expected
+        assert LcsScorer(query).score_many(texts, threshold=3) == [s if s >= 3 else 0 for s in expected]
+    assert LcsScorer('abc').score_many([]) == []
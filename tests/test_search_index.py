@@ -0,0 +1,51 @@
+""" 全文检索：短于 trigram 的词不被忽略，在索引命中的笔记中过滤 """
+import sqlite3
+
+import pytest
+
+import search_index
+
+LONG = 'trigram 长正文 ' * 400  # 超过 INLINE_LIMIT，正文在 note_bodies 中
+
+
+@pytest.fixture
+def conn(notebook):
+    conn = sqlite3.connect(notebook.db_pool.database)
+    yield conn
+    conn.close()
+
+
+def search_titles(conn, user_id, query):
+    return sorted(row[1] for row in search_index.search(conn, user_id, query))
+
+
+def test_split_terms():
+    assert search_index.split_terms(' python ab  c 会议记录 ') == (['python', '会议记录'], ['ab', 'c'])
+    assert search_index.build_match_query(['say "hi"']) == '"say ""hi"""'
+
+
+def test_short_terms_filter_index_matches(notebook, conn):
+    notes = notebook.notes_store
+    notes.create(conn, 9101, 'python AB', 'flask')
+    notes.create(conn, 9101, 'python', 'body with ab inside')
+    notes.create(conn, 9101, 'python', 'nothing here')
+    notes.create(conn, 9101, 'python long', LONG + ' ab')
+    notes.create(conn, 9101, 'python long', LONG)
+    notes.create(conn, 9101, 'python 100%', 'x_y')
+    conn.commit()
+
+    assert search_index.search(conn, 9101, 'ab c') is None  # 只有短词时由调用方处理
+    assert len(search_titles(conn, 9101, 'python')) == 6
+    assert search_titles(conn, 9101, 'python ab') == ['python', 'python AB', 'python long']
+    assert search_titles(conn, 9101, 'ab python 长') == ['python long']
+    assert search_titles(conn, 9101, 'python %') == ['python 100%']
+    assert search_titles(conn, 9101, 'python _') == ['python 100%']
+    assert search_titles(conn, 9101, 'python zz') == []
+    assert len(search_index.search(conn, 9101, 'python ab', limit=2)) == 2
+
+
+def test_search_route_keeps_short_terms(notebook, client):
+    client.post('/notes/new', data={'title': 'release ab', 'content': ''})
+    client.post('/notes/new', data={'title': 'release cd', 'content': ''})
+    page = client.post('/notes', data={'search': 'release ab'}).text
+    assert 'release ab' in page and 'release cd' not in page
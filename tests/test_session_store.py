@@ -0,0 +1,101 @@
+""" 服务端会话：登录换发会话 id、滑动过期和过期清理 """
+import sqlite3
+
+import pytest
+from flask import Flask, session
+
+import migrations
+from session_store import SESSIONS_SCHEMA, SessionStore
+
+
+class Clock:
+    """ 可手动拨动的 time.time """
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('session_store.time.time', clock)
+    return clock
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    database = str(tmp_path / 'sessions.db')
+    conn = sqlite3.connect(database)
+    migrations.migrate(conn, [SESSIONS_SCHEMA])
+    conn.close()
+    return SessionStore(database, idle_timeout=100, cache_ttl=1000, touch_interval=10,
+                        start_background_task=lambda target: None)
+
+
+@pytest.fixture
+def client(sessions):
+    app = Flask(__name__)
+    sessions.init_app(app)
+
+    @app.route('/visit')
+    def visit():
+        session['visits'] = session.get('visits', 0) + 1
+        return str(session.get('user_id'))
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_id'] = user_id
+        return ''
+
+    @app.route('/whoami')
+    def whoami():
+        return str(session.get('user_id'))
+
+    return app.test_client()
+
+
+def session_cookie(client):
+    return next(cookie.value for cookie in client.cookie_jar if cookie.name == 'session')
+
+
+def test_login_issues_new_session_id(client, sessions, clock):
+    client.get('/visit')
+    before = session_cookie(client)
+    client.get('/login/7')
+    after = session_cookie(client)
+    assert before.partition('.')[0] != after.partition('.')[0]
+
+    # 攻击者事先拿到的会话 id 登录后失效，数据库中也不再有这条记录
+    client.set_cookie('localhost', 'session', before)
+    assert client.get('/whoami').text == 'None'
+    with sessions.pool.connection() as conn:
+        assert conn.execute('SELECT count(*) FROM sessions').fetchone()[0] == 1
+
+    client.set_cookie('localhost', 'session', after)
+    assert client.get('/whoami').text == '7'
+
+
+def test_sliding_expiry_and_sweep(client, sessions, clock):
+    client.get('/login/7')
+    for _ in range(3):  # 每次请求都把过期时间推后，超过 idle_timeout 仍有效
+        clock.now += 60
+        assert client.get('/whoami').text == '7'
+
+    clock.now += 101
+    assert client.get('/whoami').text == 'None'
+    assert sessions.sweep() == 1
+
+
+def test_other_process_sees_logout_after_cache_ttl(client, sessions, clock):
+    client.get('/login/7')
+    cookie = session_cookie(client)
+    with sessions.pool.connection() as conn:  # 其他进程登出
+        conn.execute('DELETE FROM sessions')
+        conn.commit()
+    assert client.get('/whoami').text == '7'  # 本进程缓存仍有效
+    clock.now += 1001
+    client.set_cookie('localhost', 'session', cookie)
+    assert client.get('/whoami').text == 'None'
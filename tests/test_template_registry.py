@@ -0,0 +1,50 @@
+""" 内联模板注册表和列表项片段缓存 """
+from flask import Flask, render_template, render_template_string
+
+import template_registry
+from template_registry import FragmentCache
+
+TEMPLATES = {
+    'base.html': '<title>{% block title %}{% endblock %}</title>',
+    'page.html': '{% extends "base.html" %}{% block title %}{{ name }}{% endblock %}',
+    'item.html': '{% macro item(note) %}<li>{{ note.title }}</li>{% endmacro %}',
+}
+
+
+def test_registered_templates_render_by_name(tmp_path):
+    (tmp_path / 'base.html').write_text('<h1>{% block title %}{% endblock %}</h1>')
+    app = Flask(__name__, template_folder=str(tmp_path))
+    template_registry.register(app, TEMPLATES)
+    with app.app_context():
+        # templates/ 目录中的同名文件优先
+        assert render_template('page.html', name='<x>') == '<h1>&lt;x&gt;</h1>'
+    compiled = {name for _, name in app.jinja_env.cache.keys()}  # 注册时已预先编译
+    assert set(TEMPLATES) <= compiled
+
+
+def test_fragment_cache_hits_by_key_and_escapes():
+    app = Flask(__name__)
+    template_registry.register(app, TEMPLATES)
+    cache = FragmentCache(maxsize=2)
+    source = ('{% from "item.html" import item %}'
+              '{% for note in notes %}{{ cache.render(note.key, item, note) }}{% endfor %}')
+    notes = [{'key': (1, 1), 'title': '<b>'}, {'key': (2, 1), 'title': 'b'}]
+    with app.app_context():
+        first = render_template_string(source, notes=notes, cache=cache)
+        assert first == '<li>&lt;b&gt;</li><li>b</li>'
+        notes[0]['title'] = 'changed'  # 版本号没变，仍返回缓存的片段
+        assert render_template_string(source, notes=notes, cache=cache) == first
+        notes[0]['key'] = (1, 2)
+        assert render_template_string(source, notes=notes, cache=cache).startswith('<li>changed</li>')
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_large_fragments_and_disabled_cache_are_not_stored(monkeypatch):
+    monkeypatch.setattr(template_registry, 'FRAGMENT_MAX_BYTES', 10)
+    cache = FragmentCache()
+    cache.render('big', lambda: 'x' * 11)
+    cache.render('big', lambda: 'x' * 11)
+    disabled = FragmentCache(maxsize=0)
+    disabled.render('k', lambda: 'y')
+    disabled.render('k', lambda: 'y')
+    assert (cache.misses, disabled.misses, disabled.hits) == (2, 2, 0)
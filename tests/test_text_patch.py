@@ -0,0 +1,84 @@
+import pytest
+
+import text_patch
+from text_patch import PatchError, apply_edits
+
+
+def test_replace_and_insert():
+    assert apply_edits('hello world', [{'start': 0, 'end': 5, 'text': 'HELLO'}]) == 'HELLO world'
+    assert apply_edits('ac', [{'start': 1, 'end': 1, 'text': 'b'}]) == 'abc'
+
+
+def test_multiple_edits_are_relative_to_base():
+    edits = [{'start': 0, 'end': 1, 'text': 'xx'}, {'start': 2, 'end': 3, 'text': ''}]
+    assert apply_edits('abcd', edits) == 'xxbd'
+
+
+def test_offsets_are_utf16_code_units():
+    # 😀 在 JavaScript 字符串中占 2 个码元
+    assert apply_edits('a😀b', [{'start': 3, 'end': 4, 'text': 'c'}]) == 'a😀c'
+    assert apply_edits('a😀b', [{'start': 1, 'end': 3, 'text': ''}]) == 'ab'
+
+
+def test_adjacent_edits_after_surrogate_pairs():
+    # 相邻（前一个的 end 等于后一个的 start）不算重叠；插入的文本也可以含代理对
+    edits = [{'start': 2, 'end': 3, 'text': '😺'}, {'start': 3, 'end': 5, 'text': ''},
+             {'start': 5, 'end': 5, 'text': '!'}]
+    assert apply_edits('😀x😀y', edits) == '😀😺!y'
+
+
+def test_split_surrogate_pair_is_rejected():
+    with pytest.raises(PatchError):
+        apply_edits('a😀b', [{'start': 2, 'end': 2, 'text': 'x'}])
+
+
+@pytest.mark.parametrize('edits', [
+    [{'start': 2, 'end': 4, 'text': ''}, {'start': 3, 'end': 5, 'text': ''}],  # 重叠
+    [{'start': 3, 'end': 4, 'text': ''}, {'start': 0, 'end': 1, 'text': ''}],  # 未排序
+    [{'start': 2, 'end': 1, 'text': ''}],
+    [{'start': 0, 'end': 99, 'text': ''}],
+    [{'start': True, 'end': 1, 'text': ''}],
+    ['0-1'],
+    {'start': 0},
+])
+def test_invalid_edits(edits):
+    with pytest.raises(PatchError):
+        apply_edits('abcdef', edits)
+
+
+def test_normalize_newlines():
+    assert text_patch.normalize_newlines('a\r\nb\rc\n') == 'a\nb\nc\n'
+
+
+def test_patch_crlf_note_uses_browser_offsets(notebook, client):
+    """ 浏览器中 textarea 的值是 LF 换行，偏移按 LF 计算，存量的 CRLF 正文不能被改坏 """
+    with notebook.db_pool.connection() as conn:
+        note_id = notebook.notes_store.create(conn, client.user_id, 't', 'x')
+        conn.execute('UPDATE notes SET content = ? WHERE id = ?', ('a\r\nb\r\nc', note_id))  # 旧数据
+        conn.commit()
+    # 客户端看到 'a\nb\nc'，把 b 改成 bC
+    response = client.patch(f'/notes/{note_id}', json={
+        'base_version': 1, 'edits': [{'start': 3, 'end': 3, 'text': 'C'}]})
+    assert response.status_code == 200
+    with notebook.db_pool.connection() as conn:
+        assert notebook.notes_store.get(conn, note_id, client.user_id).content == 'a\nbC\nc'
+
+
+def test_saved_content_is_normalized(notebook, client):
+    client.post('/notes/new', data={'title': 'crlf', 'content': 'a\r\nb'})
+    with notebook.db_pool.connection() as conn:
+        row = conn.execute('SELECT id FROM notes WHERE user_id = ?', (client.user_id,)).fetchone()
+        note = notebook.notes_store.get(conn, row[0], client.user_id)
+    assert note.content == 'a\nb'
+    client.post(f'/notes/edit/{note.id}', data={'title': 'crlf', 'content': 'c\r\nd'})
+    with notebook.db_pool.connection() as conn:
+        assert notebook.notes_store.get(conn, note.id, client.user_id).content == 'c\nd'
+
+
+def test_edit_page_keeps_leading_newline(notebook, client):
+    """ 紧跟 <textarea> 的换行会被浏览器丢弃，模板要多输出一个 """
+    with notebook.db_pool.connection() as conn:
+        note_id = notebook.notes_store.create(conn, client.user_id, 'nl', '\nfirst')
+        conn.commit()
+    page = client.get(f'/notes/edit/{note_id}').get_data(as_text=True)
+    assert 'required>\n\nfirst</textarea>' in page
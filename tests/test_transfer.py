@@ -0,0 +1,97 @@
+""" 导出再导入得到相同的笔记；导入 zip 时限制解压后的大小 """
+import io
+import json
+import zipfile
+
+import pytest
+
+import transfer
+
+NOTES = [
+    ('短笔记', '第一行\n第二行', 0),
+    ('长笔记', '长正文 ' * 2000, 1),  # 超过 note_bodies.INLINE_LIMIT
+    ('emoji 😀 / 斜杠', 'a 😀 b\n', 1),
+]
+
+
+def create_notes(client):
+    for title, content, markdown_enabled in NOTES:
+        data = {'title': title, 'content': content}
+        if markdown_enabled:
+            data['markdown_enabled'] = 'on'
+        client.post('/notes/new', data=data)
+
+
+def exported(notebook, user_id):
+    with notebook.db_pool.connection() as conn:
+        notes = notebook.notes_store.page(conn, user_id, size=100)[0]
+        return sorted((note.title, notebook.notes_store.get(conn, note.id, user_id).content, note.markdown_enabled)
+                      for note in notes)
+
+
+def upload(client, name, data):
+    response = client.post('/notes/import', data={'file': (io.BytesIO(data), name)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+
+
+def test_ndjson_round_trip(notebook, client, make_client):
+    create_notes(client)
+    body = client.get('/notes/export').data
+    assert [json.loads(line)['title'] for line in body.splitlines()] == [title for title, _, _ in NOTES]
+
+    other = make_client()
+    upload(other, 'notes.ndjson', body)
+    assert exported(notebook, other.user_id) == exported(notebook, client.user_id) == sorted(NOTES)
+
+
+def test_zip_round_trip(notebook, client, make_client):
+    create_notes(client)
+    body = client.get('/notes/export?format=zip').data
+    other = make_client()
+    upload(other, 'notes.zip', body)
+    # zip 中的 Markdown 文件导入后都启用 Markdown，文件名中的斜杠被替换
+    titles = [title for title, _, _ in exported(notebook, other.user_id)]
+    assert sorted(titles) == sorted(['短笔记', '长笔记', 'emoji 😀 _ 斜杠'])
+    contents = {content for _, content, _ in exported(notebook, other.user_id)}
+    assert contents == {content for _, content, _ in NOTES}
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def parse(data):
+    return list(transfer.parse_zip(io.BytesIO(data)))
+
+
+def test_zip_entry_size_limit(monkeypatch):
+    monkeypatch.setattr(transfer, 'ZIP_MAX_ENTRY_SIZE', 1000)
+    assert len(parse(make_zip([('a.md', 'x' * 1000)]))) == 1
+    with pytest.raises(transfer.ImportFormatError, match='a.md'):
+        parse(make_zip([('a.md', 'x' * 1001)]))
+
+
+def test_zip_total_size_and_entry_count_limits(monkeypatch):
+    monkeypatch.setattr(transfer, 'ZIP_MAX_TOTAL_SIZE', 2500)
+    with pytest.raises(transfer.ImportFormatError):
+        parse(make_zip([(f'{i}.md', 'x' * 1000) for i in range(3)]))
+    monkeypatch.setattr(transfer, 'ZIP_MAX_ENTRIES', 2)
+    with pytest.raises(transfer.ImportFormatError):
+        parse(make_zip([(f'{i}.txt', '') for i in range(3)]))
+
+
+def test_zip_with_understated_size_is_rejected(monkeypatch):
+    monkeypatch.setattr(transfer, 'ZIP_MAX_ENTRY_SIZE', 1000)
+    data = bytearray(make_zip([('a.md', 'x' * 100000)]))
+    # 把中央目录和本地文件头中声明的解压后大小都改成 10 字节
+    info = zipfile.ZipFile(io.BytesIO(bytes(data))).infolist()[0]
+    data[info.header_offset + 22:info.header_offset + 26] = (10).to_bytes(4, 'little')
+    central = data.rfind(b'PK\x01\x02')
+    data[central + 24:central + 28] = (10).to_bytes(4, 'little')
+    with pytest.raises(transfer.ImportFormatError):
+        parse(bytes(data))
@@ -0,0 +1,49 @@
+""" 文本区间修改：自动保存时客户端只上传改动的区间
+
+每个修改为 {"start": i, "end": j, "text": "..."}，表示把基准文本的 [i, j) 替换为 text。
+偏移以 UTF-16 码元计，与浏览器中 JavaScript 字符串的下标一致（emoji 等占 2 个）。
+同一次提交中的多个修改都相对于同一份基准文本，必须按位置排序且互不重叠。
+
+浏览器中 textarea 的值统一使用 LF 换行，偏移也按 LF 计算，所以保存的正文一律
+先经过 normalize_newlines，应用修改前的基准文本也要同样处理。
+"""
+
+MAX_EDITS = 1000
+
+
+class PatchError(ValueError):
+    """ 修改列表格式错误或越界 """
+
+
+def normalize_newlines(text):
+    """ 把 CRLF 和单独的 CR 换成 LF """
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def apply_edits(text, edits):
+    """ 把修改列表应用到 text 上，返回新文本 """
+    if not isinstance(edits, list) or len(edits) > MAX_EDITS:
+        raise PatchError('edits 必须是不超过 1000 项的列表')
+    if not edits:
+        return text
+    units = text.encode('utf-16-le', 'surrogatepass')
+    length = len(units) // 2
+    pieces = []
+    position = 0
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise PatchError('修改项必须是对象')
+        start, end, new_text = edit.get('start'), edit.get('end'), edit.get('text', '')
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (start, end)) \
+                or not isinstance(new_text, str):
+            raise PatchError('修改项需要整数 start、end 和字符串 text')
+        if not position <= start <= end <= length:
+            raise PatchError(f'修改区间 [{start}, {end}) 越界或与前一项重叠')
+        pieces.append(units[position * 2:start * 2])
+        pieces.append(new_text.encode('utf-16-le', 'surrogatepass'))
+        position = end
+    pieces.append(units[position * 2:])
+    try:
+        return b''.join(pieces).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise PatchError('修改后的文本包含不成对的代理字符') from None
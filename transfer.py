@@ -0,0 +1,198 @@
+""" 笔记批量导入/导出：NDJSON 和 Markdown zip
+
+导出按 id 分批读取（每批一次查询，不长时间占用读事务），逐条生成输出，
+内存占用与笔记总数无关（zip 的中央目录超过一定大小后转存到临时文件）。
+导入逐行/逐个文件解析上传内容，按批 executemany 插入，每批一个事务。
+"""
+import itertools
+import json
+import re
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+
+EXPORT_BATCH = 1000    # 导出时每次查询的行数
+IMPORT_BATCH = 10000   # 导入时每个事务插入的行数
+MAX_NAME_LENGTH = 80   # zip 中文件名里标题部分的最大长度
+ZIP_SPOOL_SIZE = 4 * 1024 * 1024  # zip 中央目录超过该大小后写入磁盘临时文件
+ZIP_MAX_ENTRIES = 100000                # 导入的 zip 最多包含的条目数
+ZIP_MAX_ENTRY_SIZE = 16 * 1024 * 1024   # 导入的 zip 中单个文件解压后的最大字节数
+ZIP_MAX_TOTAL_SIZE = 512 * 1024 * 1024  # 导入的 zip 中 .md 文件解压后的总字节数上限
+
+ZIP_FLAGS = 0x0808  # 使用数据描述符 + 文件名为 UTF-8
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+ZIP_DESCRIPTOR = struct.Struct('<IIII')
+ZIP_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+
+UNSAFE_NAME = re.compile(r'[\x00-\x1f/\\:*?"<>|]+')
+ID_PREFIX = re.compile(r'^\d+-')
+
+
+class ImportFormatError(ValueError):
+    """ 上传内容无法解析；imported 为出错前已提交的行数 """
+    imported = 0
+
+
+# ---------- 导出 ----------
+
+def iter_notes(pool, table, user_id, columns, batch=EXPORT_BATCH):
+    """ 按 id 升序逐条返回用户的笔记（dict），每批从连接池取一次连接 """
+    sql = f'SELECT id, {", ".join(columns)} FROM {table} WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?'
+    last_id = 0
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(sql, (user_id, last_id, batch)).fetchall()
+        for row in rows:
+            yield dict(zip(row.keys(), row))
+        if len(rows) < batch:
+            return
+        last_id = rows[-1]['id']
+
+
+def ndjson_stream(notes):
+    """ 每条笔记一行 JSON """
+    for note in notes:
+        yield json.dumps(note, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def markdown_filename(note):
+    title = UNSAFE_NAME.sub('_', note['title']).strip(' .') or 'untitled'
+    return f"{note['id']}-{title[:MAX_NAME_LENGTH]}.md"
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def zip_stream(notes):
+    """ 每条笔记一个 .md 文件的 zip 流
+
+    标准库 zipfile 会为每个文件在内存中保留一个 ZipInfo，百万条笔记要占用 1 GB 以上，
+    这里直接写 zip 格式：文件数据后跟数据描述符，中央目录项先写入临时文件，
+    最后再整体输出；文件数或偏移超出 32 位时写入 ZIP64 结尾记录。
+    """
+    dos_time, dos_date = _dos_datetime(time.time())
+    offset = count = 0
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) as directory:
+        for note in notes:
+            name = markdown_filename(note).encode('utf-8')
+            data = note['content'].encode('utf-8')
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            crc = zlib.crc32(data)
+            header = ZIP_LOCAL_HEADER.pack(0x04034b50, 20, ZIP_FLAGS, zipfile.ZIP_DEFLATED,
+                                           dos_time, dos_date, 0, 0, 0, len(name), 0)
+            descriptor = ZIP_DESCRIPTOR.pack(0x08074b50, crc, len(compressed), len(data))
+            extra = b''
+            if offset >= 0xFFFFFFFF:
+                extra = struct.pack('<HHQ', 1, 8, offset)
+            directory.write(ZIP_CENTRAL_HEADER.pack(
+                0x02014b50, 45 if extra else 20, 45 if extra else 20, ZIP_FLAGS, zipfile.ZIP_DEFLATED,
+                dos_time, dos_date, crc, len(compressed), len(data), len(name), len(extra), 0, 0, 0,
+                0o644 << 16, min(offset, 0xFFFFFFFF)) + name + extra)
+            chunk = header + name + compressed + descriptor
+            offset += len(chunk)
+            count += 1
+            yield chunk
+
+        directory_size = directory.tell()
+        directory.seek(0)
+        for chunk in iter(lambda: directory.read(64 * 1024), b''):
+            yield chunk
+
+    end = b''
+    if count >= 0xFFFF or offset >= 0xFFFFFFFF or directory_size >= 0xFFFFFFFF:
+        end = (struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, directory_size, offset)
+               + struct.pack('<IIQI', 0x07064b50, 0, offset + directory_size, 1))
+    yield end + struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                            min(directory_size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF), 0)
+
+
+# ---------- 导入 ----------
+
+def parse_ndjson(stream):
+    """ 逐行解析 NDJSON，每行需要包含字符串类型的 title 和 content """
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            note = json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f'第 {number} 行不是有效的 JSON')
+        if not isinstance(note, dict) or not isinstance(note.get('title'), str) \
+                or not isinstance(note.get('content'), str):
+            raise ImportFormatError(f'第 {number} 行缺少 title 或 content')
+        yield note
+
+
+def parse_zip(fileobj):
+    """ 逐个读取 zip 中的 .md 文件，标题取自文件名（去掉导出时加的 id 前缀）
+
+    防止压缩炸弹：先按中央目录中声明的大小检查条目数、单个文件和总大小，
+    读取时再按上限截断，声明的大小与实际不符时也不会读入超过上限的数据。
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ImportFormatError('不是有效的 zip 文件')
+    with archive:
+        infos = archive.infolist()
+        if len(infos) > ZIP_MAX_ENTRIES:
+            raise ImportFormatError(f'zip 中的文件超过 {ZIP_MAX_ENTRIES} 个')
+        infos = [info for info in infos if not info.is_dir() and info.filename.lower().endswith('.md')]
+        for info in infos:
+            if info.file_size > ZIP_MAX_ENTRY_SIZE:
+                raise ImportFormatError(f'{info.filename} 解压后超过 {ZIP_MAX_ENTRY_SIZE // 1024 // 1024} MB')
+        if sum(info.file_size for info in infos) > ZIP_MAX_TOTAL_SIZE:
+            raise ImportFormatError(f'zip 解压后超过 {ZIP_MAX_TOTAL_SIZE // 1024 // 1024} MB')
+        remaining = ZIP_MAX_TOTAL_SIZE
+        for info in infos:
+            name = info.filename.rsplit('/', 1)[-1][:-3]
+            limit = min(ZIP_MAX_ENTRY_SIZE, remaining)
+            try:
+                with archive.open(info) as member:
+                    data = member.read(limit + 1)
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                raise ImportFormatError(f'{info.filename} 已损坏')
+            if len(data) > limit:
+                raise ImportFormatError(f'{info.filename} 解压后的大小与声明不符')
+            remaining -= len(data)
+            try:
+                content = data.decode('utf-8')
+            except UnicodeDecodeError:
+                raise ImportFormatError(f'{info.filename} 不是 UTF-8 编码')
+            yield {'title': ID_PREFIX.sub('', name) or name, 'content': content, 'markdown_enabled': 1}
+
+
+def parse_upload(upload):
+    """ 按文件扩展名选择解析方式，upload 为 werkzeug 的 FileStorage """
+    if (upload.filename or '').lower().endswith('.zip'):
+        return parse_zip(upload.stream)
+    return parse_ndjson(upload.stream)
+
+
+def import_rows(conn, sql, rows, batch=IMPORT_BATCH, after_batch=None):
+    """ 按批 executemany 插入并提交，返回插入的行数
+
+    after_batch(conn, first_id) 在每批插入之后、提交之前调用，本批的行 id 都不小于 first_id
+    """
+    total = 0
+    rows = iter(rows)
+    while True:
+        try:
+            chunk = list(itertools.islice(rows, batch))
+        except ImportFormatError as exc:
+            exc.imported = total  # 之前的批次已经提交
+            raise
+        if not chunk:
+            return total
+        cursor = conn.executemany(sql, chunk)
+        if after_batch is not None:
+            # 同一写事务中自增 id 连续分配，本批第一行的 id 由最后一行倒推
+            after_batch(conn, conn.execute('SELECT last_insert_rowid()').fetchone()[0] - cursor.rowcount + 1)
+        conn.commit()
+        total += len(chunk)
@@ -1,64 +1,89 @@
+import atexit
+import heapq
 import os
 import sqlite3
-from flask import Flask, render_template_string, request, redirect, url_for, session, g, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, g, flash, jsonify
+from scoring import LcsScorer
+from db_pool import ConnectionPool
+from metrics import Metrics
+from ratelimit import RateLimiter, per_minute
+from password_pool import PasswordHasher, PasswordPoolBusy
+from session_store import SessionStore, SESSIONS_SCHEMA
+import migrations
+import note_bodies
+import revisions
+import store
+import template_registry
+import transfer
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
-DATABASE = os.path.join(app.root_path, 'site.db')
+DATABASE = os.environ.get('SITE_DATABASE', os.path.join(app.root_path, 'site.db'))
+NOTES_PAGE_SIZE = 50
+PREVIEW_LENGTH = 200
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_LIMIT = 100
+NOTE_FRAGMENT_CACHE = int(os.environ.get('NOTE_FRAGMENT_CACHE', '2048'))
+limiter = RateLimiter()
+metrics = Metrics.from_env()
+metrics.init_app(app)
+# 密码哈希在独立的进程池中计算，池满或超时返回 503
+hasher = PasswordHasher(workers=int(os.environ.get('PASSWORD_WORKERS', '2')),
+                        max_pending=int(os.environ.get('PASSWORD_MAX_PENDING', '32')),
+                        timeout=float(os.environ.get('PASSWORD_TIMEOUT', '5')))
+hasher.start()
+atexit.register(hasher.shutdown)
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(exc):
+    return '服务器繁忙，请稍后再试。', 503, {'Retry-After': '1'}
 # —— 数据库相关 —— #
+db_pool = ConnectionPool(DATABASE, detect_types=sqlite3.PARSE_DECLTYPES)
+metrics.instrument(db_pool)
 def get_db():
     if 'db' not in g:
-        connection = sqlite3.connect(
-            DATABASE,
-            detect_types=sqlite3.PARSE_DECLTYPES,
-            check_same_thread=False
-        )
-        connection.row_factory = sqlite3.Row
-        g.db = connection
+        g.db = db_pool.acquire()
+        g.db_lease = g.db.lease
     return g.db
 @app.teardown_appcontext
 def close_db(exception):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        db_pool.release(db, g.pop('db_lease'))
+MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS user (
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT    UNIQUE NOT NULL,
+        password TEXT    NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS note (
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        title    TEXT    NOT NULL,
+        content  TEXT    NOT NULL,
+        user_id  INTEGER NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES user(id)
+    );
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_note_user_id ON note (user_id, id DESC);
+    ''',
+    revisions.revisions_schema('note'),
+    note_bodies.bodies_schema('note'),
+    '''
+    ALTER TABLE note ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+    ''',
+    SESSIONS_SCHEMA,
+]
+users = store.UserStore('user')
+sessions = SessionStore.from_env(DATABASE)
+sessions.init_app(app)
+metrics.instrument(sessions.pool)
+notes_store = store.NoteStore('note', markdown=False, preview_length=PREVIEW_LENGTH)
 def init_db():
     db = get_db()
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS user (
-            id       INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT    UNIQUE NOT NULL,
-            password TEXT    NOT NULL
-        )
-    ''')
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS note (
-            id       INTEGER PRIMARY KEY AUTOINCREMENT,
-            title    TEXT    NOT NULL,
-            content  TEXT    NOT NULL,
-            user_id  INTEGER NOT NULL,
-            FOREIGN KEY(user_id) REFERENCES user(id)
-        )
-    ''')
-    db.commit()
-# —— LCS 算法 —— #
-def lcs(a, b):
-    m = len(a)
-    n = len(b)
-    dp = []
-    for _ in range(m + 1):
-        dp.append([0] * (n + 1))
-    for i in range(m):
-        for j in range(n):
-            if a[i] == b[j]:
-                dp[i + 1][j + 1] = dp[i][j] + 1
-            else:
-                if dp[i][j + 1] >= dp[i + 1][j]:
-                    dp[i + 1][j + 1] = dp[i][j + 1]
-                else:
-                    dp[i + 1][j + 1] = dp[i + 1][j]
-    return dp[m][n]
+    migrations.migrate(db, MIGRATIONS)
 # —— 路由 —— #
 @app.route('/register', methods=['GET', 'POST'])
+@limiter.limit(per_minute(5), burst=3)
 def register():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -68,35 +93,30 @@ def register():
             flash('用户名和密码至少 4 个字符', 'danger')
         else:
             db = get_db()
-            hashed_password = generate_password_hash(password)
+            hashed_password = hasher.hash(password)
             try:
-                db.execute(
-                    'INSERT INTO user (username, password) VALUES (?, ?)',
-                    (username, hashed_password)
-                )
+                users.create(db, username, hashed_password)
                 db.commit()
                 flash('注册成功，请登录', 'success')
                 return redirect(url_for('login'))
             except sqlite3.IntegrityError:
                 flash('用户名已存在', 'danger')
 
-    return render_template_string(HTML_REGISTER)
+    return render_template('oneclick/register.html')
 @app.route('/login', methods=['GET', 'POST'])
+@limiter.limit(per_minute(10), burst=5)
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         db = get_db()
-        user = db.execute(
-            'SELECT * FROM user WHERE username = ?',
-            (username,)
-        ).fetchone()
-        if user and check_password_hash(user['password'], password):
-            session['user_id'] = user['id']
+        user = users.by_username(db, username)
+        if user and hasher.verify(user.password, password):
+            session['user_id'] = user.id
             return redirect(url_for('index'))
         else:
             flash('用户名或密码错误', 'danger')
-    return render_template_string(HTML_LOGIN)
+    return render_template('oneclick/login.html')
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
@@ -112,91 +132,112 @@ def index():
         if not title or not content:
             flash('标题和内容都不能为空', 'warning')
         else:
-            db.execute(
-                'INSERT INTO note (title, content, user_id) VALUES (?, ?, ?)',
-                (title, content, session['user_id'])
-            )
+            notes_store.create(db, session['user_id'], title, content)
             db.commit()
             return redirect(url_for('index'))
-    notes_rows = db.execute(
-        'SELECT * FROM note WHERE user_id = ? ORDER BY id DESC',
-        (session['user_id'],)
-    ).fetchall()
-    notes = []
-    for row in notes_rows:
-        note = {
-            'id': row['id'],
-            'title': row['title'],
-            'content': row['content']
-        }
-        notes.append(note)
-    return render_template_string(HTML_INDEX, notes=notes)
+    notes, next_after_id = notes_store.page(db, session['user_id'], request.args.get('after_id', type=int),
+                                            NOTES_PAGE_SIZE, preview=True)
+    return render_template('oneclick/index.html', notes=notes, next_after_id=next_after_id)
 @app.route('/edit/<int:note_id>', methods=['GET', 'POST'])
 def edit(note_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     db = get_db()
-    row = db.execute(
-        'SELECT * FROM note WHERE id = ?',
-        (note_id,)
-    ).fetchone()
-    if row is None or row['user_id'] != session['user_id']:
+    note = notes_store.get(db, note_id, session['user_id'])
+    if note is None:
         return redirect(url_for('index'))
-    note = {'id': row['id'], 'title': row['title'], 'content': row['content']}
     if request.method == 'POST':
         new_title = request.form.get('title', '').strip()
         new_content = request.form.get('content', '').strip()
         if not new_title or not new_content:
             flash('标题和内容都不能为空', 'warning')
         else:
-            db.execute(
-                'UPDATE note SET title = ?, content = ? WHERE id = ?',
-                (new_title, new_content, note_id)
-            )
+            notes_store.update(db, note_id, new_title, new_content)
             db.commit()
             return redirect(url_for('index'))
-    return render_template_string(HTML_EDIT, note=note)
+    return render_template('oneclick/edit.html', note=note)
+@app.route('/revisions/<int:note_id>')
+def note_revisions(note_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    db = get_db()
+    if not notes_store.exists(db, note_id, session['user_id']):
+        return jsonify([]), 404
+    return jsonify([
+        {'revision': r['revision'], 'snapshot': r['kind'] == revisions.SNAPSHOT,
+         'size': r['size'], 'created_at': str(r['created_at'])}
+        for r in revisions.list_revisions(db, note_id)
+    ])
+@app.route('/revisions/<int:note_id>/<int:revision>')
+def note_revision(note_id, revision):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    db = get_db()
+    found = None
+    if notes_store.exists(db, note_id, session['user_id']):
+        found = revisions.get_revision(db, note_id, revision)
+    if found is None:
+        return jsonify({}), 404
+    return jsonify({'revision': revision, 'title': found[0], 'content': found[1]})
 @app.route('/delete/<int:note_id>')
 def delete(note_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     db = get_db()
-    row = db.execute(
-        'SELECT * FROM note WHERE id = ?',
-        (note_id,)
-    ).fetchone()
-    if row and row['user_id'] == session['user_id']:
-        db.execute('DELETE FROM note WHERE id = ?', (note_id,))
+    if notes_store.delete(db, note_id, session['user_id']):
         db.commit()
     return redirect(url_for('index'))
+@app.route('/notes/export')
+def export_notes():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    notes = notes_store.export(db_pool, session['user_id'])
+    if request.args.get('format') == 'zip':
+        return Response(transfer.zip_stream(notes), mimetype='application/zip',
+                        headers={'Content-Disposition': 'attachment; filename=notes.zip'})
+    return Response(transfer.ndjson_stream(notes), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=notes.ndjson'})
+@app.route('/notes/import', methods=['POST'])
+def import_notes():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    upload = request.files.get('file')
+    if not upload:
+        flash('请选择要导入的文件', 'warning')
+        return redirect(url_for('index'))
+    user_id = session['user_id']
+    rows = ((note['title'], note['content'], 0) for note in transfer.parse_upload(upload))
+    try:
+        count = notes_store.insert_many(get_db(), user_id, rows)
+        flash(f'已导入 {count} 条笔记', 'success')
+    except transfer.ImportFormatError as exc:
+        flash(f'{exc}，已导入 {exc.imported} 条笔记', 'danger')
+    return redirect(url_for('index'))
+def scored_rows(notes, scorer):
+    compared = 0
+    for note in notes:
+        compared += 1
+        score = scorer.score(note.title, threshold=1)
+        if score > 0:
+            yield score, note.id
+    metrics.count('lcs_comparisons', compared)
 @app.route('/search')
 def search_notes():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     query = request.args.get('query', '').strip()
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
     db = get_db()
-    rows = db.execute(
-        'SELECT * FROM note WHERE user_id = ?',
-        (session['user_id'],)
-    ).fetchall()
-    filtered = []
-    for row in rows:
-        score = lcs(row['title'], query)
-        if score > 0:
-            filtered.append((row, score))
-    # 根据 score 降序排序
-    for i in range(len(filtered)):
-        for j in range(i + 1, len(filtered)):
-            if filtered[j][1] > filtered[i][1]:
-                temp = filtered[i]
-                filtered[i] = filtered[j]
-                filtered[j] = temp
-    results = []
-    for item in filtered:
-        r = item[0]
-        note = {'id': r['id'], 'title': r['title'], 'content': r['content']}
-        results.append(note)
-    return render_template_string(HTML_SEARCH_RESULTS, notes=results, query=query)
+    rows = notes_store.titles(db, session['user_id'])
+    # 堆上只保留前 offset + limit + 1 个结果，多取一个用于判断是否有下一页
+    top = heapq.nlargest(offset + limit + 1, scored_rows(rows, LcsScorer(query)),
+                         key=lambda item: item[0])
+    page_ids = [note_id for _, note_id in top[offset:offset + limit]]
+    has_next = len(top) > offset + limit
+    results = notes_store.get_many(db, page_ids)
+    return render_template('oneclick/search.html', notes=results, query=query,
+                           limit=limit, offset=offset, has_next=has_next)
 # —— HTML 模板 —— #
 HTML_REGISTER = """
 <!DOCTYPE html>
@@ -303,20 +344,25 @@ HTML_INDEX = """
     <input name="query" class="form-control mr-sm-2" placeholder="搜索标题">
     <button class="btn btn-outline-success">搜索</button>
   </form>
+  <div class="form-inline mb-3">
+    <a href="{{url_for('export_notes')}}" class="btn btn-outline-secondary btn-sm mr-2">导出 NDJSON</a>
+    <a href="{{url_for('export_notes', format='zip')}}" class="btn btn-outline-secondary btn-sm mr-2">导出 Markdown</a>
+    <form method="POST" action="{{url_for('import_notes')}}" enctype="multipart/form-data" class="form-inline">
+      <input type="file" name="file" accept=".ndjson,.jsonl,.zip" class="form-control-file mr-2" required>
+      <button class="btn btn-outline-primary btn-sm">导入</button>
+    </form>
+  </div>
+  {% from 'oneclick/note_item.html' import note_item %}
   <ul class="list-group">
     {% for note in notes %}
-      <li class="list-group-item">
-        <h5>{{note['title']}}</h5>
-        <p>{{note['content']}}</p>
-        <a href="{{url_for('edit', note_id=note['id'])}}" 
-           class="btn btn-secondary btn-sm">编辑</a>
-        <a href="{{url_for('delete', note_id=note['id'])}}" 
-           class="btn btn-danger btn-sm">删除</a>
-      </li>
+      {{ cached_note_item(note_item, note) }}
     {% else %}
       <li class="list-group-item">暂无笔记</li>
     {% endfor %}
   </ul>
+  {% if next_after_id %}
+    <a href="{{url_for('index', after_id=next_after_id)}}" class="btn btn-outline-secondary mt-3">更早的笔记</a>
+  {% endif %}
   <a href="{{url_for('logout')}}" class="btn btn-warning mt-3">登出</a>
 </div>
 </body>
@@ -368,26 +414,58 @@ HTML_SEARCH_RESULTS = """
 <body>
 <div class="container">
   <h1 class="mt-5">搜索 “{{query}}”</h1>
+  {% from 'oneclick/note_item.html' import note_item %}
   <ul class="list-group">
     {% for note in notes %}
-      <li class="list-group-item">
-        <h5>{{note['title']}}</h5>
-        <p>{{note['content']}}</p>
-        <a href="{{url_for('edit', note_id=note['id'])}}" 
-           class="btn btn-secondary btn-sm">编辑</a>
-        <a href="{{url_for('delete', note_id=note['id'])}}" 
-           class="btn btn-danger btn-sm">删除</a>
-      </li>
+      {{ cached_note_item(note_item, note, full=True) }}
     {% else %}
       <li class="list-group-item">未找到相关笔记</li>
     {% endfor %}
   </ul>
+  <nav class="mt-3">
+    <ul class="pagination">
+      {% if offset > 0 %}
+        <li class="page-item">
+          <a class="page-link" href="{{url_for('search_notes', query=query, limit=limit, offset=[offset - limit, 0]|max)}}">上一页</a>
+        </li>
+      {% endif %}
+      {% if has_next %}
+        <li class="page-item">
+          <a class="page-link" href="{{url_for('search_notes', query=query, limit=limit, offset=offset + limit)}}">下一页</a>
+        </li>
+      {% endif %}
+    </ul>
+  </nav>
   <a href="{{url_for('index')}}" class="btn btn-primary mt-3">返回</a>
 </div>
 </body>
 </html>
 """
+HTML_NOTE_ITEM = """
+<li class="list-group-item">
+  <h5>{{note.title}}</h5>
+  <p>{{note.content}}</p>
+  <a href="{{url_for('edit', note_id=note.id)}}" 
+     class="btn btn-secondary btn-sm">编辑</a>
+  <a href="{{url_for('delete', note_id=note.id)}}" 
+     class="btn btn-danger btn-sm">删除</a>
+</li>
+"""
+# 启动时编译全部模板；列表项写成宏，在列表页的同一次渲染中调用，
+# 结果按 (id, 版本号) 缓存，首页的预览和搜索结果的全文分开缓存
+template_registry.register(app, {
+    'oneclick/register.html': HTML_REGISTER,
+    'oneclick/login.html': HTML_LOGIN,
+    'oneclick/index.html': HTML_INDEX,
+    'oneclick/edit.html': HTML_EDIT,
+    'oneclick/search.html': HTML_SEARCH_RESULTS,
+    'oneclick/note_item.html': '{% macro note_item(note) %}' + HTML_NOTE_ITEM + '{% endmacro %}',
+})
+note_fragments = template_registry.FragmentCache(NOTE_FRAGMENT_CACHE)
+@app.template_global()
+def cached_note_item(macro, note, full=False):
+    return note_fragments.render((note.id, note.version, full), macro, note)
+with app.app_context():
+    init_db()
 if __name__ == '__main__':
-    with app.app_context():
-        init_db()
     app.run(debug=True)
@@ -1,39 +1,71 @@
 """pip install Flask Flask-SocketIO eventlet"""
 # app.py
 
+import atexit
+import os
 import sqlite3
+import time
 import uuid
-from flask import Flask, g, request, redirect, url_for, abort, render_template_string
+from flask import Flask, g, request, redirect, url_for, abort, render_template, jsonify
 from flask_socketio import SocketIO, join_room, leave_room, emit
+from chat_broker import on_remote_emit, socketio_options
+from broadcast import RoomBroadcaster
+from chat_cache import MembershipCache, RoomDirectory
+from db_pool import ConnectionPool
+from message_journal import MessageJournal
+from metrics import Metrics
+from ratelimit import RateLimiter
+from room_history import HistoryItem, RoomHistory
+import migrations
+import template_registry
 
 # 配置
-DATABASE = 'chat.db'
+DATABASE = os.environ.get('CHAT_DATABASE', 'chat.db')
 SECRET_KEY = 'your-very-secret-key'  # 请改成自己更安全的字符串
+# 消息持久化：sync 每条立即提交；batch 后台批量提交（默认）
+MESSAGE_DURABILITY = os.environ.get('CHAT_MESSAGE_DURABILITY', 'batch')
+MESSAGE_FLUSH_MS = int(os.environ.get('CHAT_MESSAGE_FLUSH_MS', '50'))
+MESSAGE_BATCH_SIZE = int(os.environ.get('CHAT_MESSAGE_BATCH_SIZE', '200'))
+HISTORY_SIZE = 50  # 每个房间在内存中保留、加入时回放的消息数
+# 多进程部署时的房间广播队列，见 chat_broker.py；留空为单进程
+MESSAGE_QUEUE = os.environ.get('CHAT_MESSAGE_QUEUE', '')
+# 广播合并节拍，以及客户端未确认帧数的上限（超过后暂停向其推送）
+BROADCAST_TICK_MS = int(os.environ.get('CHAT_BROADCAST_TICK_MS', '20'))
+CLIENT_HIGH_WATER = int(os.environ.get('CHAT_CLIENT_HIGH_WATER', '100'))
+# 每个 IP 在每个房间的发言速率（条/秒）和突发上限
+TEXT_RATE = float(os.environ.get('CHAT_TEXT_RATE', '5'))
+TEXT_BURST = int(os.environ.get('CHAT_TEXT_BURST', '20'))
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
-socketio = SocketIO(app)
+socketio = SocketIO(app, **socketio_options(MESSAGE_QUEUE))
+metrics = Metrics.from_env()  # METRICS_ENABLED=1 时记录路由和 Socket.IO 事件的指标，见 /metrics
+metrics.init_app(app)
 
 # ---------- 数据库相关 ----------
 
+db_pool = ConnectionPool(DATABASE)
+metrics.instrument(db_pool)
+
 def get_db():
-    """获取或创建 SQLite 连接"""
+    """从连接池获取本次请求使用的 SQLite 连接"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE, check_same_thread=False)
-        db.row_factory = sqlite3.Row
+        db = g._database = db_pool.acquire()
+        g._database_lease = db.lease
     return db
 
 @app.teardown_appcontext
 def close_db(exc):
-    """请求结束时关闭数据库连接"""
+    """请求结束时把数据库连接归还连接池"""
     db = getattr(g, '_database', None)
     if db:
-        db.close()
+        db_pool.release(db, g._database_lease)  # 按租约归还，连接已被归还时不会误归还
 
-def init_db():
-    """初始化表结构"""
-    sql = """
+# 数据库迁移，按顺序追加，已发布的迁移不要修改
+MIGRATIONS = [
+    # 1: 房间、加入记录和消息
+    """
     CREATE TABLE IF NOT EXISTS rooms (
       id TEXT PRIMARY KEY,
       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -53,14 +85,56 @@ def init_db():
       sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
       FOREIGN KEY(room_id) REFERENCES rooms(id)
     );
+    """,
+    # 2: 按房间查询消息和成员的索引
     """
-    db = get_db()
-    db.executescript(sql)
-    db.commit()
+    CREATE INDEX IF NOT EXISTS idx_messages_room_sent_at ON messages (room_id, sent_at);
+    CREATE INDEX IF NOT EXISTS idx_joins_room_id ON joins (room_id);
+    """,
+    # 3: 按 before_id 翻页查询历史消息
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_room_id ON messages (room_id, id);
+    """,
+]
+
+def init_db():
+    """执行未应用的数据库迁移"""
+    with db_pool.connection() as db:
+        migrations.migrate(db, MIGRATIONS)
+
+init_db()
+
+# 消息写后日志，退出时写入剩余消息
+journal = MessageJournal(db_pool,
+                         durability=MESSAGE_DURABILITY,
+                         batch_size=MESSAGE_BATCH_SIZE,
+                         flush_interval=MESSAGE_FLUSH_MS / 1000,
+                         start_background_task=socketio.start_background_task,
+                         sleep=socketio.sleep)
+atexit.register(journal.stop)
+
+# 房间存在性和 IP 加入记录的内存缓存；多进程时布隆过滤器不能独立判定房间不存在
+rooms = RoomDirectory(db_pool, authoritative=not MESSAGE_QUEUE)
+membership = MembershipCache(db_pool)
+
+# 各房间最近消息的内存缓冲
+history = RoomHistory(db_pool, capacity=HISTORY_SIZE, page_size=HISTORY_SIZE)
+
+# 房间消息按节拍合并发送，并跟踪每个客户端的积压
+broadcaster = RoomBroadcaster(socketio, tick=BROADCAST_TICK_MS / 1000, high_water=CLIENT_HIGH_WATER)
 
-@app.before_first_request
-def setup():
-    init_db()
+# 发言限流；设置 RATELIMIT_DATABASE 后多个进程共享令牌桶
+limiter = RateLimiter()
+
+def record_remote_message(event, room, args):
+    """其他进程广播的消息也写入本进程的历史缓冲，并计入客户端积压"""
+    if event == 'messages' and room is not None:
+        batch = args[0]['messages']
+        for data in batch:
+            history.add(room, HistoryItem(None, data['user'], data['msg'], data['sent_at']))
+        broadcaster.frame_delivered(room, len(batch))
+
+on_remote_emit(socketio.server.manager, record_remote_message)
 
 # ---------- 路由和视图 ----------
 
@@ -136,6 +210,9 @@ ROOM_HTML = """
 
   <div class="container py-4">
     <div id="chat-box">
+      <div class="text-center mb-2">
+        <button id="load_older" class="btn btn-link btn-sm d-none">加载更早的消息</button>
+      </div>
       <ul id="messages"></ul>
     </div>
     <div class="input-group mt-3">
@@ -159,6 +236,13 @@ ROOM_HTML = """
 
     socket.emit('join', { room, user });
 
+    socket.on('access_denied', data => {
+      const li = document.createElement('li');
+      li.className = 'text-danger';
+      li.textContent = data.msg;
+      messagesEl.appendChild(li);
+    });
+
     socket.on('status', data => {
       const li = document.createElement('li');
       li.className = 'text-muted fst-italic';
@@ -167,11 +251,58 @@ ROOM_HTML = """
       scrollBottom();
     });
 
-    socket.on('message', data => {
+    const loadOlderBtn = document.getElementById('load_older');
+    let oldestId = null;
+
+    function messageItem(data) {
       const li = document.createElement('li');
-      li.innerHTML = `<strong>${data.user}:</strong> ${data.msg}`;
-      messagesEl.appendChild(li);
+      const name = document.createElement('strong');
+      name.textContent = `${data.user}:`;
+      li.appendChild(name);
+      li.appendChild(document.createTextNode(` ${data.msg}`));
+      return li;
+    }
+
+    let framesReceived = 0;
+
+    // 服务端按节拍合并的一批消息，收到后确认累计帧数
+    socket.on('messages', data => {
+      const fragment = document.createDocumentFragment();
+      data.messages.forEach(m => fragment.appendChild(messageItem(m)));
+      messagesEl.appendChild(fragment);
       scrollBottom();
+      framesReceived += 1;
+      socket.emit('ack', { count: framesReceived });
+    });
+
+    // 积压过多被暂停推送，重新同步最近消息
+    socket.on('lagging', () => {
+      socket.emit('resync', { room });
+    });
+
+    // 加入时回放最近消息；older 为 true 时是向上翻页的结果
+    socket.on('history', data => {
+      if (data.reset) {
+        messagesEl.replaceChildren();
+        framesReceived = 0;
+      }
+      const fragment = document.createDocumentFragment();
+      data.messages.forEach(m => fragment.appendChild(messageItem(m)));
+      if (data.older) {
+        messagesEl.insertBefore(fragment, messagesEl.firstChild);
+      } else {
+        messagesEl.appendChild(fragment);
+        scrollBottom();
+      }
+      const ids = data.messages.map(m => m.id).filter(id => id !== null);
+      if (ids.length) {
+        oldestId = Math.min(...ids);
+      }
+      loadOlderBtn.classList.toggle('d-none', !data.has_more || oldestId === null);
+    });
+
+    loadOlderBtn.addEventListener('click', () => {
+      socket.emit('history', { room, before_id: oldestId });
     });
 
     document.getElementById('message_input')
@@ -194,9 +325,12 @@ ROOM_HTML = """
 </html>
 """
 
+# 启动时编译页面模板，请求中按名字渲染
+template_registry.register(app, {'chat/index.html': INDEX_HTML, 'chat/room.html': ROOM_HTML})
+
 @app.route('/')
 def index():
-    return render_template_string(INDEX_HTML)
+    return render_template('chat/index.html')
 
 @app.route('/room', methods=['POST'])
 def create_or_join_room():
@@ -206,26 +340,33 @@ def create_or_join_room():
         return abort(400, '请提供用户名')
 
     client_ip = request.remote_addr
-    db = get_db()
-    cur = db.cursor()
 
-    # 检查 IP 是否已加入过
-    cur.execute("SELECT 1 FROM joins WHERE ip = ?", (client_ip,))
-    if cur.fetchone():
+    # 检查 IP 是否已加入过（内存缓存）
+    if membership.room_of(client_ip) is not None:
         return abort(403, '每个 IP 只能加入一次，您已加入过房间。')
 
+    db = get_db()
+    cur = db.cursor()
+
     # 创建新房间或加入已有房间
+    created = False
     if not room_id:
         room_id = uuid.uuid4().hex[:8]
         cur.execute("INSERT INTO rooms(id) VALUES(?)", (room_id,))
-    else:
-        cur.execute("SELECT 1 FROM rooms WHERE id = ?", (room_id,))
-        if not cur.fetchone():
-            return abort(404, '房间不存在。')
-
-    # 记录 join
-    cur.execute("INSERT INTO joins(ip, room_id) VALUES(?, ?)", (client_ip, room_id))
+        created = True
+    elif not rooms.exists(room_id):
+        return abort(404, '房间不存在。')
+
+    # 记录 join；其他进程可能刚刚为同一 IP 写入了记录
+    try:
+        cur.execute("INSERT INTO joins(ip, room_id) VALUES(?, ?)", (client_ip, room_id))
+    except sqlite3.IntegrityError:
+        db.rollback()
+        return abort(403, '每个 IP 只能加入一次，您已加入过房间。')
     db.commit()
+    if created:
+        rooms.added(room_id)
+    membership.joined(client_ip, room_id)
 
     return redirect(url_for('chat_room', room_id=room_id, username=username))
 
@@ -235,53 +376,123 @@ def chat_room(room_id):
     if not username:
         return redirect(url_for('index'))
 
-    client_ip = request.remote_addr
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT 1 FROM joins WHERE ip = ? AND room_id = ?", (client_ip, room_id))
-    if not cur.fetchone():
+    if membership.room_of(request.remote_addr) != room_id:
         return abort(403, '您无权访问此房间。')
 
-    return render_template_string(ROOM_HTML,
-                                  room_id=room_id,
-                                  username=username)
+    return render_template('chat/room.html',
+                           room_id=room_id,
+                           username=username)
+
+@app.route('/stats')
+def stats():
+    """广播、消息写入、连接池和限流的计数器，供监控采集"""
+    return jsonify({
+        'broadcast': broadcaster.stats(),
+        'journal': {'written': journal.written, 'batches': journal.batches, 'pending': journal.pending},
+        'db_pool': db_pool.stats(),
+        'rate_limited': limiter.rejected,
+    })
 
 # ---------- Socket.IO 事件 ----------
 
 @socketio.on('join')
+@metrics.track('socket:join')
 def on_join(data):
     room = data['room']
     user = data['user']
+    if not may_access(room):
+        return access_denied(room)
     join_room(room)
+    broadcaster.track(request.sid, room)
     emit('status', {'msg': f"{user} 加入了房间"}, room=room)
+    # 只发给新加入的用户，一次性回放最近消息
+    send_recent_history(room)
+
+def may_access(room):
+    """只有通过 /room 加入过该房间的 IP 才能订阅房间、发言和读取历史消息"""
+    return membership.room_of(request.remote_addr) == room
+
+def access_denied(room):
+    emit('access_denied', {'room': room, 'msg': '您无权访问此房间。'})
+
+def send_recent_history(room, reset=False):
+    """把房间最近消息发给当前客户端；reset 为 True 时客户端先清空已显示的消息"""
+    recent = history.recent(room)
+    emit('history', {'messages': [item.to_dict() for item in recent],
+                     'has_more': len(recent) >= HISTORY_SIZE,
+                     'older': False,
+                     'reset': reset})
+
+@socketio.on('ack')
+def on_ack(data):
+    broadcaster.ack(request.sid, int(data['count']))
+
+@socketio.on('resync')
+def on_resync(data):
+    # 积压过多被暂停推送的客户端追上后重新加入广播
+    room = data['room']
+    if not may_access(room):
+        return access_denied(room)
+    join_room(room)
+    broadcaster.track(request.sid, room)
+    send_recent_history(room, reset=True)
+
+@socketio.on('history')
+@metrics.track('socket:history')
+def on_history(data):
+    room = data['room']
+    before_id = data.get('before_id')
+    if before_id is None:
+        return
+    if not may_access(room):
+        return access_denied(room)
+    older = history.older(room, int(before_id))
+    emit('history', {'messages': [item.to_dict() for item in older],
+                     'has_more': len(older) >= HISTORY_SIZE,
+                     'older': True})
+
+def text_rejected(data, retry_after):
+    """发言过快时只通知发送者，消息被丢弃"""
+    emit('status', {'msg': f"发送太快，请 {retry_after:.1f} 秒后再试"})
 
 @socketio.on('text')
+@metrics.track('socket:text')
+@limiter.limit_event(TEXT_RATE, TEXT_BURST, lambda data: f"{request.remote_addr}:{data.get('room')}",
+                     on_reject=text_rejected)
 def on_text(data):
     room = data['room']
     user = data['user']
     msg  = data['msg']
     ip   = request.remote_addr
+    if not may_access(room):  # 非成员不能写入房间的历史、消息日志或向成员广播
+        return access_denied(room)
+    sent_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())  # 与 CURRENT_TIMESTAMP 格式一致
 
-    # 存消息
-    db = get_db()
-    db.execute(
-        "INSERT INTO messages(room_id, ip, username, content) VALUES(?,?,?,?)",
-        (room, ip, user, msg)
-    )
-    db.commit()
-
-    emit('message', {'user': user, 'msg': msg}, room=room)
+    # 下一个节拍合并广播，消息由后台任务批量存储，写入后 item.id 才确定
+    broadcaster.enqueue(room, {'user': user, 'msg': msg, 'sent_at': sent_at})
+    item = HistoryItem(None, user, msg, sent_at)
+    history.add(room, item)
+    journal.append(room, ip, user, msg, sent_at, item)
 
 @socketio.on('leave')
 def on_leave(data):
     room = data['room']
     user = data['user']
     leave_room(room)
+    broadcaster.untrack(request.sid)
     emit('status', {'msg': f"{user} 离开了房间"}, room=room)
 
+@socketio.on('disconnect')
+def on_disconnect():
+    broadcaster.untrack(request.sid)
+
 # ---------- 启动 ----------
 
 if __name__ == '__main__':
     # 安装依赖：Flask, Flask-SocketIO, eventlet
     # 运行： python app.py
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # 多进程：先运行 python chat_broker.py，再为每个进程设置相同的
+    #   CHAT_MESSAGE_QUEUE=unix:///tmp/chat-broker.sock 和不同的 CHAT_PORT，
+    #   前面的负载均衡器需开启会话保持（或客户端只用 websocket 传输）
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('CHAT_PORT', '5000')),
+                 debug=not MESSAGE_QUEUE)